@@ -8,16 +8,18 @@ class AccountAdmin(admin.ModelAdmin):
     """ Админ-панель аккаунта """
 
     save_as = True
-    list_display = ['username', 'is_active', 'is_staff', 'is_superuser']
+    list_display = ['username', 'subscriptions_count', 'is_active', 'is_staff', 'is_superuser']
     list_display_links = ['username']
     list_filter = ['is_active', 'is_staff', 'is_superuser']
     search_fields = ['username', 'last_name', 'first_name']
     list_per_page = 50
+    readonly_fields = ['subscriptions_count']
     fieldsets = (
         (None, {'fields': ('username', 'password')}),
         ('Персональная информация', {'fields': (
             'first_name', 'last_name', 'email', 'surname', 'date_of_birth'
         )}),
+        ('Статистика', {'fields': ('subscriptions_count',)}),
         ('Разрешения', {'fields': ('is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions')}),
         ('Даты', {'fields': ('last_login', 'date_joined')}),
     )
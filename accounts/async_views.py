@@ -0,0 +1,33 @@
+from typing import Any, Optional
+
+from django.http import JsonResponse
+from rest_framework import status
+
+from nekidaem_tz.async_api import async_api_view, json_response
+from nekidaem_tz.db_router import read_from_replica
+from .models import Account
+from .serializers import AccountSerializer
+
+
+@async_api_view(['GET'], authenticated=False)
+@read_from_replica('user_detail')
+async def user_detail(request: Any, username: Optional[str] = None, user_id: Optional[int] = None) -> JsonResponse:
+    """
+    Асинхронная (ASGI) версия UserDetailAPIView: информация о пользователе по имени или ID.
+
+    :param request: Запрос.
+    :param username: Имя пользователя.
+    :param user_id: Идентификатор пользователя.
+    :return: Информация о пользователе или сообщение об ошибке, если пользователь не найден.
+    """
+    if username:
+        user = await Account.objects.filter(username=username).afirst()
+    elif user_id:
+        user = await Account.objects.filter(id=user_id).afirst()
+    else:
+        return json_response({'error': 'Имя пользователя или ID должны быть указаны'},
+                             status=status.HTTP_400_BAD_REQUEST)
+
+    if user is None:
+        return json_response({'error': 'Пользователь не найден'}, status=status.HTTP_404_NOT_FOUND)
+    return json_response(AccountSerializer(user).data)
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_account_read_posts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='subscriptions_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество подписок'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0018_post_fks_without_constraint'),
+        ('accounts', '0005_account_subscriptions_count'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='account',
+            name='read_posts',
+            field=models.ManyToManyField(blank=True, db_constraint=False, related_name='read_by', to='blogs.post'),
+        ),
+    ]
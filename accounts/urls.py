@@ -1,8 +1,12 @@
 from django.urls import path
+from . import async_views
 from .views import AccountCreateAPIView, UserDetailAPIView
 
 urlpatterns = [
     path('create/', AccountCreateAPIView.as_view(), name='account-create'),
     path('user/<str:username>/', UserDetailAPIView.as_view(), name='user-detail-by-username'),
     path('user/id/<int:user_id>/', UserDetailAPIView.as_view(), name='user-detail-by-id'),
+    # Асинхронные версии (ASGI) с теми же ответами
+    path('async/user/<str:username>/', async_views.user_detail, name='async-user-detail-by-username'),
+    path('async/user/id/<int:user_id>/', async_views.user_detail, name='async-user-detail-by-id'),
 ]
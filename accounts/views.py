@@ -5,12 +5,14 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
 
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
 from django.http import Http404
 
+from nekidaem_tz.db_router import read_from_replica
 from .models import Account
 from .serializers import AccountCreateSerializer, AccountSerializer
 
@@ -82,6 +84,7 @@ class UserDetailAPIView(APIView):
                 {'error': 'Имя пользователя или ID должны быть указаны'}, status=status.HTTP_400_BAD_REQUEST
             )
 
+    @method_decorator(read_from_replica('user_detail'))
     def get_by_username(self, request, username: str) -> Response:
         """
         Получение информации о пользователе по его имени.
@@ -100,6 +103,7 @@ class UserDetailAPIView(APIView):
         serializer = AccountSerializer(user)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @method_decorator(read_from_replica('user_detail'))
     def get_by_id(self, request, user_id: int) -> Response:
         """
         Получение информации о пользователе по его ID.
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Blog, Post, Subscription, ReadPost
+from .models import Blog, NewsletterRun, NewsletterShard, Post, Subscription, ReadPost
 
 
 class PostInline(admin.StackedInline):
@@ -24,10 +24,13 @@ class BlogAdmin(admin.ModelAdmin):
 
     save_as = True
     inlines = [PostInline]
-    list_display = ['id', 'user']
+    list_display = ['id', 'user', 'posts_count', 'subscribers_count']
+    list_select_related = ['user']
+    raw_id_fields = ['user']
+    readonly_fields = ['posts_count', 'subscribers_count']
     list_display_links = ['id']
     list_per_page = 30
-    search_fields = ['user', 'id']
+    search_fields = ['user__username', 'id']
 
 
 @admin.register(Subscription)
@@ -36,6 +39,8 @@ class SubscriptionAdmin(admin.ModelAdmin):
 
     save_as = True
     list_display = ['id', 'user', 'blog']
+    list_select_related = ['user', 'blog__user']
+    raw_id_fields = ['user', 'blog']
     readonly_fields = ['created_at', 'updated_at']
     list_per_page = 30
     list_display_links = ['id']
@@ -47,6 +52,31 @@ class ReadPostAdmin(admin.ModelAdmin):
 
     save_as = True
     list_display = ['id', 'post', 'user', 'is_read']
+    list_select_related = ['user', 'post__blog__user']
+    raw_id_fields = ['user', 'post']
     list_per_page = 30
     readonly_fields = ['created_at', 'updated_at']
     list_display_links = ['post']
+
+
+class NewsletterShardInline(admin.TabularInline):
+    """ Класс-хелпер для отображения шардов NewsletterShard, связанных с NewsletterRun """
+
+    model = NewsletterShard
+    extra = 0
+    can_delete = False
+    verbose_name_plural = 'Шарды рассылки'
+    verbose_name = 'Шард рассылки'
+    fields = ['start_user_id', 'end_user_id', 'users', 'sent', 'elapsed', 'is_done']
+    readonly_fields = fields
+
+
+@admin.register(NewsletterRun)
+class NewsletterRunAdmin(admin.ModelAdmin):
+    """ Админ-панель для NewsletterRun """
+
+    inlines = [NewsletterShardInline]
+    list_display = ['id', 'date', 'shards', 'users', 'sent', 'elapsed', 'is_done']
+    readonly_fields = ['date', 'shards', 'users', 'sent', 'elapsed', 'is_done', 'created_at', 'updated_at']
+    list_display_links = ['id']
+    list_per_page = 30
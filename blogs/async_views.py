@@ -0,0 +1,150 @@
+from typing import Any, Dict
+
+from asgiref.sync import sync_to_async
+
+from django.http import JsonResponse
+from rest_framework import status
+
+from nekidaem_tz.async_api import async_api_view, json_response
+from nekidaem_tz.db_router import read_from_replica
+from .feed import find_post_ids
+from .feed_cache import FeedPageCache, abump_user_version
+from .models import Blog, Subscription
+from .read_state import mark_read
+from .subscriptions import subscribe, unsubscribe
+from .views import get_blog_ids, get_feed_page, get_mark_read_result, get_post_ids
+
+# Асинхронные (ASGI) версии представлений blogs.views с теми же ответами.
+# Отдельные запросы ORM выполняются через async-API (aget, afirst, async for); составные операции
+# в транзакции (подписка, пометка прочтения, сборка страницы ленты) - одним sync_to_async,
+# чтобы не переключать поток на каждый запрос к БД. Кэш - через async-API (aget, aset).
+
+
+def get_results(outcomes: Dict[int, str]) -> Dict[str, Any]:
+    return {'results': [{'blog_id': blog_id, 'result': outcome} for blog_id, outcome in outcomes.items()]}
+
+
+@async_api_view(['POST'])
+async def subscribe_to_blog(request: Any, blog_id: int) -> JsonResponse:
+    """
+    Подписка на блог пользователя.
+
+    :param request: Запрос пользователя.
+    :param blog_id: Идентификатор блога, на который пользователь хочет подписаться.
+    :return: Сообщение об успешной подписке или ошибке.
+    """
+    blog = await Blog.objects.select_related('user').filter(id=blog_id).afirst()
+    if blog is None:
+        return json_response({'error': 'Блог не найден'}, status=status.HTTP_404_NOT_FOUND)
+    if blog.user_id == request.user.id:
+        return json_response({'error': 'Нельзя подписываться на свой собственный блог'},
+                             status=status.HTTP_400_BAD_REQUEST)
+
+    _, created = await Subscription.objects.aget_or_create(user_id=request.user.id, blog=blog)
+    if not created:
+        return json_response({'message': f'Вы уже подписаны на {blog}'})
+    await abump_user_version(request.user.id)
+    return json_response({'message': f'Вы подписались на {blog}'})
+
+
+@async_api_view(['POST'])
+async def unsubscribe_from_blog(request: Any, blog_id: int) -> JsonResponse:
+    """
+    Отписка от блога пользователя.
+
+    :param request: Запрос пользователя.
+    :param blog_id: Идентификатор блога, от которого пользователь хочет отписаться.
+    :return: Сообщение об успешной отписке или ошибке.
+    """
+    blog = await Blog.objects.select_related('user').filter(id=blog_id).afirst()
+    if blog is None:
+        return json_response({'error': 'Блог не найден'}, status=status.HTTP_404_NOT_FOUND)
+
+    subscription = await Subscription.objects.filter(user_id=request.user.id, blog_id=blog_id).afirst()
+    if subscription is None:
+        return json_response({'error': 'Подписка не была найдена'}, status=status.HTTP_404_NOT_FOUND)
+    await subscription.adelete()
+    await abump_user_version(request.user.id)
+    return json_response({'message': f'Подписка отменена для {blog}'})
+
+
+@async_api_view(['POST'])
+async def subscribe_to_blogs(request: Any) -> JsonResponse:
+    """
+    Подписка на несколько блогов одним запросом (см. blogs.views.subscribe_to_blogs).
+
+    :param request: Запрос пользователя.
+    :return: Результат по каждому блогу: subscribed, already_subscribed, own_blog или not_found.
+    """
+    try:
+        blog_ids = get_blog_ids(request)
+    except ValueError as error:
+        return json_response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return json_response(get_results(await sync_to_async(subscribe)(request.user.id, blog_ids)))
+
+
+@async_api_view(['POST'])
+async def unsubscribe_from_blogs(request: Any) -> JsonResponse:
+    """
+    Отписка от нескольких блогов одним запросом (см. blogs.views.unsubscribe_from_blogs).
+
+    :param request: Запрос пользователя.
+    :return: Результат по каждому блогу: unsubscribed, not_subscribed или not_found.
+    """
+    try:
+        blog_ids = get_blog_ids(request)
+    except ValueError as error:
+        return json_response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return json_response(get_results(await sync_to_async(unsubscribe)(request.user.id, blog_ids)))
+
+
+@async_api_view(['GET'])
+@read_from_replica('news_feed')
+async def news_feed(request: Any) -> JsonResponse:
+    """
+    Лента пользователя (см. blogs.views.news_feed).
+
+    Попадание в кэш страниц обслуживается без потоков: подписки читаются async-запросом ORM, страница - из кэша.
+
+    :param request: Запрос пользователя.
+    :return: Ответ сервера.
+    """
+    subscriptions = [row async for row in Subscription.objects.filter(user_id=request.user.id)
+                                                              .values_list('blog_id', 'is_backfilled')]
+    blog_ids = [blog_id for blog_id, _ in subscriptions]
+    pending_blog_ids = [blog_id for blog_id, is_backfilled in subscriptions if not is_backfilled]
+    if not blog_ids:
+        return json_response({'message': 'Пользователь не подписан ни на один блог'},
+                             status=status.HTTP_404_NOT_FOUND)
+
+    page_cache = await FeedPageCache.acreate(request.user.id, blog_ids, request.query_params.urlencode())
+    data = await page_cache.aget()
+    if data is None:
+        data = await sync_to_async(get_feed_page)(request, request.user.id, blog_ids, pending_blog_ids,
+                                                   page_cache)
+        await page_cache.aset(data)
+    return json_response(data, headers=page_cache.get_headers())
+
+
+@async_api_view(['POST'])
+async def mark_posts_as_read(request: Any) -> JsonResponse:
+    """
+    Помечает выбранные посты как прочитанные (см. blogs.views.mark_posts_as_read).
+
+    :param request: Запрос пользователя.
+    :return: Ответ сервера.
+    """
+    try:
+        post_ids = get_post_ids(request)
+    except ValueError as error:
+        return json_response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    found_ids = await sync_to_async(find_post_ids)(request.user.id, post_ids)
+    read_ids = await sync_to_async(mark_read)(request.user.id, found_ids)
+    if found_ids - read_ids:
+        await abump_user_version(request.user.id)
+
+    data, status_code = get_mark_read_result(post_ids, found_ids, read_ids)
+    return json_response(data, status=status_code)
@@ -0,0 +1,84 @@
+import operator
+from functools import reduce
+from typing import Iterable, Type
+
+from django.conf import settings
+from django.db.models import Count, F, IntegerField, Model, OuterRef, Q, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+
+from accounts.models import Account
+from .models import Blog, Post, Subscription
+
+
+def count_subquery(queryset: QuerySet, field: str) -> Coalesce:
+    """
+    Подзапрос COUNT(*) по связанной таблице для использования в annotate/update.
+
+    :param queryset: Связанные записи.
+    :param field: Поле связи с внешней таблицей.
+    :return: Выражение с количеством связанных записей (0, если их нет).
+    """
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field) \
+                     .annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def change_posts_count(blog_id: int, delta: int) -> None:
+    Blog.objects.filter(id=blog_id).update(posts_count=F('posts_count') + delta)
+
+
+def change_subscription_counts(user_id: int, blog_ids: Iterable[int], delta: int) -> None:
+    """
+    Изменение счетчиков подписчиков блогов и подписок пользователя.
+
+    :param user_id: Идентификатор пользователя.
+    :param blog_ids: Идентификаторы блогов, на которые пользователь подписался (отписался).
+    :param delta: Изменение счетчика подписчиков каждого блога (+1 или -1).
+    """
+    blog_ids = list(blog_ids)
+    Blog.objects.filter(id__in=blog_ids).update(subscribers_count=F('subscribers_count') + delta)
+    Account.objects.filter(id=user_id).update(subscriptions_count=F('subscriptions_count') + delta * len(blog_ids))
+
+
+def reconcile_model(model: Type[Model], counters: dict) -> int:
+    """
+    Сверка счетчиков модели с фактическими COUNT(*) пачками по COUNTERS_RECONCILE_BATCH_SIZE записей.
+
+    Каждая пачка исправляется одним UPDATE ... SET поле = (подзапрос COUNT) для записей с расхождением,
+    без чтения значений в Python: одновременное F()-изменение счетчика не перезаписывается устаревшим значением.
+
+    :param model: Модель со счетчиками.
+    :param counters: Словарь {поле счетчика: выражение с фактическим количеством}.
+    :return: Количество исправленных записей.
+    """
+    batch_size = settings.COUNTERS_RECONCILE_BATCH_SIZE
+    actual = {f'actual_{field}': expression for field, expression in counters.items()}
+    drifted = reduce(operator.or_, (~Q(**{field: F(f'actual_{field}')}) for field in counters))
+    pks = model.objects.order_by('pk').values_list('pk', flat=True)
+    fixed = 0
+    last_pk = 0
+
+    while True:
+        batch = model.objects.filter(pk__gt=last_pk)
+        # граница пачки - pk записи с номером batch_size; у последней пачки границы нет
+        upper_pk = pks.filter(pk__gt=last_pk)[batch_size - 1:batch_size].first()
+        if upper_pk is not None:
+            batch = batch.filter(pk__lte=upper_pk)
+        fixed += batch.annotate(**actual).filter(drifted).update(**counters)
+        if upper_pk is None:
+            return fixed
+        last_pk = upper_pk
+
+
+def reconcile_counters() -> int:
+    """
+    Исправление расхождений денормализованных счетчиков блогов и пользователей.
+
+    :return: Количество исправленных записей.
+    """
+    return reconcile_model(Blog, {
+        'posts_count': count_subquery(Post.objects.all(), 'blog'),
+        'subscribers_count': count_subquery(Subscription.objects.all(), 'blog'),
+    }) + reconcile_model(Account, {
+        'subscriptions_count': count_subquery(Subscription.objects.all(), 'user'),
+    })
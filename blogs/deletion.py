@@ -0,0 +1,58 @@
+from typing import Dict
+
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import Account
+from .counters import change_posts_count
+from .feed import delete_in_batches
+from .feed_cache import bump_blog_versions
+from .models import FanOutCheckpoint, FeedEntry, OutboxEvent, Post, ReadPost
+from .outbox import add_event
+
+
+def tombstone_post(post: Post) -> bool:
+    """
+    Быстрое удаление поста в запросе: пост помечается deleted_at и пропадает из выборок Post.objects.
+
+    В той же транзакции уменьшается счетчик постов блога и записывается событие outbox,
+    по которому purge_deleted_post асинхронно очищает ленты и прочтения и удаляет пост.
+
+    :param post: Пост.
+    :return: Был ли пост помечен (False, если он уже удален).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        if not Post.all_objects.filter(id=post.id, deleted_at__isnull=True).update(deleted_at=now, updated_at=now):
+            return False
+        change_posts_count(post.blog_id, -1)
+        add_event(OutboxEvent.POST_DELETED, {'post_id': post.id}, f'{OutboxEvent.POST_DELETED}:{post.id}')
+    bump_blog_versions([post.blog_id])
+    return True
+
+
+def purge_post(post_id: int, batch_size: int) -> Dict[str, int]:
+    """
+    Очистка помеченного поста: строки лент и прочтений удаляются пачками, затем удаляется сам пост.
+
+    Компактное состояние прочтения (ReadState) не чистится: идентификаторы постов не переиспользуются.
+    Повторный запуск безопасен.
+
+    :param post_id: Идентификатор поста.
+    :param batch_size: Количество строк в пачке.
+    :return: Количество удаленных строк по таблицам.
+    """
+    querysets = {
+        'feed_entries': FeedEntry.objects.filter(post_id=post_id),
+        'read_posts': ReadPost.objects.filter(post_id=post_id),
+        'delivered': Account.read_posts.through.objects.filter(post_id=post_id),
+        'checkpoints': FanOutCheckpoint.objects.filter(post_id=post_id),
+    }
+    stats = {name: delete_in_batches(queryset, batch_size) for name, queryset in querysets.items()}
+
+    post = Post.all_objects.filter(id=post_id, deleted_at__isnull=False).first()
+    stats['posts'] = 0
+    if post is not None:
+        post.delete()
+        stats['posts'] = 1
+    return stats
@@ -0,0 +1,314 @@
+import heapq
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db.models import F, Q, QuerySet, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from accounts.models import Account
+from .models import Blog, FeedEntry, Post, ReadPost, Subscription
+from .read_state import ROWS
+
+PUSH = 'push'
+PULL = 'pull'
+HYBRID = 'hybrid'
+
+FeedItem = Tuple[datetime, int]
+
+
+def get_pull_blog_ids(blog_ids: Iterable[int]) -> Set[int]:
+    """
+    Блоги, посты которых не раскладываются по лентам, а подмешиваются при чтении.
+
+    Зависит от NEWS_FEED_STRATEGY: push - таких блогов нет, pull - все блоги,
+    hybrid - блоги, у которых подписчиков (Blog.subscribers_count) больше NEWS_FEED_FANOUT_THRESHOLD.
+
+    :param blog_ids: Идентификаторы блогов.
+    :return: Идентификаторы блогов, читаемых при запросе ленты.
+    """
+    blog_ids = list(blog_ids)
+    strategy = settings.NEWS_FEED_STRATEGY
+    if strategy == PUSH or not blog_ids:
+        return set()
+    if strategy == PULL:
+        return set(blog_ids)
+
+    return set(Blog.objects.filter(id__in=blog_ids, subscribers_count__gt=settings.NEWS_FEED_FANOUT_THRESHOLD)
+                           .values_list('id', flat=True))
+
+
+def get_feed_posts() -> QuerySet:
+    """
+    Посты, которые могут попасть в ленты: не старше NEWS_FEED_MAX_AGE_DAYS дней.
+
+    Граница по created_at позволяет PostgreSQL отсечь старые партиции таблицы постов еще при планировании запроса.
+    """
+    posts = Post.objects.all()
+    if settings.NEWS_FEED_MAX_AGE_DAYS:
+        posts = posts.filter(created_at__gte=timezone.now() - timedelta(days=settings.NEWS_FEED_MAX_AGE_DAYS))
+    return posts
+
+
+def get_feed_items(user_id: int, blog_ids: Iterable[int], limit: Optional[int] = None,
+                   after: Optional[FeedItem] = None, pending_blog_ids: Iterable[int] = ()) -> List[FeedItem]:
+    """
+    Лента пользователя от новых постов к старым.
+
+    Материализованная лента (FeedEntry) сливается с последними постами блогов,
+    которые не раскладываются по лентам (см. get_pull_blog_ids).
+
+    :param user_id: Идентификатор пользователя.
+    :param blog_ids: Идентификаторы блогов, на которые подписан пользователь.
+    :param limit: Количество постов, по умолчанию NEWS_FEED_SIZE.
+    :param after: Курсор (дата создания, идентификатор поста): вернуть посты старше него.
+    :param pending_blog_ids: Блоги новых подписок, лента по которым еще не заполнена: читаются при запросе.
+    :return: Список пар (дата создания, идентификатор поста).
+    """
+    size = limit or settings.NEWS_FEED_SIZE
+    blog_ids = list(blog_ids)
+    pull_blog_ids = get_pull_blog_ids(blog_ids) | set(pending_blog_ids)
+
+    # записи отписанных блогов могут оставаться в ленте до выполнения purge_feed, записи помеченных
+    # удаленными постов - до purge_deleted_post: такие посты отсекаются до LIMIT соединением с постами
+    # (по id и created_at, чтобы PostgreSQL читал только партицию поста)
+    pushed = FeedEntry.objects.filter(user_id=user_id, blog_id__in=blog_ids, post__deleted_at__isnull=True,
+                                      post__created_at=F('created_at'))
+    if after is not None:
+        pushed = pushed.filter(Q(created_at__lt=after[0]) | Q(created_at=after[0], post_id__lt=after[1]))
+    pushed = pushed.order_by('-created_at', '-post_id').values_list('created_at', 'post_id')[:size]
+    if not pull_blog_ids:
+        return list(pushed)
+
+    pulled = get_feed_posts().filter(blog_id__in=pull_blog_ids)
+    if after is not None:
+        pulled = pulled.filter(Q(created_at__lt=after[0]) | Q(created_at=after[0], id__lt=after[1]))
+    pulled = pulled.order_by('-created_at', '-id').values_list('created_at', 'id')[:size]
+
+    items: List[FeedItem] = []
+    seen: Set[int] = set()
+    for item in heapq.merge(pushed, pulled, reverse=True):
+        if item[1] not in seen:
+            seen.add(item[1])
+            items.append(item)
+            if len(items) == size:
+                break
+    return items
+
+
+def get_item_posts(items: List[FeedItem]) -> Dict[int, Post]:
+    """
+    Посты элементов ленты.
+
+    Запрос ограничен не только id, но и диапазоном created_at элементов: PostgreSQL читает только партиции
+    постов этих месяцев, а не ищет каждый id во всех партициях.
+
+    :param items: Элементы ленты (дата создания, идентификатор поста).
+    :return: Словарь {идентификатор поста: пост}.
+    """
+    if not items:
+        return {}
+    dates = [created_at for created_at, _ in items]
+    return Post.objects.filter(created_at__range=(min(dates), max(dates))).in_bulk([post_id for _, post_id in items])
+
+
+def find_post_ids(user_id: int, post_ids: List[int]) -> Set[int]:
+    """
+    Существующие посты из переданных идентификаторов.
+
+    Даты создания постов из ленты пользователя берутся из FeedEntry, и запрос к постам ограничивается их
+    диапазоном created_at (отсечение партиций); посты вне материализованной ленты ищутся только по id.
+
+    :param user_id: Идентификатор пользователя.
+    :param post_ids: Идентификаторы постов.
+    :return: Идентификаторы найденных постов.
+    """
+    in_feed = dict(FeedEntry.objects.filter(user_id=user_id, post_id__in=post_ids).values_list('post_id', 'created_at'))
+    found = set()
+    if in_feed:
+        dates = in_feed.values()
+        found.update(Post.objects.filter(id__in=list(in_feed), created_at__range=(min(dates), max(dates)))
+                                 .values_list('id', flat=True))
+    rest = [post_id for post_id in post_ids if post_id not in in_feed]
+    if rest:
+        found.update(Post.objects.filter(id__in=rest).values_list('id', flat=True))
+    return found
+
+
+def iter_subscriber_ids(blog_id: int, after_user_id: int = 0,
+                        until_user_id: Optional[int] = None) -> Iterator[List[int]]:
+    """
+    Обход подписчиков блога пачками по NEWS_FEED_FANOUT_BATCH_SIZE в порядке user_id (keyset).
+
+    :param blog_id: Идентификатор блога.
+    :param after_user_id: Обход начинается с подписчиков, чей id больше указанного.
+    :param until_user_id: Обход заканчивается на подписчике с указанным id (включительно).
+    :return: Итератор по пачкам идентификаторов подписчиков.
+    """
+    batch_size = settings.NEWS_FEED_FANOUT_BATCH_SIZE
+    subscribers = Subscription.objects.filter(blog_id=blog_id).order_by('user_id')
+    if until_user_id is not None:
+        subscribers = subscribers.filter(user_id__lte=until_user_id)
+
+    while True:
+        user_ids = list(subscribers.filter(user_id__gt=after_user_id).values_list('user_id', flat=True)[:batch_size])
+        if not user_ids:
+            return
+        yield user_ids
+        after_user_id = user_ids[-1]
+
+
+def push_to_feeds(posts: List[Post], user_ids: List[int]) -> int:
+    """
+    Записывает посты в ленты пользователей одним bulk_create.
+
+    При READ_STATE_BACKEND = 'rows' посты также записываются в Account.read_posts пользователей.
+
+    :param posts: Посты.
+    :param user_ids: Идентификаторы пользователей.
+    :return: Количество строк, отправленных на запись (уже существующие строки пропускаются БД).
+    """
+    entries = [FeedEntry(user_id=user_id, post_id=post.id, blog_id=post.blog_id, created_at=post.created_at)
+               for post in posts for user_id in user_ids]
+    rows = len(FeedEntry.objects.bulk_create(entries, ignore_conflicts=True))
+
+    if settings.READ_STATE_BACKEND == ROWS:
+        read_posts_through = Account.read_posts.through
+        delivered = [read_posts_through(account_id=user_id, post_id=post.id)
+                     for post in posts for user_id in user_ids]
+        rows += len(read_posts_through.objects.bulk_create(delivered, ignore_conflicts=True))
+    return rows
+
+
+def split_subscribers(blog_id: int) -> List[Tuple[int, int]]:
+    """
+    Делит подписчиков блога на диапазоны user_id по NEWS_FEED_FANOUT_CHUNK_SIZE подписчиков.
+
+    :param blog_id: Идентификатор блога.
+    :return: Список диапазонов (начало не включительно, конец включительно).
+    """
+    chunk_size = settings.NEWS_FEED_FANOUT_CHUNK_SIZE
+    subscribers = Subscription.objects.filter(blog_id=blog_id).order_by('user_id').values_list('user_id', flat=True)
+    ranges = []
+    start = 0
+
+    while True:
+        end = next(iter(subscribers.filter(user_id__gt=start)[chunk_size - 1:chunk_size]), None)
+        if end is None:
+            end = subscribers.filter(user_id__gt=start).last()
+            if end is not None:
+                ranges.append((start, end))
+            return ranges
+        ranges.append((start, end))
+        start = end
+
+
+def fan_out_post(post: Post) -> int:
+    """
+    Раскладывает пост по лентам всех подписчиков блога.
+
+    Посты блогов, читаемых при запросе ленты (см. get_pull_blog_ids), не раскладываются.
+
+    :param post: Новый пост.
+    :return: Количество строк, отправленных на запись (уже существующие строки пропускаются БД).
+    """
+    if get_pull_blog_ids([post.blog_id]):
+        return 0
+
+    return sum(push_to_feeds([post], user_ids) for user_ids in iter_subscriber_ids(post.blog_id))
+
+
+def backfill_feed(user_id: int, blog_ids: Iterable[int]) -> int:
+    """
+    Добавляет в ленту пользователя последние NEWS_FEED_BACKFILL_SIZE постов каждого блога (например, после подписки).
+
+    Блоги, на которые пользователь уже не подписан или которые читаются при запросе ленты, пропускаются.
+    Подписки отмечаются is_backfilled: до этого посты блога читаются при запросе ленты (см. get_feed_items).
+
+    :param user_id: Идентификатор пользователя.
+    :param blog_ids: Идентификаторы блогов.
+    :return: Количество строк ленты, отправленных на запись.
+    """
+    subscriptions = Subscription.objects.filter(user_id=user_id, blog_id__in=list(blog_ids))
+    blog_ids = set(subscriptions.values_list('blog_id', flat=True))
+    blog_ids -= get_pull_blog_ids(blog_ids)
+    if not blog_ids:
+        subscriptions.update(is_backfilled=True)
+        return 0
+
+    posts = get_feed_posts().filter(blog_id__in=blog_ids) \
+                            .annotate(position=Window(RowNumber(), partition_by=[F('blog_id')],
+                                                      order_by=[F('created_at').desc(), F('id').desc()])) \
+                            .filter(position__lte=settings.NEWS_FEED_BACKFILL_SIZE) \
+                            .values_list('id', 'blog_id', 'created_at')
+    entries = [FeedEntry(user_id=user_id, post_id=post_id, blog_id=blog_id, created_at=created_at)
+               for post_id, blog_id, created_at in posts]
+    written = len(FeedEntry.objects.bulk_create(entries, batch_size=settings.NEWS_FEED_FANOUT_BATCH_SIZE,
+                                                ignore_conflicts=True))
+    trim_feeds([user_id])
+    subscriptions.update(is_backfilled=True)
+    return written
+
+
+def purge_feed(user_id: int, blog_ids: Iterable[int]) -> int:
+    """
+    Удаляет из ленты пользователя посты блогов (например, после отписки) пачками по NEWS_FEED_FANOUT_BATCH_SIZE.
+
+    При READ_STATE_BACKEND = 'rows' удаляются и строки прочтений (ReadPost, Account.read_posts) постов этих блогов.
+    Блоги, на которые пользователь снова подписан, пропускаются.
+
+    :param user_id: Идентификатор пользователя.
+    :param blog_ids: Идентификаторы блогов.
+    :return: Количество удаленных строк.
+    """
+    blog_ids = set(blog_ids) - set(Subscription.objects.filter(user_id=user_id, blog_id__in=list(blog_ids))
+                                                       .values_list('blog_id', flat=True))
+    if not blog_ids:
+        return 0
+
+    batch_size = settings.NEWS_FEED_FANOUT_BATCH_SIZE
+    deleted = delete_in_batches(FeedEntry.objects.filter(user_id=user_id, blog_id__in=blog_ids), batch_size)
+    if settings.READ_STATE_BACKEND == ROWS:
+        deleted += delete_in_batches(ReadPost.objects.filter(user_id=user_id, post__blog_id__in=blog_ids),
+                                     batch_size)
+        deleted += delete_in_batches(Account.read_posts.through.objects.filter(account_id=user_id,
+                                                                               post__blog_id__in=blog_ids),
+                                     batch_size)
+    return deleted
+
+
+def delete_in_batches(queryset: QuerySet, batch_size: int) -> int:
+    """
+    Удаляет строки выборки пачками по batch_size, каждая пачка - отдельный короткий DELETE.
+
+    :param queryset: Выборка.
+    :param batch_size: Количество строк в пачке.
+    :return: Количество удаленных строк.
+    """
+    deleted = 0
+    while True:
+        ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += queryset.model.objects.filter(pk__in=ids).delete()[0]
+
+
+def trim_feeds(user_ids: Iterable[int]) -> int:
+    """
+    Обрезает ленты пользователей до NEWS_FEED_SIZE самых новых записей.
+
+    :param user_ids: Идентификаторы пользователей.
+    :return: Количество удаленных строк ленты.
+    """
+    overflow: List[int] = list(
+        FeedEntry.objects.filter(user_id__in=list(user_ids))
+                         .annotate(position=Window(RowNumber(), partition_by=[F('user_id')],
+                                                   order_by=[F('created_at').desc(), F('post_id').desc()]))
+                         .filter(position__gt=settings.NEWS_FEED_SIZE)
+                         .values_list('id', flat=True)
+    )
+    if not overflow:
+        return 0
+    deleted, _ = FeedEntry.objects.filter(id__in=overflow).delete()
+    return deleted
@@ -0,0 +1,159 @@
+import hashlib
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from nekidaem_tz.db_router import using_replica
+
+HITS_KEY = 'news_feed:stats:hits'
+MISSES_KEY = 'news_feed:stats:misses'
+
+
+def user_version_key(user_id: int) -> str:
+    return f'news_feed:version:user:{user_id}'
+
+
+def blog_version_key(blog_id: int) -> str:
+    return f'news_feed:version:blog:{blog_id}'
+
+
+def new_version() -> str:
+    """ Новая версия ленты: время смены и случайная часть. """
+    return f'{time.time():.6f}:{uuid.uuid4().hex}'
+
+
+def get_version_time(version: str) -> float:
+    """ Время смены версии (0 для версий без времени). """
+    changed_at, separator, _ = version.partition(':')
+    return float(changed_at) if separator else 0.0
+
+
+def bump_user_version(user_id: int) -> None:
+    """ Инвалидация закэшированных страниц ленты пользователя. """
+    cache.set(user_version_key(user_id), new_version(), None)
+
+
+async def abump_user_version(user_id: int) -> None:
+    await cache.aset(user_version_key(user_id), new_version(), None)
+
+
+def bump_blog_versions(blog_ids: Iterable[int]) -> None:
+    """ Инвалидация закэшированных страниц лент всех подписчиков блогов. """
+    cache.set_many({blog_version_key(blog_id): new_version() for blog_id in blog_ids}, None)
+
+
+def incr_counter(key: str, delta: int = 1) -> None:
+    cache.add(key, 0, None)
+    cache.incr(key, delta)
+
+
+async def aincr_counter(key: str, delta: int = 1) -> None:
+    await cache.aadd(key, 0, None)
+    await cache.aincr(key, delta)
+
+
+class FeedPageCache:
+    """
+    Кэш сериализованных страниц ленты пользователя.
+
+    Ключ страницы включает версию пользователя и версии всех блогов, на которые он подписан,
+    поэтому для инвалидации достаточно сменить версию (без удаления ключей по маске).
+    С теми же версиями кэшируется количество непрочитанных постов ленты - общее для всех страниц.
+    Версии и счетчики попаданий читаются одним get_many.
+
+    Страница, прочитанная с реплики в течение DATABASE_STICKY_SECONDS секунд после смены любой из версий,
+    не кэшируется: реплика могла еще не получить изменение, а ключ уже новый, и неполная страница
+    отдавалась бы из кэша до истечения NEWS_FEED_CACHE_TIMEOUT.
+    Для асинхронных представлений - acreate, aget и aset.
+    """
+
+    def __init__(self, user_id: int, blog_ids: List[int], page_key: str, load: bool = True):
+        self.user_id = user_id
+        self.page_key = page_key
+        self.version_keys = [user_version_key(user_id)] + [blog_version_key(blog_id) for blog_id in sorted(blog_ids)]
+        self.is_hit = False
+        if load:
+            values = cache.get_many(self.version_keys + [HITS_KEY, MISSES_KEY])
+            missing = self.get_missing_versions(values)
+            if missing:
+                cache.set_many(missing, None)
+            self.load(values)
+
+    @classmethod
+    async def acreate(cls, user_id: int, blog_ids: List[int], page_key: str) -> 'FeedPageCache':
+        page_cache = cls(user_id, blog_ids, page_key, load=False)
+        values = await cache.aget_many(page_cache.version_keys + [HITS_KEY, MISSES_KEY])
+        missing = page_cache.get_missing_versions(values)
+        if missing:
+            await cache.aset_many(missing, None)
+        page_cache.load(values)
+        return page_cache
+
+    def get_missing_versions(self, values: Dict[str, Any]) -> Dict[str, str]:
+        """ Новые версии для ключей, которых еще нет в кэше; добавляются в values. """
+        missing = {key: new_version() for key in self.version_keys if key not in values}
+        values.update(missing)
+        return missing
+
+    def load(self, values: Dict[str, Any]) -> None:
+        versions = '|'.join(f'{key}={values[key]}' for key in self.version_keys)
+        digest = hashlib.md5(f'{versions}|{self.page_key}'.encode()).hexdigest()
+        self.key = f'news_feed:page:{self.user_id}:{digest}'
+        self.unread_key = f'news_feed:unread:{self.user_id}:{hashlib.md5(versions.encode()).hexdigest()}'
+        self.changed_at = max(get_version_time(values[key]) for key in self.version_keys)
+        self.hits = values.get(HITS_KEY, 0)
+        self.misses = values.get(MISSES_KEY, 0)
+
+    def count(self, data: Optional[Dict[str, Any]]) -> str:
+        """ Учитывает попадание/промах в статистике экземпляра, возвращает ключ общего счетчика. """
+        self.is_hit = data is not None
+        if self.is_hit:
+            self.hits += 1
+            return HITS_KEY
+        self.misses += 1
+        return MISSES_KEY
+
+    def get(self) -> Optional[Dict[str, Any]]:
+        """ Закэшированная страница или None; попадание/промах учитывается в статистике. """
+        data = cache.get(self.key)
+        incr_counter(self.count(data))
+        return data
+
+    async def aget(self) -> Optional[Dict[str, Any]]:
+        data = await cache.aget(self.key)
+        await aincr_counter(self.count(data))
+        return data
+
+    def is_cacheable(self) -> bool:
+        """ Прочитанные данные можно кэшировать: чтение с основной БД или версии сменились давно. """
+        return not using_replica() or time.time() - self.changed_at >= settings.DATABASE_STICKY_SECONDS
+
+    def set(self, data: Dict[str, Any]) -> None:
+        if self.is_cacheable():
+            cache.set(self.key, data, settings.NEWS_FEED_CACHE_TIMEOUT)
+
+    async def aset(self, data: Dict[str, Any]) -> None:
+        if self.is_cacheable():
+            await cache.aset(self.key, data, settings.NEWS_FEED_CACHE_TIMEOUT)
+
+    def get_unread_count(self) -> Optional[int]:
+        return cache.get(self.unread_key)
+
+    def set_unread_count(self, count: int) -> None:
+        if self.is_cacheable():
+            cache.set(self.unread_key, count, settings.NEWS_FEED_CACHE_TIMEOUT)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get_headers(self) -> Dict[str, str]:
+        """ Заголовки ответа со статусом кэша и долей попаданий. """
+        return {
+            'X-Cache': 'HIT' if self.is_hit else 'MISS',
+            'X-Cache-Hit-Ratio': f'{self.hit_ratio:.4f}',
+        }
@@ -0,0 +1,236 @@
+import heapq
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Any, Dict, Iterable, List, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from faker import Faker
+
+from accounts.models import Account
+from .feed import get_feed_posts, get_pull_blog_ids
+from .models import Blog, FeedEntry, Post, ReadPost, ReadState, Subscription
+from .read_state import ROWS, PostIdSet, compact
+
+# Синтетические данные для нагрузочного тестирования (см. команду generate_load_data).
+# Генерация разбита на пачки (start, count), которые выполняются в текущем процессе или в пуле процессов:
+# общие данные (идентификаторы блогов, веса популярности) передаются процессам один раз через configure.
+
+# Заголовки и тексты постов выбираются из заранее сгенерированных: Faker на каждый пост слишком медленный
+TEXTS_POOL_SIZE = 200
+
+_state: Dict[str, Any] = {}
+
+
+def configure(state: Dict[str, Any]) -> None:
+    """ Общие параметры генерации для пачек текущего процесса (инициализатор пула процессов). """
+    _state.clear()
+    _state.update(state)
+
+
+def make_state(prefix: str, password: str, batch_size: int, seed: int, now: datetime, days: int, follows: int,
+               skew: float, read_ratio: float) -> Dict[str, Any]:
+    """ Общие параметры генерации; идентификаторы блогов добавляются после создания аккаунтов (см. add_blogs). """
+    fake = Faker()
+    Faker.seed(seed)
+    return {
+        'prefix': prefix,
+        'password': password,
+        'batch_size': batch_size,
+        'seed': seed,
+        'now': now,
+        'days': days,
+        'follows': follows,
+        'skew': skew,
+        'read_ratio': read_ratio,
+        'titles': [fake.sentence()[:100] for _ in range(TEXTS_POOL_SIZE)],
+        'contents': [fake.text(max_nb_chars=140) for _ in range(TEXTS_POOL_SIZE)],
+    }
+
+
+def add_blogs(state: Dict[str, Any]) -> None:
+    """
+    Добавляет в параметры блоги созданных аккаунтов и их популярность.
+
+    Популярность степенная: блог ранга r получает подписчиков с весом 1 / (r + 1) ** skew,
+    ранги перемешаны, чтобы популярность не зависела от идентификатора.
+    """
+    rows = list(Blog.objects.filter(user__username__startswith=state['prefix']).order_by('id')
+                            .values_list('id', 'user_id'))
+    rng = random.Random(state['seed'])
+    ranked = [blog_id for blog_id, _ in rows]
+    rng.shuffle(ranked)
+    state['blogs'] = rows
+    state['ranked_blog_ids'] = ranked
+    state['cum_weights'] = list(accumulate(1 / (rank + 1) ** state['skew'] for rank in range(len(ranked))))
+
+
+def get_rng(start: int) -> random.Random:
+    return random.Random(f'{_state["seed"]}:{start}')
+
+
+def create_accounts(start: int, count: int) -> int:
+    """
+    Создает аккаунты с блогами с номерами [start, start + count).
+
+    :return: Количество созданных аккаунтов.
+    """
+    batch_size = _state['batch_size']
+    for offset in range(start, start + count, batch_size):
+        numbers = range(offset, min(offset + batch_size, start + count))
+        with transaction.atomic():
+            accounts = Account.objects.bulk_create([Account(username=f'{_state["prefix"]}{number}',
+                                                            password=_state['password']) for number in numbers])
+            Blog.objects.bulk_create([Blog(user=account) for account in accounts])
+    return count
+
+
+def create_posts(start: int, count: int) -> int:
+    """
+    Создает count постов в случайных блогах с датой создания в пределах последних days дней.
+
+    :return: Количество созданных постов.
+    """
+    rng = get_rng(start)
+    blogs, titles, contents = _state['blogs'], _state['titles'], _state['contents']
+    spread = _state['days'] * 86400
+    batch_size = _state['batch_size']
+    for offset in range(start, start + count, batch_size):
+        posts = []
+        for _ in range(offset, min(offset + batch_size, start + count)):
+            created_at = _state['now'] - timedelta(seconds=rng.uniform(0, spread))
+            posts.append(Post(blog_id=rng.choice(blogs)[0], title=rng.choice(titles), content=rng.choice(contents),
+                              created_at=created_at, updated_at=created_at))
+        Post.objects.bulk_create(posts)
+    return count
+
+
+def get_followed_blog_ids(rng: random.Random, own_blog_id: int) -> List[int]:
+    """ До follows блогов с вероятностью по популярности, без своего блога. """
+    ranked, cum_weights, follows = _state['ranked_blog_ids'], _state['cum_weights'], _state['follows']
+    followed = dict.fromkeys(rng.choices(ranked, cum_weights=cum_weights, k=follows * 2))
+    followed.pop(own_blog_id, None)
+    return list(followed)[:follows]
+
+
+def create_subscriptions(start: int, count: int) -> int:
+    """
+    Подписки аккаунтов с порядковыми номерами [start, start + count) в списке блогов.
+
+    :return: Количество созданных подписок.
+    """
+    rng = get_rng(start)
+    created = 0
+    subscriptions = []
+    for blog_id, user_id in _state['blogs'][start:start + count]:
+        subscriptions.extend(Subscription(user_id=user_id, blog_id=followed_id)
+                             for followed_id in get_followed_blog_ids(rng, blog_id))
+        if len(subscriptions) >= _state['batch_size']:
+            created += len(Subscription.objects.bulk_create(subscriptions))
+            subscriptions = []
+    return created + len(Subscription.objects.bulk_create(subscriptions))
+
+
+def get_latest_posts(blog_ids: Iterable[int], size: int) -> Dict[int, List[Tuple[datetime, int, int]]]:
+    """ Последние size постов каждого блога одним запросом: {блог: [(дата создания, пост, блог)]}. """
+    posts: Dict[int, List[Tuple[datetime, int, int]]] = defaultdict(list)
+    blog_ids = list(blog_ids)
+    if not blog_ids:
+        return posts
+
+    rows = get_feed_posts().filter(blog_id__in=blog_ids) \
+                           .annotate(position=Window(RowNumber(), partition_by=[F('blog_id')],
+                                                     order_by=[F('created_at').desc(), F('id').desc()])) \
+                           .filter(position__lte=size) \
+                           .values_list('created_at', 'id', 'blog_id')
+    for created_at, post_id, blog_id in rows:
+        posts[blog_id].append((created_at, post_id, blog_id))
+    return posts
+
+
+def create_feeds(start: int, count: int) -> int:
+    """
+    Заполняет ленты аккаунтов [start, start + count) и помечает прочитанной долю read_ratio постов ленты.
+
+    То же, что backfill_feed и mark_read по каждому аккаунту, но для всей пачки: последние посты блогов
+    читаются одним запросом, записи лент и состояние прочтения пишутся bulk_create.
+
+    :return: Количество обработанных аккаунтов.
+    """
+    rng = get_rng(start)
+    user_ids = [user_id for _, user_id in _state['blogs'][start:start + count]]
+    blog_ids: Dict[int, List[int]] = {user_id: [] for user_id in user_ids}
+    for user_id, blog_id in Subscription.objects.filter(user_id__in=user_ids).values_list('user_id', 'blog_id'):
+        blog_ids[user_id].append(blog_id)
+
+    followed = {blog_id for followed_ids in blog_ids.values() for blog_id in followed_ids}
+    pull_blog_ids = get_pull_blog_ids(followed)
+    pushed = get_latest_posts(followed - pull_blog_ids, settings.NEWS_FEED_BACKFILL_SIZE)
+    pulled = get_latest_posts(pull_blog_ids, settings.NEWS_FEED_SIZE)
+
+    entries, read_posts = [], {}
+    for user_id, followed_ids in blog_ids.items():
+        if not followed_ids:
+            continue
+        # лента обрезается до NEWS_FEED_SIZE, как в trim_feeds и get_feed_items
+        feed = heapq.nlargest(settings.NEWS_FEED_SIZE, (post for blog_id in followed_ids
+                                                        for post in pushed.get(blog_id, ())))
+        entries.extend(FeedEntry(user_id=user_id, post_id=post_id, blog_id=blog_id, created_at=created_at)
+                       for created_at, post_id, blog_id in feed)
+        feed = heapq.nlargest(settings.NEWS_FEED_SIZE, feed + [post for blog_id in followed_ids
+                                                               for post in pulled.get(blog_id, ())])
+        post_ids = [post_id for _, post_id, _ in feed]
+        read_ids = rng.sample(post_ids, int(len(post_ids) * _state['read_ratio']))
+        if read_ids:
+            read_posts[user_id] = (read_ids, post_ids)
+
+    with transaction.atomic():
+        FeedEntry.objects.bulk_create(entries, batch_size=_state['batch_size'], ignore_conflicts=True)
+        Subscription.objects.filter(user_id__in=user_ids).update(is_backfilled=True)
+        create_read_state(read_posts)
+    return count
+
+
+def create_read_state(read_posts: Dict[int, Tuple[List[int], List[int]]]) -> None:
+    """
+    Состояние прочтения новых аккаунтов пачкой bulk_create (см. mark_read).
+
+    :param read_posts: {аккаунт: (прочитанные посты, посты ленты)}.
+    """
+    batch_size = _state['batch_size']
+    if settings.READ_STATE_BACKEND == ROWS:
+        ReadPost.objects.bulk_create([ReadPost(user_id=user_id, post_id=post_id, is_read=True)
+                                      for user_id, (read_ids, _) in read_posts.items() for post_id in read_ids],
+                                     batch_size=batch_size, ignore_conflicts=True)
+        return
+
+    states = []
+    for user_id, (read_ids, feed_ids) in read_posts.items():
+        ids = PostIdSet(read_ids)
+        watermark = compact(0, ids, feed_ids)
+        states.append(ReadState(user_id=user_id, watermark=watermark, bitmap=ids.to_bytes()))
+    ReadState.objects.bulk_create(states, batch_size=batch_size, ignore_conflicts=True)
+
+
+def split(total: int, chunk_size: int) -> List[Tuple[int, int]]:
+    """ Пачки (start, count) по chunk_size элементов. """
+    return [(start, min(chunk_size, total - start)) for start in range(0, total, chunk_size)]
+
+
+def run_chunk(task: Tuple[str, int, int]) -> int:
+    """ Выполнение пачки в процессе пула: (имя функции генерации, start, count). """
+    name, start, count = task
+    return STEPS[name](start, count)
+
+
+STEPS = {
+    'accounts': create_accounts,
+    'posts': create_posts,
+    'subscriptions': create_subscriptions,
+    'feeds': create_feeds,
+}
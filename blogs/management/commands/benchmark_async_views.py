@@ -0,0 +1,196 @@
+import asyncio
+import json
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from accounts.models import Account
+from blogs.counters import count_subquery
+from blogs.feed import backfill_feed
+from blogs.models import Blog, Post, Subscription
+
+PREFIX = 'bench_async_'
+# (эндпоинт, имя URL синхронной версии, имя URL асинхронной версии)
+ENDPOINTS = [
+    ('news_feed', 'news_feed', 'async-news-feed'),
+    ('user_detail', 'user-detail-by-id', 'async-user-detail-by-id'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочное сравнение синхронных представлений под WSGI (пул потоков) и асинхронных под ASGI ' \
+           '(конкурентные запросы в цикле событий) на одинаковых данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Количество читателей')
+        parser.add_argument('--authors', type=int, default=50, help='Количество авторов (блогов)')
+        parser.add_argument('--follows', type=int, default=10, help='Количество подписок на читателя')
+        parser.add_argument('--posts', type=int, default=2000, help='Количество постов')
+        parser.add_argument('--requests', type=int, default=2000, help='Количество запросов на сценарий')
+        parser.add_argument('--threads', type=int, default=8, help='Потоков WSGI-сервера')
+        parser.add_argument('--concurrency', type=int, default=200, help='Одновременных запросов ASGI')
+        parser.add_argument('--no-cache', action='store_true', help='Без кэша страниц ленты')
+        parser.add_argument('--json', action='store_true', help='Вывести результаты в JSON')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        """ Хелпер по хендлеру """
+        random.seed(options['seed'])
+        # данные должны быть видны соединениям других потоков, поэтому фиксируются и удаляются в конце
+        sessions = self.seed(options['users'], options['authors'], options['follows'], options['posts'])
+        results = []
+        try:
+            cache_timeout = 0 if options['no_cache'] else settings.NEWS_FEED_CACHE_TIMEOUT
+            with override_settings(NEWS_FEED_CACHE_TIMEOUT=cache_timeout):
+                for endpoint, sync_name, async_name in ENDPOINTS:
+                    requests = self.get_requests(endpoint, sessions, options['requests'])
+                    for server, implementation, url_name in [('wsgi', 'sync', sync_name),
+                                                             ('asgi', 'sync', sync_name),
+                                                             ('asgi', 'async', async_name)]:
+                        run = self.run_wsgi if server == 'wsgi' else self.run_asgi
+                        workers = options['threads'] if server == 'wsgi' else options['concurrency']
+                        stats = run(url_name, requests, workers)
+                        results.append({'endpoint': endpoint, 'server': server, 'implementation': implementation,
+                                        'workers': workers, **stats})
+        finally:
+            Session.objects.filter(session_key__in=[key for _, key in sessions]).delete()
+            Account.objects.filter(username__startswith=PREFIX).delete()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for result in results:
+            self.stdout.write(
+                f"{result['endpoint']:<12} {result['server']}/{result['implementation']:<6} "
+                f"x{result['workers']:<4} {result['rps']:>8.1f} rps, p50 {result['p50_ms']:.1f} мс, "
+                f"p99 {result['p99_ms']:.1f} мс, ошибок {result['errors']}"
+            )
+
+    def seed(self, num_users: int, num_authors: int, follows: int, num_posts: int) -> List[Tuple[int, str]]:
+        """
+        Авторы с постами, читатели с подписками и заполненными лентами, сессии читателей.
+
+        :return: Список (идентификатор читателя, ключ сессии).
+        """
+        authors = Account.objects.bulk_create([Account(username=f'{PREFIX}author_{i}', password='!')
+                                               for i in range(num_authors)])
+        blogs = Blog.objects.bulk_create([Blog(user=author) for author in authors])
+        Post.objects.bulk_create([Post(blog=random.choice(blogs), title=f'Post {i}', content='Content')
+                                  for i in range(num_posts)], batch_size=1000)
+
+        readers = Account.objects.bulk_create([Account(username=f'{PREFIX}reader_{i}', password='!')
+                                               for i in range(num_users)])
+        sessions = []
+        client = Client()
+        for reader in readers:
+            blog_ids = [blog.id for blog in random.sample(blogs, min(follows, len(blogs)))]
+            Subscription.objects.bulk_create([Subscription(user=reader, blog_id=blog_id) for blog_id in blog_ids])
+            backfill_feed(reader.id, blog_ids)
+            client.force_login(reader)
+            sessions.append((reader.id, client.cookies[settings.SESSION_COOKIE_NAME].value))
+            client.cookies.clear()
+
+        # bulk_create не вызывает сигналы счетчиков, а удаление в конце их уменьшает
+        Blog.objects.filter(user__username__startswith=PREFIX) \
+                    .update(posts_count=count_subquery(Post.objects.all(), 'blog'),
+                            subscribers_count=count_subquery(Subscription.objects.all(), 'blog'))
+        Account.objects.filter(username__startswith=PREFIX) \
+                       .update(subscriptions_count=count_subquery(Subscription.objects.all(), 'user'))
+        return sessions
+
+    @staticmethod
+    def get_requests(endpoint: str, sessions: List[Tuple[int, str]], count: int) -> List[Tuple[Dict, str]]:
+        """ Запросы сценария: (kwargs URL, ключ сессии) случайных читателей. """
+        requests = []
+        for _ in range(count):
+            user_id, session_key = random.choice(sessions)
+            requests.append(({'user_id': user_id} if endpoint == 'user_detail' else {}, session_key))
+        return requests
+
+    @staticmethod
+    def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, float]:
+        percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            'seconds': round(elapsed, 3),
+            'rps': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentiles[49] * 1000, 2),
+            'p99_ms': round(percentiles[98] * 1000, 2),
+        }
+
+    def run_wsgi(self, url_name: str, requests: List[Tuple[Dict, str]], threads: int) -> Dict[str, float]:
+        """ WSGIHandler в пуле из threads потоков: один поток обслуживает один запрос целиком. """
+        handler = WSGIHandler()
+
+        def call(request: Tuple[Dict, str]) -> Tuple[float, int]:
+            kwargs, session_key = request
+            environ = {'PATH_INFO': reverse(url_name, kwargs=kwargs), 'REQUEST_METHOD': 'GET',
+                       'HTTP_COOKIE': f'{settings.SESSION_COOKIE_NAME}={session_key}'}
+            setup_testing_defaults(environ)
+            statuses = []
+            started = time.perf_counter()
+            response = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+            try:
+                b''.join(response)
+            finally:
+                response.close()
+            return time.perf_counter() - started, int(statuses[0].split()[0])
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            outcomes = list(executor.map(call, requests))
+        return self.summarize([latency for latency, _ in outcomes],
+                              sum(code >= 400 for _, code in outcomes), time.perf_counter() - started)
+
+    def run_asgi(self, url_name: str, requests: List[Tuple[Dict, str]], concurrency: int) -> Dict[str, float]:
+        """ ASGIHandler: до concurrency запросов одновременно в одном цикле событий. """
+        handler = ASGIHandler()
+
+        async def call(request: Tuple[Dict, str], semaphore: asyncio.Semaphore) -> Tuple[float, int]:
+            kwargs, session_key = request
+            path = reverse(url_name, kwargs=kwargs)
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+                'headers': [(b'host', b'127.0.0.1'),
+                            (b'cookie', f'{settings.SESSION_COOKIE_NAME}={session_key}'.encode())],
+                'server': ('127.0.0.1', 80), 'client': ('127.0.0.1', 50000),
+            }
+            messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+            statuses = []
+
+            async def receive() -> Dict:
+                if messages:
+                    return messages.pop()
+                return await asyncio.Future()
+
+            async def send(message: Dict) -> None:
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+
+            async with semaphore:
+                started = time.perf_counter()
+                await handler(scope, receive, send)
+                return time.perf_counter() - started, statuses[0]
+
+        async def run_all() -> List[Tuple[float, int]]:
+            semaphore = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*(call(request, semaphore) for request in requests))
+
+        started = time.perf_counter()
+        outcomes = asyncio.run(run_all())
+        return self.summarize([latency for latency, _ in outcomes],
+                              sum(code >= 400 for _, code in outcomes), time.perf_counter() - started)
@@ -0,0 +1,105 @@
+import random
+import statistics
+import time
+from typing import Dict, List, Tuple
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from accounts.models import Account
+from blogs.counters import count_subquery
+from blogs.feed import HYBRID, PULL, PUSH, fan_out_post, get_feed_items
+from blogs.models import Blog, FeedEntry, Post, Subscription
+
+
+class Rollback(Exception):
+    """ Откат транзакции с тестовыми данными бенчмарка. """
+
+
+class Command(BaseCommand):
+    help = 'Сравнение стратегий ленты новостей (pull, push, hybrid) на неравномерном распределении подписчиков'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000, help='Количество пользователей (и блогов)')
+        parser.add_argument('--follows', type=int, default=20, help='Количество подписок на пользователя')
+        parser.add_argument('--posts', type=int, default=2000, help='Количество постов')
+        parser.add_argument('--skew', type=float, default=1.2, help='Показатель степенного распределения подписчиков')
+        parser.add_argument('--threshold', type=int, default=200, help='Порог подписчиков для hybrid')
+        parser.add_argument('--reads', type=int, default=200, help='Количество чтений ленты')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        """ Хелпер по хендлеру """
+        random.seed(options['seed'])
+        strategies = [(PULL, 0), (PUSH, 0), (HYBRID, options['threshold'])]
+
+        try:
+            with transaction.atomic():
+                blogs, posts = self.seed(options['users'], options['follows'], options['posts'], options['skew'])
+                readers = random.sample(blogs, min(options['reads'], len(blogs)))
+                reader_blogs = {
+                    blog.user_id: list(Subscription.objects.filter(user_id=blog.user_id)
+                                                           .values_list('blog_id', flat=True))
+                    for blog in readers
+                }
+
+                for strategy, threshold in strategies:
+                    FeedEntry.objects.filter(blog__in=blogs).delete()
+                    with override_settings(NEWS_FEED_STRATEGY=strategy, NEWS_FEED_FANOUT_THRESHOLD=threshold):
+                        self.report(strategy, self.run_writes(posts), self.run_reads(reader_blogs))
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, num_users: int, follows: int, num_posts: int, skew: float) -> Tuple[List[Blog], List[Post]]:
+        """ Создание пользователей, блогов, подписок со степенным распределением и постов. """
+        accounts = Account.objects.bulk_create(
+            [Account(username=f'bench_{i}', password='!') for i in range(num_users)]
+        )
+        blogs = Blog.objects.bulk_create([Blog(user=account) for account in accounts])
+
+        weights = [1 / (rank + 1) ** skew for rank in range(num_users)]
+        subscriptions = []
+        for index, account in enumerate(accounts):
+            followed = {blogs[i].id for i in random.choices(range(num_users), weights=weights, k=follows)}
+            followed.discard(blogs[index].id)
+            subscriptions.extend(Subscription(user=account, blog_id=blog_id) for blog_id in followed)
+        Subscription.objects.bulk_create(subscriptions, batch_size=5000)
+        Blog.objects.filter(id__in=[blog.id for blog in blogs]) \
+                    .update(subscribers_count=count_subquery(Subscription.objects.all(), 'blog'))
+
+        posts = [Post(blog=random.choice(blogs), title=f'Post {i}', content='') for i in range(num_posts)]
+        posts = Post.objects.bulk_create(posts, batch_size=5000)
+        return blogs, posts
+
+    def run_writes(self, posts: List[Post]) -> Dict[str, float]:
+        """ Раскладка всех постов по лентам. """
+        started = time.perf_counter()
+        rows = sum(fan_out_post(post) for post in posts)
+        return {'rows': rows, 'seconds': time.perf_counter() - started}
+
+    def run_reads(self, reader_blogs: Dict[int, List[int]]) -> Dict[str, float]:
+        """ Чтение лент выбранных пользователей. """
+        timings = []
+        queries = 0
+        for user_id, blog_ids in reader_blogs.items():
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                get_feed_items(user_id, blog_ids)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries += len(context.captured_queries)
+
+        timings.sort()
+        return {
+            'p50': statistics.median(timings),
+            'p99': timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+            'queries': queries / len(timings),
+        }
+
+    def report(self, strategy: str, writes: Dict[str, float], reads: Dict[str, float]) -> None:
+        """ Вывод результатов стратегии. """
+        self.stdout.write(self.style.SUCCESS(
+            f'{strategy:>6}: запись {writes["rows"]:>8} строк за {writes["seconds"]:.2f} с; '
+            f'чтение p50 {reads["p50"]:.2f} мс, p99 {reads["p99"]:.2f} мс, {reads["queries"]:.1f} запросов'
+        ))
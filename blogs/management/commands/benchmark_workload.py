@@ -0,0 +1,406 @@
+import json
+import logging
+import queue
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional, Tuple
+
+from celery import current_app
+from kombu.simple import SimpleQueue
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from accounts.models import Account
+from blogs import load_data
+from blogs.feed import get_feed_items
+from blogs.models import OutboxEvent, Subscription
+from blogs.read_state import get_read_flags
+from blogs.tasks import relay_outbox
+
+logger = logging.getLogger('django')
+
+OPERATIONS = ['post', 'follow', 'feed', 'read']
+EAGER = 'eager'
+MEMORY = 'memory'
+# Постов, помечаемых прочитанными одним запросом
+READ_BATCH = 5
+# Период замера очереди задач и outbox, секунд
+SAMPLE_INTERVAL = 0.5
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """ p50/p90/p99/max в миллисекундах. """
+    if not values:
+        return {}
+    points = statistics.quantiles(values, n=100, method='inclusive') if len(values) > 1 else values * 99
+    return {'p50': round(points[49] * 1000, 2), 'p90': round(points[89] * 1000, 2),
+            'p99': round(points[98] * 1000, 2), 'max': round(max(values) * 1000, 2)}
+
+
+def get_commit() -> Optional[str]:
+    """ Текущий коммит, чтобы сравнивать результаты прогонов между коммитами. """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=settings.BASE_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Actor:
+    """ Пользователь нагрузки: сессия, свой блог и непрочитанные посты ленты. """
+
+    def __init__(self, user_id: int, blog_id: int, session_key: str, unread_ids: List[int]):
+        self.user_id = user_id
+        self.blog_id = blog_id
+        self.session_key = session_key
+        self.unread_ids = unread_ids
+        self.lock = threading.Lock()
+
+    def take_unread(self, count: int) -> List[int]:
+        with self.lock:
+            taken, self.unread_ids = self.unread_ids[:count], self.unread_ids[count:]
+        return taken
+
+
+class Command(BaseCommand):
+    help = 'Сквозной нагрузочный тест ленты: смешанная нагрузка (посты, подписки, чтение ленты, пометка прочтения) ' \
+           'с заданной интенсивностью поверх Celery в памяти; пропускная способность, перцентили задержки, ' \
+           'запросы к БД и очередь задач в JSON для сравнения прогонов между коммитами'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rate', type=float, default=50,
+                            help='Запросов в секунду (открытая модель); 0 - без ограничения')
+        parser.add_argument('--duration', type=float, default=30, help='Длительность нагрузки, секунд')
+        parser.add_argument('--concurrency', type=int, default=8, help='Потоков, выполняющих запросы')
+        parser.add_argument('--mix', default='post=5,follow=5,feed=75,read=15',
+                            help='Доли операций post, follow, feed, read')
+        parser.add_argument('--actors', type=int, default=200, help='Пользователей, от имени которых идут запросы')
+        parser.add_argument('--celery', choices=[EAGER, MEMORY], default=MEMORY,
+                            help='eager - задачи выполняются сразу после публикации из outbox; '
+                                 'memory - брокер memory:// и потоки-воркеры')
+        parser.add_argument('--celery-workers', type=int, default=2,
+                            help='Потоков-воркеров Celery (memory); 0 - задачи только копятся')
+        parser.add_argument('--relay-interval', type=float, default=settings.OUTBOX_RELAY_INTERVAL,
+                            help='Период публикации outbox, секунд (как relay-outbox в CELERY_BEAT_SCHEDULE)')
+        parser.add_argument('--drain-timeout', type=float, default=30,
+                            help='Сколько секунд после нагрузки ждать разбора очереди задач')
+        parser.add_argument('--no-cache', action='store_true', help='Без кэша страниц ленты')
+        parser.add_argument('--prefix', default='load_', help='Префикс аккаунтов generate_load_data')
+        parser.add_argument('--users', type=int, default=2000, help='Аккаунтов, если данных с префиксом еще нет')
+        parser.add_argument('--posts', type=int, default=50000, help='Постов, если данных с префиксом еще нет')
+        parser.add_argument('--output', help='Файл для результатов JSON (по умолчанию - stdout)')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        """ Хелпер по хендлеру """
+        mix = self.parse_mix(options['mix'])
+        rng = random.Random(options['seed'])
+        if not Account.objects.filter(username__startswith=options['prefix']).exists():
+            # вывод генератора не должен смешиваться с JSON результатов
+            call_command('generate_load_data', users=options['users'], posts=options['posts'],
+                         prefix=options['prefix'], seed=options['seed'], stdout=sys.stderr)
+
+        state = {'prefix': options['prefix'], 'seed': options['seed'], 'skew': 1.0}
+        load_data.add_blogs(state)
+        actors = self.get_actors(state['blogs'], options['actors'], rng)
+        current_app.conf.update(broker_url='memory://', result_backend='cache+memory://', task_ignore_result=True)
+
+        self.records: List[Tuple[str, int, float, float, int]] = []
+        self.samples: List[Tuple[float, int, int]] = []
+        self.tasks = {'executed': 0, 'failed': 0}
+        self.stats_lock = threading.Lock()
+        # SQLite блокирует базу целиком: запросы, relay, воркеры и замеры обращаются к ней по очереди,
+        # иначе часть запросов и задач падает на блокировке, а не из-за ошибок в коде
+        self.db_lock = threading.RLock() if connection.vendor == 'sqlite' else nullcontext()
+        if connection.vendor == 'sqlite':
+            self.stderr.write(self.style.WARNING('SQLite не поддерживает параллельную запись, '
+                                                 'обращения к БД выполняются по очереди'))
+        cache_timeout = 0 if options['no_cache'] else settings.NEWS_FEED_CACHE_TIMEOUT
+        try:
+            with override_settings(NEWS_FEED_CACHE_TIMEOUT=cache_timeout,
+                                   ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                result = self.run(options, mix, actors, state, rng)
+        finally:
+            Session.objects.filter(session_key__in=[actor.session_key for actor in actors]).delete()
+
+        output = json.dumps(result, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(
+                f"{result['requests']} запросов, {result['throughput_rps']} rps, p99 {result['latency_ms'].get('p99')} "
+                f"мс, ошибок {result['errors']}; результаты в {options['output']}"
+            ))
+        else:
+            self.stdout.write(output)
+
+    @staticmethod
+    def parse_mix(value: str) -> Dict[str, float]:
+        """ Доли операций из строки вида post=5,follow=5,feed=75,read=15. """
+        mix = {}
+        for part in value.split(','):
+            name, _, weight = part.partition('=')
+            if name.strip() not in OPERATIONS:
+                raise CommandError(f'Неизвестная операция {name.strip()}, доступны: {", ".join(OPERATIONS)}')
+            try:
+                mix[name.strip()] = float(weight)
+            except ValueError:
+                raise CommandError(f'Неверная доля операции {name.strip()}: {weight}')
+        if sum(mix.values()) <= 0:
+            raise CommandError('Сумма долей операций должна быть больше 0')
+        return mix
+
+    @staticmethod
+    def get_actors(blogs: List[Tuple[int, int]], count: int, rng: random.Random) -> List[Actor]:
+        """ Случайные пользователи сгенерированных данных с сессиями и непрочитанными постами лент. """
+        actors = []
+        client = Client()
+        sampled = rng.sample(blogs, min(count, len(blogs)))
+        accounts = Account.objects.in_bulk([user_id for _, user_id in sampled])
+        for blog_id, user_id in sampled:
+            followed_ids = list(Subscription.objects.filter(user_id=user_id).values_list('blog_id', flat=True))
+            post_ids = [post_id for _, post_id in get_feed_items(user_id, followed_ids)] if followed_ids else []
+            unread_ids = [post_id for post_id, is_read in get_read_flags(user_id, post_ids).items() if not is_read]
+            client.force_login(accounts[user_id])
+            actors.append(Actor(user_id, blog_id, client.cookies[settings.SESSION_COOKIE_NAME].value, unread_ids))
+            client.cookies.clear()
+        return actors
+
+    def run(self, options: Dict[str, Any], mix: Dict[str, float], actors: List[Actor], state: Dict[str, Any],
+            rng: random.Random) -> Dict[str, Any]:
+        """ Нагрузка, фоновые relay/воркеры/замеры и ожидание разбора очереди. """
+        # задачи, опубликованные в брокер процесса до прогона, к нагрузке не относятся
+        self.clear_queue()
+        stop_load, stop_background = threading.Event(), threading.Event()
+        background = [threading.Thread(target=self.relay, args=(options, stop_background)),
+                      threading.Thread(target=self.sample, args=(stop_background,))]
+        if options['celery'] == MEMORY:
+            background += [threading.Thread(target=self.consume, args=(stop_background,))
+                           for _ in range(options['celery_workers'])]
+        for thread in background:
+            thread.start()
+
+        jobs: queue.Queue = queue.Queue()
+        workers = [threading.Thread(target=self.work, args=(jobs, stop_load, mix, actors, state,
+                                                            random.Random(rng.random()), options['rate']))
+                   for _ in range(max(options['concurrency'], 1))]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        if options['rate'] > 0:
+            # открытая модель: запросы назначаются по расписанию, задержка считается от назначенного времени
+            for number in range(int(options['rate'] * options['duration'])):
+                scheduled = started + number / options['rate']
+                time.sleep(max(scheduled - time.perf_counter(), 0))
+                jobs.put(scheduled)
+        else:
+            time.sleep(options['duration'])
+        stop_load.set()
+        for _ in workers:
+            jobs.put(None)
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        drain_started = time.perf_counter()
+        drained = False
+        # замер, начатый во время нагрузки, может не учитывать события последних запросов
+        samples_count = len(self.samples) + 1
+        while time.perf_counter() - drain_started < options['drain_timeout']:
+            if len(self.samples) > samples_count and self.samples[-1][1:] == (0, 0) \
+                    and (options['celery'] == EAGER or options['celery_workers']):
+                drained = True
+                break
+            time.sleep(SAMPLE_INTERVAL)
+        drain_time = time.perf_counter() - drain_started
+        stop_background.set()
+        for thread in background:
+            thread.join()
+        # неразобранные задачи не должны остаться в брокере процесса (memory:// общий для соединений)
+        self.clear_queue()
+        return self.summarize(options, elapsed, drained, drain_time)
+
+    @staticmethod
+    def clear_queue() -> None:
+        with current_app.connection_for_read() as conn:
+            conn.SimpleQueue(current_app.conf.task_default_queue).clear()
+
+    def work(self, jobs: queue.Queue, stop: threading.Event, mix: Dict[str, float], actors: List[Actor],
+             state: Dict[str, Any], rng: random.Random, rate: float) -> None:
+        """ Поток запросов: по расписанию из jobs или (rate = 0) подряд до остановки. """
+        client = APIClient()
+        names, weights = list(mix), list(mix.values())
+        try:
+            while True:
+                if rate > 0:
+                    scheduled = jobs.get()
+                    if scheduled is None:
+                        return
+                elif stop.is_set():
+                    return
+                else:
+                    scheduled = time.perf_counter()
+                operation = rng.choices(names, weights=weights)[0]
+                self.request(client, operation, rng.choice(actors), state, rng, scheduled)
+        finally:
+            connection.close()
+
+    def request(self, client: APIClient, operation: str, actor: Actor, state: Dict[str, Any], rng: random.Random,
+                scheduled: float) -> None:
+        """ Один запрос операции от имени actor; записывает статус, задержки и количество запросов к БД. """
+        post_ids = actor.take_unread(READ_BATCH) if operation == 'read' else []
+        if operation == 'read' and not post_ids:
+            operation = 'feed'
+        client.cookies[settings.SESSION_COOKIE_NAME] = actor.session_key
+
+        reset_queries()
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            try:
+                with self.db_lock:
+                    # ожидание очереди к SQLite входит в задержку от назначенного времени, но не во время обработки
+                    started = time.perf_counter()
+                    if operation == 'post':
+                        response = client.post(reverse('add-post-to-blog', args=[actor.blog_id]),
+                                               {'title': 'Benchmark', 'content': 'Content'}, format='json')
+                    elif operation == 'follow':
+                        blog_id = rng.choices(state['ranked_blog_ids'], cum_weights=state['cum_weights'])[0]
+                        while blog_id == actor.blog_id:
+                            blog_id = rng.choice(state['ranked_blog_ids'])
+                        response = client.post(reverse('subscribe-to-blog', args=[blog_id]))
+                    elif operation == 'read':
+                        response = client.post(reverse('mark-posts-as-read'), {'post_ids': post_ids}, format='json')
+                    else:
+                        response = client.get(reverse('news_feed'))
+                status_code = response.status_code
+            except Exception:  # ошибка БД под нагрузкой - ошибка запроса
+                status_code = 500
+            finished = time.perf_counter()
+
+        with self.stats_lock:
+            self.records.append((operation, status_code, finished - scheduled, finished - started,
+                                 len(context.captured_queries)))
+
+    def relay(self, options: Dict[str, Any], stop: threading.Event) -> None:
+        """ Публикация outbox раз в relay_interval секунд (beat); в режиме eager задачи сразу выполняются. """
+        try:
+            while not stop.wait(options['relay_interval']):
+                try:
+                    with self.db_lock:
+                        relay_outbox()
+                except DatabaseError as error:
+                    # как у beat: неудачная публикация повторится при следующем запуске
+                    logger.warning(f'Ошибка публикации outbox: {error}')
+                    continue
+                if options['celery'] == EAGER:
+                    with current_app.connection_for_read() as conn:
+                        tasks_queue = conn.SimpleQueue(current_app.conf.task_default_queue)
+                        while self.run_task(tasks_queue, timeout=None):
+                            pass
+        finally:
+            connection.close()
+
+    def consume(self, stop: threading.Event) -> None:
+        """ Поток-воркер Celery: выполняет задачи из очереди брокера memory://. """
+        try:
+            with current_app.connection_for_read() as conn:
+                tasks_queue = conn.SimpleQueue(current_app.conf.task_default_queue)
+                while not stop.is_set():
+                    self.run_task(tasks_queue, timeout=SAMPLE_INTERVAL)
+        finally:
+            connection.close()
+
+    def run_task(self, tasks_queue: SimpleQueue, timeout: Optional[float]) -> bool:
+        """
+        Выполняет одну задачу из очереди.
+
+        :param timeout: Сколько ждать задачу; None - не ждать.
+        :return: Была ли задача.
+        """
+        try:
+            message = tasks_queue.get(block=timeout is not None, timeout=timeout)
+        except SimpleQueue.Empty:
+            return False
+        args, kwargs, _ = message.decode()
+        with self.db_lock:
+            result = current_app.tasks[message.headers['task']].apply(args=args, kwargs=kwargs,
+                                                                      task_id=message.headers['id'])
+        message.ack()
+        with self.stats_lock:
+            self.tasks['executed'] += 1
+            self.tasks['failed'] += result.failed()
+        return True
+
+    def sample(self, stop: threading.Event) -> None:
+        """ Замеры очереди задач брокера и неопубликованных событий outbox. """
+        started = time.perf_counter()
+        try:
+            with current_app.connection_for_read() as conn:
+                tasks_queue = conn.SimpleQueue(current_app.conf.task_default_queue)
+                while True:
+                    try:
+                        with self.db_lock:
+                            outbox = OutboxEvent.objects.filter(published_at__isnull=True).count()
+                    except DatabaseError as error:
+                        logger.warning(f'Ошибка замера outbox: {error}')
+                    else:
+                        self.samples.append((round(time.perf_counter() - started, 2), tasks_queue.qsize(), outbox))
+                    if stop.wait(SAMPLE_INTERVAL):
+                        return
+        finally:
+            connection.close()
+
+    def summarize(self, options: Dict[str, Any], elapsed: float, drained: bool,
+                  drain_time: float) -> Dict[str, Any]:
+        """ Результаты прогона: общие и по операциям, задачи Celery и очередь. """
+        by_operation: Dict[str, List[Tuple[str, int, float, float, int]]] = defaultdict(list)
+        for record in self.records:
+            by_operation[record[0]].append(record)
+
+        def describe(records: List[Tuple[str, int, float, float, int]]) -> Dict[str, Any]:
+            queries = [record[4] for record in records]
+            return {
+                'requests': len(records),
+                'errors': sum(record[1] >= 400 for record in records),
+                'throughput_rps': round(len(records) / elapsed, 1),
+                'latency_ms': percentiles([record[2] for record in records]),
+                'service_ms': percentiles([record[3] for record in records]),
+                'queries': {'mean': round(statistics.mean(queries), 2) if queries else 0,
+                            'max': max(queries, default=0), 'total': sum(queries)},
+            }
+
+        return {
+            'commit': get_commit(),
+            'database': connection.vendor,
+            'config': {key: options[key] for key in ('rate', 'duration', 'concurrency', 'mix', 'actors', 'celery',
+                                                     'celery_workers', 'relay_interval', 'no_cache', 'seed')},
+            'seconds': round(elapsed, 3),
+            **describe(self.records),
+            'operations': {name: describe(records) for name, records in sorted(by_operation.items())},
+            'celery': {
+                'tasks_executed': self.tasks['executed'],
+                'tasks_failed': self.tasks['failed'],
+                'queue_max': max((sample[1] for sample in self.samples), default=0),
+                'outbox_max': max((sample[2] for sample in self.samples), default=0),
+                'queue_final': self.samples[-1][1] if self.samples else 0,
+                'outbox_final': self.samples[-1][2] if self.samples else 0,
+                'drained': drained,
+                'drain_seconds': round(drain_time, 2),
+                # (секунда от начала, задач в очереди, неопубликованных событий outbox)
+                'samples': self.samples,
+            },
+        }
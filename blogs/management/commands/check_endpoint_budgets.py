@@ -0,0 +1,56 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from nekidaem_tz.budgets import (
+    BUDGET_FILE, SCALES, check_budgets, get_url_names, load_budgets, make_budgets, run_budgets, save_budgets,
+)
+
+
+class Command(BaseCommand):
+    help = 'Замеряет количество запросов к БД и задержку (p50/p99) каждого эндпоинта blogs и accounts на данных ' \
+           'нескольких масштабов; ошибка, если превышен бюджет из nekidaem_tz/endpoint_budgets.json'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', type=int, nargs='+', default=SCALES, help='Масштабы данных (количество постов)')
+        parser.add_argument('--iterations', type=int, default=20, help='Количество запросов к каждому эндпоинту')
+        parser.add_argument('--url-names', nargs='+', help='Только указанные эндпоинты')
+        parser.add_argument('--no-latency', action='store_true', help='Проверять только количество запросов')
+        parser.add_argument('--update', action='store_true', help='Записать бюджеты по результатам замеров')
+        parser.add_argument('--budget-file', default=BUDGET_FILE)
+        parser.add_argument('--json', action='store_true', help='Вывести результаты в JSON')
+
+    def handle(self, *args, **options):
+        """ Хелпер по хендлеру """
+        unknown = set(options['url_names'] or []) - set(get_url_names())
+        if unknown:
+            raise CommandError(f'Неизвестные эндпоинты: {", ".join(sorted(unknown))}')
+
+        results = run_budgets(options['scales'], options['iterations'], options['url_names'])
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            for result in results:
+                self.stdout.write(
+                    f"{result['url_name']:<32} {result['scale']:>7} постов: {result['queries']:>3} запросов, "
+                    f"p50 {result['p50_ms']:.1f} мс, p99 {result['p99_ms']:.1f} мс"
+                )
+
+        if options['update']:
+            failed = [f"{result['url_name']} [{result['scale']}]" for result in results if result['status'] >= 400]
+            if failed:
+                raise CommandError(f'Эндпоинты ответили ошибкой, бюджеты не записаны: {", ".join(failed)}')
+            try:
+                budgets = load_budgets(options['budget_file'])
+            except FileNotFoundError:
+                budgets = {}
+            save_budgets(make_budgets(results, budgets), options['budget_file'])
+            self.stdout.write(self.style.SUCCESS(f'Бюджеты записаны в {options["budget_file"]}'))
+            return
+
+        violations = check_budgets(results, load_budgets(options['budget_file']), latency=not options['no_latency'])
+        for violation in violations:
+            self.stdout.write(self.style.ERROR(violation))
+        if violations:
+            raise CommandError(f'Превышены бюджеты эндпоинтов: {len(violations)}')
+        self.stdout.write(self.style.SUCCESS('Бюджеты эндпоинтов соблюдены'))
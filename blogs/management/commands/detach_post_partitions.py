@@ -0,0 +1,33 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blogs.partitions import detach_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = 'Отсоединение старых месячных партиций постов (PostgreSQL) без долгих блокировок: ' \
+           'DETACH PARTITION ... CONCURRENTLY, затем перенос в архивную схему или удаление'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', required=True,
+                            help='Месяц в формате ГГГГ-ММ: отсоединяются партиции более ранних месяцев')
+        parser.add_argument('--archive-schema', help='Схема, в которую переносятся отсоединенные партиции')
+        parser.add_argument('--drop', action='store_true', help='Удалить отсоединенные партиции')
+
+    def handle(self, *args, **options):
+        """ Хелпер по хендлеру """
+        try:
+            before = datetime.strptime(options['before'], '%Y-%m').date()
+        except ValueError:
+            raise CommandError('--before должен быть месяцем в формате ГГГГ-ММ')
+        if options['archive_schema'] and options['drop']:
+            raise CommandError('Укажите либо --archive-schema, либо --drop')
+        if not is_partitioned():
+            raise CommandError('Таблица постов не секционирована (только PostgreSQL, миграция 0019_partition_post)')
+
+        detached = detach_partitions(before, options['archive_schema'], options['drop'])
+        if not detached:
+            self.stdout.write(self.style.SUCCESS('Нет партиций для отсоединения.'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Отсоединены партиции: {", ".join(detached)}.'))
@@ -0,0 +1,155 @@
+import json
+import re
+from typing import Any, Dict, Iterator, List, Set, Tuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import F, QuerySet, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from accounts.models import Account
+from blogs.feed import get_feed_posts
+from blogs.models import FeedEntry, OutboxEvent, Post, ReadPost, ReadState, Subscription
+
+PG_INDEX_SCANS = ('Index Scan', 'Index Only Scan')
+# SQLite: SCAN - чтение всей таблицы или всего индекса (USING INDEX), SEARCH - поиск по условию индекса
+SQLITE_SCAN = re.compile(r'SCAN (?:TABLE )?(\w+)(?: USING (?:COVERING )?INDEX (\w+))?')
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN ANALYZE горячих запросов blogs.views и blogs.tasks; ошибка, если какой-то запрос читает таблицу ' \
+           'последовательным сканированием или индекс целиком без условия. Запускается на представительных ' \
+           'данных (например, generate_load_data): на маленьких таблицах планировщик законно выбирает Seq Scan'
+
+    def handle(self, *args, **options):
+        """ Хелпер по хендлеру """
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            raise CommandError(f'EXPLAIN горячих запросов не поддерживается для {connection.vendor}')
+
+        self.tables = set(connection.introspection.table_names())
+        self.partial_indexes = self.get_partial_indexes()
+        regressions = []
+        for name, queryset in self.get_hot_queries():
+            plan, problems, timing = self.explain(queryset)
+            if problems:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(f'{name}: {", ".join(problems)}'))
+                self.stdout.write(plan)
+            else:
+                timing = f' за {timing} мс' if timing is not None else ''
+                self.stdout.write(self.style.SUCCESS(f'{name}: индексы используются{timing}'))
+
+        if regressions:
+            raise CommandError(f'Сканирование без условия индекса в запросах: {", ".join(regressions)}')
+
+    @staticmethod
+    def get_hot_queries() -> List[Tuple[str, QuerySet]]:
+        """ Горячие запросы ленты, прочтений, раскладки и рассылки с идентификаторами из БД. """
+        user_id = Subscription.objects.values_list('user_id', flat=True).first() or 0
+        blog_id = Subscription.objects.values_list('blog_id', flat=True).first() or 0
+        blog_ids = list(Subscription.objects.filter(user_id=user_id).values_list('blog_id', flat=True)) or [blog_id]
+        entries = list(FeedEntry.objects.filter(user_id=user_id).values_list('created_at', 'post_id')[:10])
+        post_ids = [post_id for _, post_id in entries] or [0]
+        dates = [created_at for created_at, _ in entries] or [timezone.now()]
+        size = settings.NEWS_FEED_SIZE
+        batch_size = settings.NEWS_FEED_FANOUT_BATCH_SIZE
+
+        return [
+            ('news_feed: подписки пользователя',
+             Subscription.objects.filter(user_id=user_id).values_list('blog_id', 'is_backfilled')),
+            ('news_feed: материализованная лента',
+             FeedEntry.objects.filter(user_id=user_id, blog_id__in=blog_ids, post__deleted_at__isnull=True,
+                                      post__created_at=F('created_at')).order_by('-created_at', '-post_id')
+                              .values_list('created_at', 'post_id')[:size]),
+            ('news_feed: посты блогов, читаемых при запросе',
+             get_feed_posts().filter(blog_id__in=blog_ids).order_by('-created_at', '-id')
+                             .values_list('created_at', 'id')[:size]),
+            ('news_feed: флаги прочтения (rows)',
+             ReadPost.objects.filter(user_id=user_id, post_id__in=post_ids, is_read=True).values_list('post_id')),
+            ('news_feed: состояние прочтения (compact)',
+             ReadState.objects.filter(user_id=user_id).values_list('watermark', 'bitmap')),
+            ('mark_posts_as_read: даты постов в ленте',
+             FeedEntry.objects.filter(user_id=user_id, post_id__in=post_ids).values_list('post_id', 'created_at')),
+            ('mark_posts_as_read: поиск постов',
+             Post.objects.filter(id__in=post_ids, created_at__range=(min(dates), max(dates))).values_list('id')),
+            ('update_news_feed: подписчики блога',
+             Subscription.objects.filter(blog_id=blog_id, user_id__gt=0).order_by('user_id')
+                                 .values_list('user_id')[:batch_size]),
+            ('backfill_news_feed: последние посты блогов',
+             get_feed_posts().filter(blog_id__in=blog_ids)
+                             .annotate(position=Window(RowNumber(), partition_by=[F('blog_id')],
+                                                       order_by=[F('created_at').desc(), F('id').desc()]))
+                             .filter(position__lte=settings.NEWS_FEED_BACKFILL_SIZE)
+                             .values_list('id', 'blog_id', 'created_at')),
+            ('purge_news_feed: записи ленты блогов',
+             FeedEntry.objects.filter(user_id=user_id, blog_id__in=blog_ids).values_list('pk')[:batch_size]),
+            ('relay_outbox: неопубликованные события',
+             OutboxEvent.objects.filter(published_at__isnull=True).order_by('id')[:settings.OUTBOX_BATCH_SIZE]),
+            ('send_daily_newsletter: получатели',
+             Account.objects.filter(subscriptions_count__gt=0, id__gt=0).order_by('id')
+                            .values_list('id', 'username', 'email')[:settings.NEWSLETTER_BATCH_SIZE]),
+        ]
+
+    @staticmethod
+    def get_partial_indexes() -> Set[str]:
+        """ Частичные индексы: их чтение без условия ограничено условием самого индекса. """
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT indexrelid::regclass::text FROM pg_index WHERE indpred IS NOT NULL')
+            else:
+                cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql LIKE '% WHERE %'")
+            return {row[0] for row in cursor.fetchall()}
+
+    def explain(self, queryset: QuerySet) -> Tuple[str, List[str], Any]:
+        """
+        План запроса с настройками планировщика по умолчанию.
+
+        PostgreSQL: EXPLAIN (ANALYZE, FORMAT JSON), SQLite: EXPLAIN QUERY PLAN.
+        SQL компилируется из queryset (QuerySet.explain не поддерживает фильтрацию по оконным функциям).
+
+        :return: План, найденные проблемы (последовательное сканирование, чтение индекса без условия)
+                 и время выполнения в мс (только PostgreSQL).
+        """
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(f'EXPLAIN (ANALYZE, FORMAT JSON) {sql}', params)
+                result = cursor.fetchone()[0]
+                result = json.loads(result) if isinstance(result, str) else result
+                return (json.dumps(result, indent=2), self.get_pg_problems(result[0]['Plan']),
+                        result[0].get('Execution Time'))
+
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+            return plan, self.get_sqlite_problems(plan), None
+
+    def get_pg_problems(self, plan: Dict[str, Any]) -> List[str]:
+        """ Узлы плана PostgreSQL: Seq Scan и Index/Index Only Scan без Index Cond по нечастичным индексам. """
+        problems = []
+        for node in self.iter_nodes(plan):
+            relation = node.get('Relation Name')
+            if node['Node Type'] == 'Seq Scan' and relation in self.tables:
+                problems.append(f'последовательное сканирование {relation}')
+            elif node['Node Type'] in PG_INDEX_SCANS and 'Index Cond' not in node \
+                    and node.get('Index Name') not in self.partial_indexes:
+                problems.append(f'чтение индекса {node.get("Index Name")} без условия')
+        return problems
+
+    def iter_nodes(self, plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        yield plan
+        for child in plan.get('Plans', []):
+            yield from self.iter_nodes(child)
+
+    def get_sqlite_problems(self, plan: str) -> List[str]:
+        """ Строки плана SQLite SCAN: чтение всей таблицы или всего нечастичного индекса. """
+        problems = []
+        for table, index in SQLITE_SCAN.findall(plan):
+            if table not in self.tables:
+                continue
+            if not index:
+                problems.append(f'последовательное сканирование {table}')
+            elif index not in self.partial_indexes:
+                problems.append(f'чтение индекса {index} без условия')
+        return problems
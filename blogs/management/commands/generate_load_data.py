@@ -0,0 +1,98 @@
+import multiprocessing
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.utils import timezone
+
+from tqdm import tqdm
+
+from accounts.models import Account
+from blogs import load_data
+from blogs.counters import reconcile_counters
+from blogs.partitions import create_partitions
+
+
+class Command(BaseCommand):
+    help = 'Генерация синтетических данных для нагрузочного тестирования: аккаунты с блогами, посты с разбросом ' \
+           'по времени, подписки со степенным распределением популярности, ленты и состояние прочтения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000, help='Количество аккаунтов (с блогами)')
+        parser.add_argument('--posts', type=int, default=100000, help='Количество постов')
+        parser.add_argument('--follows', type=int, default=20, help='Подписок на аккаунт (не больше)')
+        parser.add_argument('--skew', type=float, default=1.0,
+                            help='Показатель степенного распределения подписчиков по блогам (0 - равномерно)')
+        parser.add_argument('--days', type=int, default=30, help='Разброс дат создания постов, дней')
+        parser.add_argument('--read-ratio', type=float, default=0.3, help='Доля прочитанных постов ленты')
+        parser.add_argument('--password', help='Пароль всех аккаунтов (хэшируется один раз); по умолчанию - '
+                                               'непригодный для входа')
+        parser.add_argument('--prefix', default='load_', help='Префикс имен аккаунтов')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Размер пачки bulk_create')
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Размер задания процесса')
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(), help='Количество процессов')
+        parser.add_argument('--no-feeds', action='store_true', help='Не заполнять ленты и состояние прочтения')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        """ Хелпер по хендлеру """
+        if Account.objects.filter(username__startswith=options['prefix']).exists():
+            raise CommandError(f'Аккаунты с префиксом {options["prefix"]} уже есть, укажите другой --prefix')
+        if not 0 <= options['read_ratio'] <= 1:
+            raise CommandError('--read-ratio должен быть от 0 до 1')
+
+        workers = max(options['workers'], 1)
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite не поддерживает параллельную запись, используется 1 процесс'))
+            workers = 1
+
+        now = timezone.now()
+        state = load_data.make_state(
+            prefix=options['prefix'], password=make_password(options['password']),
+            batch_size=options['batch_size'], seed=options['seed'], now=now, days=options['days'],
+            follows=options['follows'], skew=options['skew'], read_ratio=options['read_ratio'],
+        )
+        # партиции постов (PostgreSQL) на весь разброс дат создания
+        create_partitions(settings.POST_PARTITIONS_AHEAD, since=(now - timedelta(days=options['days'])).date())
+
+        self.stdout.write(self.style.SUCCESS('Началась генерация данных...'))
+        chunk_size = options['chunk_size']
+        self.run('accounts', options['users'], chunk_size, workers, state, 'Аккаунты с блогами')
+        load_data.add_blogs(state)
+        self.run('posts', options['posts'], chunk_size, workers, state, 'Посты')
+        # на аккаунт приходится до follows подписок, поэтому задания меньше
+        subscriptions_chunk = max(chunk_size // max(options['follows'], 1), 1)
+        self.run('subscriptions', options['users'], subscriptions_chunk, workers, state, 'Подписки')
+        # от subscribers_count зависит, какие блоги раскладываются по лентам (NEWS_FEED_STRATEGY = 'hybrid')
+        self.stdout.write('Сверка счетчиков...')
+        reconcile_counters()
+        if not options['no_feeds']:
+            self.run('feeds', options['users'], max(subscriptions_chunk // 10, 1), workers, state,
+                     'Ленты и прочтения')
+
+        self.stdout.write(self.style.SUCCESS('Генерация данных прошла успешно!'))
+
+    @staticmethod
+    def run(step: str, total: int, chunk_size: int, workers: int, state: dict, desc: str) -> None:
+        """
+        Выполнение шага генерации пачками в текущем процессе или в пуле из workers процессов.
+
+        Процессы создаются через fork и получают общие параметры без сериализации; соединения с БД
+        закрываются перед fork, чтобы каждый процесс открыл свое.
+        """
+        tasks = [(step, start, count) for start, count in load_data.split(total, chunk_size)]
+        with tqdm(total=total, desc=desc, unit=' posts' if step == 'posts' else ' users') as progress:
+            if workers == 1:
+                load_data.configure(state)
+                for task in tasks:
+                    load_data.run_chunk(task)
+                    progress.update(task[2])
+                return
+
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            with context.Pool(workers, initializer=load_data.configure, initargs=(state,)) as pool:
+                for task, _ in zip(tasks, pool.imap(load_data.run_chunk, tasks)):
+                    progress.update(task[2])
@@ -0,0 +1,70 @@
+from collections import defaultdict
+from typing import Dict, List
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tqdm import tqdm
+
+from accounts.models import Account
+from blogs.models import ReadPost, ReadState
+from blogs.read_state import PostIdSet, compact, get_feed_post_ids
+
+
+class Command(BaseCommand):
+    help = 'Перенос прочтений из ReadPost и Account.read_posts в компактное состояние прочтения (ReadState)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Количество пользователей в пачке')
+
+    def handle(self, *args, **options):
+        """ Хелпер по хендлеру """
+        self.stdout.write(self.style.SUCCESS('Начался перенос состояния прочтения...'))
+
+        batch_size = options['batch_size']
+        accounts = Account.objects.order_by('id').values_list('id', flat=True)
+        migrated = 0
+        last_user_id = 0
+
+        with tqdm(total=accounts.count(), desc='Перенос состояния прочтения', unit=' users') as progress:
+            while True:
+                user_ids = list(accounts.filter(id__gt=last_user_id)[:batch_size])
+                if not user_ids:
+                    break
+                migrated += self.migrate_batch(user_ids)
+                last_user_id = user_ids[-1]
+                progress.update(len(user_ids))
+
+        self.stdout.write(self.style.SUCCESS(f'Перенос прошел успешно! Обновлено {migrated} состояний.'))
+
+    @transaction.atomic
+    def migrate_batch(self, user_ids: List[int]) -> int:
+        """ Перенос прочтений пачки пользователей. """
+        read_posts: Dict[int, List[int]] = defaultdict(list)
+        rows = ReadPost.objects.filter(user_id__in=user_ids, is_read=True).values_list('user_id', 'post_id')
+        delivered = Account.read_posts.through.objects.filter(account_id__in=user_ids) \
+                                                      .values_list('account_id', 'post_id')
+        for user_id, post_id in list(rows) + list(delivered):
+            read_posts[user_id].append(post_id)
+        if not read_posts:
+            return 0
+
+        states = {state.user_id: state for state in ReadState.objects.select_for_update()
+                                                                     .filter(user_id__in=read_posts.keys())}
+        to_create, to_update = [], []
+        for user_id, post_ids in read_posts.items():
+            state = states.get(user_id)
+            if state is None:
+                state = ReadState(user_id=user_id)
+                to_create.append(state)
+            else:
+                to_update.append(state)
+
+            read_ids = PostIdSet.from_bytes(state.bitmap)
+            read_ids.update(post_id for post_id in post_ids if post_id > state.watermark)
+            state.watermark = compact(state.watermark, read_ids, get_feed_post_ids(user_id))
+            state.bitmap = read_ids.to_bytes()
+
+        ReadState.objects.bulk_create(to_create)
+        ReadState.objects.bulk_update(to_update, ['watermark', 'bitmap'])
+        return len(to_create) + len(to_update)
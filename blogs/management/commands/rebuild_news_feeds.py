@@ -0,0 +1,26 @@
+from itertools import groupby
+
+from django.core.management.base import BaseCommand
+
+from tqdm import tqdm
+
+from blogs.feed import backfill_feed
+from blogs.models import Subscription
+
+
+class Command(BaseCommand):
+    help = 'Заполнение материализованных лент новостей по существующим подпискам'
+
+    def handle(self, *args, **options):
+        """ Хелпер по хендлеру """
+        self.stdout.write(self.style.SUCCESS('Началось заполнение лент новостей...'))
+
+        subscriptions = Subscription.objects.values_list('user_id', 'blog_id').order_by('user_id', 'blog_id')
+        written = 0
+        with tqdm(total=subscriptions.count(), desc='Заполнение лент', unit=' subscriptions') as progress:
+            for user_id, rows in groupby(subscriptions.iterator(), key=lambda row: row[0]):
+                blog_ids = [blog_id for _, blog_id in rows]
+                written += backfill_feed(user_id, blog_ids)
+                progress.update(len(blog_ids))
+
+        self.stdout.write(self.style.SUCCESS(f'Заполнение лент прошло успешно! Записано {written} строк.'))
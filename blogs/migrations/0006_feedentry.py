@@ -0,0 +1,32 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('blogs', '0005_alter_blog_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(verbose_name='Дата создания поста')),
+                ('blog', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='blogs.blog', verbose_name='Блог')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='blogs.post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Записи ленты',
+                'indexes': [models.Index(fields=['user', '-created_at', '-post'], name='blogs_feed_user_created_idx')],
+                'unique_together': {('user', 'post')},
+            },
+        ),
+    ]
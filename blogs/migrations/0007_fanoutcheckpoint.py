@@ -0,0 +1,34 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0006_feedentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FanOutCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата редактирования')),
+                ('start_user_id', models.BigIntegerField(verbose_name='Начало диапазона (не включительно)')),
+                ('end_user_id', models.BigIntegerField(verbose_name='Конец диапазона (включительно)')),
+                ('last_user_id', models.BigIntegerField(verbose_name='Последний обработанный подписчик')),
+                ('rows', models.PositiveIntegerField(default=0, verbose_name='Записано строк')),
+                ('is_done', models.BooleanField(default=False, verbose_name='Завершен?')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fanout_checkpoints', to='blogs.post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Чекпоинт раскладки',
+                'verbose_name_plural': 'Чекпоинты раскладки',
+                'unique_together': {('post', 'start_user_id')},
+            },
+        ),
+    ]
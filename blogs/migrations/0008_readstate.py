@@ -0,0 +1,32 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('blogs', '0007_fanoutcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата редактирования')),
+                ('watermark', models.BigIntegerField(default=0, verbose_name='Прочитаны все посты до id (включительно)')),
+                ('bitmap', models.BinaryField(default=b'', verbose_name='Прочитанные посты после watermark')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='read_state', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Состояние прочтения',
+                'verbose_name_plural': 'Состояния прочтения',
+            },
+        ),
+    ]
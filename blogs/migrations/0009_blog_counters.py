@@ -0,0 +1,44 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:09
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(queryset, field):
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field) \
+                     .annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Account = apps.get_model('accounts', 'Account')
+    Blog = apps.get_model('blogs', 'Blog')
+    Post = apps.get_model('blogs', 'Post')
+    Subscription = apps.get_model('blogs', 'Subscription')
+
+    Blog.objects.update(posts_count=count_subquery(Post.objects.all(), 'blog'),
+                        subscribers_count=count_subquery(Subscription.objects.all(), 'blog'))
+    Account.objects.update(subscriptions_count=count_subquery(Subscription.objects.all(), 'user'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_account_subscriptions_count'),
+        ('blogs', '0008_readstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество постов'),
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='subscribers_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество подписчиков'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('blogs', '0009_blog_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewsletterRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата редактирования')),
+                ('date', models.DateField(unique=True, verbose_name='Дата рассылки')),
+                ('shards', models.PositiveIntegerField(default=0, verbose_name='Количество шардов')),
+                ('users', models.PositiveIntegerField(default=0, verbose_name='Обработано пользователей')),
+                ('sent', models.PositiveIntegerField(default=0, verbose_name='Отправлено дайджестов')),
+                ('elapsed', models.FloatField(default=0, verbose_name='Время выполнения, с')),
+                ('is_done', models.BooleanField(default=False, verbose_name='Завершен?')),
+            ],
+            options={
+                'verbose_name': 'Запуск рассылки',
+                'verbose_name_plural': 'Запуски рассылки',
+            },
+        ),
+        migrations.CreateModel(
+            name='NewsletterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата редактирования')),
+                ('start_user_id', models.BigIntegerField(verbose_name='Начало диапазона (не включительно)')),
+                ('end_user_id', models.BigIntegerField(verbose_name='Конец диапазона (включительно)')),
+                ('users', models.PositiveIntegerField(default=0, verbose_name='Обработано пользователей')),
+                ('sent', models.PositiveIntegerField(default=0, verbose_name='Отправлено дайджестов')),
+                ('elapsed', models.FloatField(default=0, verbose_name='Время выполнения, с')),
+                ('is_done', models.BooleanField(default=False, verbose_name='Завершен?')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='newsletter_shards', to='blogs.newsletterrun', verbose_name='Запуск рассылки')),
+            ],
+            options={
+                'verbose_name': 'Шард рассылки',
+                'verbose_name_plural': 'Шарды рассылки',
+                'unique_together': {('run', 'start_user_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='NewsletterDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата рассылки')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='newsletter_deliveries', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Отправка рассылки',
+                'verbose_name_plural': 'Отправки рассылки',
+                'unique_together': {('user', 'date')},
+            },
+        ),
+    ]
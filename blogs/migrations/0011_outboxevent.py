@@ -0,0 +1,30 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:15
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0010_newsletter_runs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('post_created', 'Пост создан'), ('post_deleted', 'Пост удален')], max_length=50, verbose_name='Тип события')),
+                ('payload', models.JSONField(default=dict, verbose_name='Данные события')),
+                ('dedup_key', models.CharField(max_length=255, unique=True, verbose_name='Ключ дедупликации')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата создания')),
+                ('published_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата публикации')),
+            ],
+            options={
+                'verbose_name': 'Событие outbox',
+                'verbose_name_plural': 'События outbox',
+                'indexes': [models.Index(condition=models.Q(('published_at__isnull', True)), fields=['id'], name='blogs_outbox_pending_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0011_outboxevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fanoutcheckpoint',
+            name='post_ids',
+            field=models.JSONField(default=list, verbose_name='Посты, раскладываемые вместе с основным'),
+        ),
+    ]
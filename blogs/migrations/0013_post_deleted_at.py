@@ -0,0 +1,35 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:18
+
+from django.db import migrations, models
+import django.db.models.manager
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0012_fanoutcheckpoint_post_ids'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='post',
+            options={'base_manager_name': 'all_objects', 'verbose_name': 'Пост', 'verbose_name_plural': 'Посты'},
+        ),
+        migrations.AlterModelManagers(
+            name='post',
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, help_text='Пост удален и ожидает очистки лент и прочтений', null=True, verbose_name='Дата удаления'),
+        ),
+        migrations.AlterField(
+            model_name='outboxevent',
+            name='event_type',
+            field=models.CharField(choices=[('post_created', 'Пост создан'), ('post_deleted', 'Пост удален (помечен, ожидает очистки)')], max_length=50, verbose_name='Тип события'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0014_outbox_blogs_subscribed'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outboxevent',
+            name='event_type',
+            field=models.CharField(choices=[('post_created', 'Пост создан'), ('post_deleted', 'Пост удален (помечен, ожидает очистки)'), ('blogs_subscribed', 'Пользователь подписался на блоги'), ('blogs_unsubscribed', 'Пользователь отписался от блогов')], max_length=50, verbose_name='Тип события'),
+        ),
+    ]
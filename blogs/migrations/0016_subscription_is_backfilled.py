@@ -0,0 +1,24 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0015_outbox_blogs_unsubscribed'),
+    ]
+
+    # существующие подписки уже заполнены (rebuild_news_feeds), новые - по умолчанию нет
+    operations = [
+        migrations.AddField(
+            model_name='subscription',
+            name='is_backfilled',
+            field=models.BooleanField(default=True, help_text='Посты блога добавлены в ленту пользователя', verbose_name='Лента заполнена?'),
+        ),
+        migrations.AlterField(
+            model_name='subscription',
+            name='is_backfilled',
+            field=models.BooleanField(default=False, help_text='Посты блога добавлены в ленту пользователя', verbose_name='Лента заполнена?'),
+        ),
+    ]
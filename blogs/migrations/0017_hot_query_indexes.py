@@ -0,0 +1,48 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:25
+
+from django.contrib.postgres import operations
+from django.db import migrations, models
+
+
+class AddIndexConcurrently(operations.AddIndexConcurrently):
+    """ CREATE INDEX CONCURRENTLY без блокировки записи в PostgreSQL, обычный CREATE INDEX в остальных СУБД. """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('blogs', '0016_subscription_is_backfilled'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='post',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['blog', '-created_at', '-id'], name='blogs_post_blog_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='readpost',
+            index=models.Index(condition=models.Q(('is_read', True)), fields=['user', 'post'], name='blogs_readpost_read_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='subscription',
+            index=models.Index(fields=['user', 'blog', 'is_backfilled'], name='blogs_sub_user_cov_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='subscription',
+            index=models.Index(fields=['blog', 'user'], name='blogs_sub_blog_user_idx'),
+        ),
+    ]
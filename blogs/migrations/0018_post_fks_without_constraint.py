@@ -0,0 +1,29 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0017_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='fanoutcheckpoint',
+            name='post',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='fanout_checkpoints', to='blogs.post', verbose_name='Пост'),
+        ),
+        migrations.AlterField(
+            model_name='feedentry',
+            name='post',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='blogs.post', verbose_name='Пост'),
+        ),
+        migrations.AlterField(
+            model_name='readpost',
+            name='post',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='read_by_user', to='blogs.post', verbose_name='Пост'),
+        ),
+    ]
@@ -0,0 +1,124 @@
+from django.db import migrations
+
+# Таблица постов пересоздается секционированной по диапазонам created_at (месячные партиции, UTC).
+# Первичный ключ секционированной таблицы обязан включать ключ секционирования: (id, created_at),
+# поэтому внешние ключи на посты сняты (0018_post_fks_without_constraint, accounts 0006).
+# Партиции создаются от месяца самого старого поста до POST_PARTITIONS_AHEAD месяцев вперед,
+# дальше их создает периодическая задача create_post_partitions. Партиции DEFAULT нет:
+# с ней нельзя отсоединять старые партиции через DETACH PARTITION ... CONCURRENTLY.
+# Индексы и внешний ключ на блог переносятся с исходными именами.
+PARTITION_POSTS = """
+DO $$
+DECLARE
+    next_id bigint;
+    month date;
+    last_month date;
+    statement text;
+    indexes text[];
+    constraints text[];
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'blogs_post'::regclass) = 'p' THEN
+        RETURN;
+    END IF;
+
+    SELECT coalesce(array_agg(indexdef), '{}') INTO indexes FROM pg_indexes
+     WHERE schemaname = current_schema() AND tablename = 'blogs_post' AND indexname <> 'blogs_post_pkey';
+    SELECT coalesce(array_agg(format('ALTER TABLE blogs_post ADD CONSTRAINT %I %s', conname,
+                                     pg_get_constraintdef(oid))), '{}') INTO constraints
+      FROM pg_constraint WHERE conrelid = 'blogs_post'::regclass AND contype = 'f';
+
+    ALTER TABLE blogs_post RENAME TO blogs_post_unpartitioned;
+    ALTER INDEX blogs_post_pkey RENAME TO blogs_post_unpartitioned_pkey;
+    SELECT coalesce(max(id), 0) + 1 INTO next_id FROM blogs_post_unpartitioned;
+    ALTER TABLE blogs_post_unpartitioned ALTER COLUMN id DROP IDENTITY IF EXISTS;
+    ALTER TABLE blogs_post_unpartitioned ALTER COLUMN id DROP DEFAULT;
+
+    CREATE TABLE blogs_post (LIKE blogs_post_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+        PARTITION BY RANGE (created_at);
+    ALTER TABLE blogs_post ADD PRIMARY KEY (id, created_at);
+    CREATE SEQUENCE blogs_post_id_partitioned_seq OWNED BY blogs_post.id;
+    PERFORM setval('blogs_post_id_partitioned_seq', next_id, false);
+    ALTER TABLE blogs_post ALTER COLUMN id SET DEFAULT nextval('blogs_post_id_partitioned_seq');
+
+    month := date_trunc('month', coalesce((SELECT min(created_at) FROM blogs_post_unpartitioned), now())
+                                 AT TIME ZONE 'UTC')::date;
+    last_month := (date_trunc('month', now() AT TIME ZONE 'UTC')
+                   + interval '1 month' * POST_PARTITIONS_AHEAD)::date;
+    WHILE month <= last_month LOOP
+        EXECUTE format('CREATE TABLE %I PARTITION OF blogs_post FOR VALUES FROM (%L) TO (%L)',
+                       'blogs_post_p' || to_char(month, 'YYYY_MM'),
+                       to_char(month, 'YYYY-MM-DD') || ' 00:00:00+00',
+                       to_char(month + interval '1 month', 'YYYY-MM-DD') || ' 00:00:00+00');
+        month := (month + interval '1 month')::date;
+    END LOOP;
+
+    INSERT INTO blogs_post SELECT * FROM blogs_post_unpartitioned;
+    DROP TABLE blogs_post_unpartitioned;
+    ALTER SEQUENCE blogs_post_id_partitioned_seq RENAME TO blogs_post_id_seq;
+
+    FOREACH statement IN ARRAY indexes || constraints LOOP
+        EXECUTE statement;
+    END LOOP;
+END
+$$;
+"""
+
+# Обратная операция: обычная таблица с первичным ключом (id); отсоединенные ранее партиции не возвращаются
+UNPARTITION_POSTS = """
+DO $$
+DECLARE
+    statement text;
+    indexes text[];
+    constraints text[];
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'blogs_post'::regclass) <> 'p' THEN
+        RETURN;
+    END IF;
+
+    SELECT coalesce(array_agg(indexdef), '{}') INTO indexes FROM pg_indexes
+     WHERE schemaname = current_schema() AND tablename = 'blogs_post' AND indexname <> 'blogs_post_pkey';
+    SELECT coalesce(array_agg(format('ALTER TABLE blogs_post ADD CONSTRAINT %I %s', conname,
+                                     pg_get_constraintdef(oid))), '{}') INTO constraints
+      FROM pg_constraint WHERE conrelid = 'blogs_post'::regclass AND contype = 'f';
+
+    ALTER TABLE blogs_post RENAME TO blogs_post_partitioned;
+    ALTER INDEX blogs_post_pkey RENAME TO blogs_post_partitioned_pkey;
+    CREATE TABLE blogs_post (LIKE blogs_post_partitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS);
+    ALTER TABLE blogs_post ADD PRIMARY KEY (id);
+    ALTER SEQUENCE blogs_post_id_seq OWNED BY blogs_post.id;
+
+    INSERT INTO blogs_post SELECT * FROM blogs_post_partitioned;
+    DROP TABLE blogs_post_partitioned;
+
+    FOREACH statement IN ARRAY indexes || constraints LOOP
+        EXECUTE statement;
+    END LOOP;
+END
+$$;
+"""
+
+
+def partition_posts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from django.conf import settings
+    schema_editor.execute(PARTITION_POSTS.replace('POST_PARTITIONS_AHEAD', str(int(settings.POST_PARTITIONS_AHEAD))),
+                          params=None)
+
+
+def unpartition_posts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(UNPARTITION_POSTS, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0018_post_fks_without_constraint'),
+        ('accounts', '0006_read_posts_without_constraint'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_posts, unpartition_posts),
+    ]
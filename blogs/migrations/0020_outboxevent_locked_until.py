@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-18 15:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0019_partition_post'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxevent',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Захвачено relay до'),
+        ),
+    ]
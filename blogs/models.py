@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 from .bases import DateTimeBaseModel
 
@@ -7,6 +8,8 @@ from .bases import DateTimeBaseModel
 class Blog(models.Model):
     user = models.OneToOneField('accounts.Account', on_delete=models.CASCADE, related_name='blog', db_index=True,
                                 verbose_name='Пользователь')
+    posts_count = models.PositiveIntegerField(default=0, verbose_name='Количество постов')
+    subscribers_count = models.PositiveIntegerField(default=0, verbose_name='Количество подписчиков')
 
     class Meta:
         verbose_name = 'Блог'
@@ -16,14 +19,32 @@ class Blog(models.Model):
         return f'Блог пользователя: {self.user.username}'
 
 
+class PostManager(models.Manager):
+    """ Менеджер постов без удаленных (помеченных deleted_at) """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Post(DateTimeBaseModel):
     blog = models.ForeignKey(Blog, on_delete=models.CASCADE, related_name='posts', db_index=True, verbose_name='Блог')
     title = models.CharField(max_length=100, verbose_name='Заголовок')
     content = models.TextField(max_length=140, blank=True, verbose_name='Текст', help_text='Не более 140 символов')
+    deleted_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата удаления',
+                                      help_text='Пост удален и ожидает очистки лент и прочтений')
+
+    objects = PostManager()
+    all_objects = models.Manager()
 
     class Meta:
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        base_manager_name = 'all_objects'
+        indexes = [
+            # последние посты блогов: лента (pull), заполнение ленты при подписке, рассылка
+            models.Index(fields=['blog', '-created_at', '-id'], condition=models.Q(deleted_at__isnull=True),
+                         name='blogs_post_blog_created_idx'),
+        ]
 
     def __str__(self):
         return f'Пост {self.title} пользователя: {self.blog.user.username}'
@@ -34,11 +55,19 @@ class Subscription(DateTimeBaseModel):
                              db_index=True, verbose_name='Пользователь')
     blog = models.ForeignKey('blogs.Blog', on_delete=models.CASCADE, related_name='subscribers', db_index=True,
                              verbose_name='Блог')
+    is_backfilled = models.BooleanField(default=False, verbose_name='Лента заполнена?',
+                                        help_text='Посты блога добавлены в ленту пользователя')
 
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
         unique_together = ('user', 'blog')
+        indexes = [
+            # подписки пользователя для ленты без обращения к таблице (index-only scan)
+            models.Index(fields=['user', 'blog', 'is_backfilled'], name='blogs_sub_user_cov_idx'),
+            # подписчики блога в порядке user_id для раскладки по лентам (keyset)
+            models.Index(fields=['blog', 'user'], name='blogs_sub_blog_user_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user} подписан на блог {self.blog}'
@@ -48,10 +77,168 @@ class ReadPost(DateTimeBaseModel):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='read_posts_by_user',
                              db_index=True, verbose_name='Пользователь')
     post = models.ForeignKey('blogs.Post', on_delete=models.CASCADE, related_name='read_by_user', db_index=True,
-                             verbose_name='Пост')
+                             db_constraint=False, verbose_name='Пост')
     is_read = models.BooleanField(default=False, verbose_name='Прочитан?')
 
     class Meta:
         verbose_name = 'Прочтенный пост'
         verbose_name_plural = 'Прочтенные посты'
         unique_together = ('user', 'post')
+        indexes = [
+            # флаги прочтения ленты: только прочитанные посты пользователя
+            models.Index(fields=['user', 'post'], condition=models.Q(is_read=True), name='blogs_readpost_read_idx'),
+        ]
+
+
+class FeedEntry(models.Model):
+    """ Запись материализованной ленты новостей пользователя (fan-out on write) """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='feed_entries',
+                             verbose_name='Пользователь')
+    post = models.ForeignKey('blogs.Post', on_delete=models.CASCADE, related_name='feed_entries', db_constraint=False,
+                             verbose_name='Пост')
+    blog = models.ForeignKey('blogs.Blog', on_delete=models.CASCADE, related_name='feed_entries', db_index=True,
+                             verbose_name='Блог')
+    created_at = models.DateTimeField(verbose_name='Дата создания поста')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-post'], name='blogs_feed_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'Пост {self.post_id} в ленте пользователя {self.user_id}'
+
+
+class FanOutCheckpoint(DateTimeBaseModel):
+    """ Чекпоинт пачки подписчиков при раскладке поста по лентам """
+
+    post = models.ForeignKey('blogs.Post', on_delete=models.CASCADE, related_name='fanout_checkpoints',
+                             db_index=True, db_constraint=False, verbose_name='Пост')
+    post_ids = models.JSONField(default=list, verbose_name='Посты, раскладываемые вместе с основным')
+    start_user_id = models.BigIntegerField(verbose_name='Начало диапазона (не включительно)')
+    end_user_id = models.BigIntegerField(verbose_name='Конец диапазона (включительно)')
+    last_user_id = models.BigIntegerField(verbose_name='Последний обработанный подписчик')
+    rows = models.PositiveIntegerField(default=0, verbose_name='Записано строк')
+    is_done = models.BooleanField(default=False, verbose_name='Завершен?')
+
+    class Meta:
+        verbose_name = 'Чекпоинт раскладки'
+        verbose_name_plural = 'Чекпоинты раскладки'
+        unique_together = ('post', 'start_user_id')
+
+    def __str__(self):
+        return f'Пост {self.post_id}: подписчики ({self.start_user_id}, {self.end_user_id}]'
+
+
+class ReadState(DateTimeBaseModel):
+    """
+    Компактное состояние прочтения постов пользователем.
+
+    Прочитаны все посты с id не больше watermark, а также посты из сжатого множества bitmap
+    (см. blogs.read_state.PostIdSet). watermark сдвигается по ленте пользователя до самого старого
+    непрочитанного поста и опускается при подписке, чтобы старые посты нового блога не считались прочитанными.
+    """
+
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='read_state',
+                                verbose_name='Пользователь')
+    watermark = models.BigIntegerField(default=0, verbose_name='Прочитаны все посты до id (включительно)')
+    bitmap = models.BinaryField(default=b'', verbose_name='Прочитанные посты после watermark')
+
+    class Meta:
+        verbose_name = 'Состояние прочтения'
+        verbose_name_plural = 'Состояния прочтения'
+
+    def __str__(self):
+        return f'Состояние прочтения пользователя {self.user_id}'
+
+
+class NewsletterRun(DateTimeBaseModel):
+    """ Запуск ежедневной рассылки """
+
+    date = models.DateField(unique=True, verbose_name='Дата рассылки')
+    shards = models.PositiveIntegerField(default=0, verbose_name='Количество шардов')
+    users = models.PositiveIntegerField(default=0, verbose_name='Обработано пользователей')
+    sent = models.PositiveIntegerField(default=0, verbose_name='Отправлено дайджестов')
+    elapsed = models.FloatField(default=0, verbose_name='Время выполнения, с')
+    is_done = models.BooleanField(default=False, verbose_name='Завершен?')
+
+    class Meta:
+        verbose_name = 'Запуск рассылки'
+        verbose_name_plural = 'Запуски рассылки'
+
+    def __str__(self):
+        return f'Рассылка за {self.date}'
+
+
+class NewsletterShard(DateTimeBaseModel):
+    """ Шард рассылки: диапазон идентификаторов пользователей """
+
+    run = models.ForeignKey('blogs.NewsletterRun', on_delete=models.CASCADE, related_name='newsletter_shards',
+                            db_index=True, verbose_name='Запуск рассылки')
+    start_user_id = models.BigIntegerField(verbose_name='Начало диапазона (не включительно)')
+    end_user_id = models.BigIntegerField(verbose_name='Конец диапазона (включительно)')
+    users = models.PositiveIntegerField(default=0, verbose_name='Обработано пользователей')
+    sent = models.PositiveIntegerField(default=0, verbose_name='Отправлено дайджестов')
+    elapsed = models.FloatField(default=0, verbose_name='Время выполнения, с')
+    is_done = models.BooleanField(default=False, verbose_name='Завершен?')
+
+    class Meta:
+        verbose_name = 'Шард рассылки'
+        verbose_name_plural = 'Шарды рассылки'
+        unique_together = ('run', 'start_user_id')
+
+    def __str__(self):
+        return f'{self.run}: пользователи ({self.start_user_id}, {self.end_user_id}]'
+
+
+class NewsletterDelivery(models.Model):
+    """ Отметка об отправке дайджеста пользователю за дату """
+
+    user = models.ForeignKey('accounts.Account', on_delete=models.CASCADE, related_name='newsletter_deliveries',
+                             verbose_name='Пользователь')
+    date = models.DateField(verbose_name='Дата рассылки')
+
+    class Meta:
+        verbose_name = 'Отправка рассылки'
+        verbose_name_plural = 'Отправки рассылки'
+        unique_together = ('user', 'date')
+
+    def __str__(self):
+        return f'{self.user_id}: {self.date}'
+
+
+class OutboxEvent(models.Model):
+    """ Событие транзакционного outbox: записывается в одной транзакции с изменением и публикуется relay-задачей """
+
+    POST_CREATED = 'post_created'
+    POST_DELETED = 'post_deleted'
+    BLOGS_SUBSCRIBED = 'blogs_subscribed'
+    BLOGS_UNSUBSCRIBED = 'blogs_unsubscribed'
+    EVENT_TYPES = (
+        (POST_CREATED, 'Пост создан'),
+        (POST_DELETED, 'Пост удален (помечен, ожидает очистки)'),
+        (BLOGS_SUBSCRIBED, 'Пользователь подписался на блоги'),
+        (BLOGS_UNSUBSCRIBED, 'Пользователь отписался от блогов'),
+    )
+
+    event_type = models.CharField(max_length=50, choices=EVENT_TYPES, verbose_name='Тип события')
+    payload = models.JSONField(default=dict, verbose_name='Данные события')
+    dedup_key = models.CharField(max_length=255, unique=True, verbose_name='Ключ дедупликации')
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='Дата создания')
+    published_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата публикации')
+    locked_until = models.DateTimeField(null=True, blank=True, verbose_name='Захвачено relay до')
+
+    class Meta:
+        verbose_name = 'Событие outbox'
+        verbose_name_plural = 'События outbox'
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(published_at__isnull=True),
+                         name='blogs_outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.event_type}: {self.dedup_key}'
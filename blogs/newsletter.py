@@ -0,0 +1,211 @@
+import json
+import logging
+from collections import defaultdict
+from datetime import date
+from itertools import islice
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.mail import get_connection, EmailMessage
+from django.db.models import F, Max, Min, Window
+from django.db.models.functions import RowNumber
+from django.utils.module_loading import import_string
+
+from accounts.models import Account
+from .feed import get_feed_posts
+from .models import NewsletterDelivery, Post
+
+logger = logging.getLogger('django')
+
+
+class Recipient(NamedTuple):
+    id: int
+    username: str
+    email: str
+
+
+class BaseNewsletterSink:
+    """ Получатель дайджестов рассылки """
+
+    def send(self, recipient: Recipient, posts: List[Post]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class LogSink(BaseNewsletterSink):
+    """ Вывод дайджестов в лог """
+
+    def send(self, recipient: Recipient, posts: List[Post]) -> None:
+        logger.info(f'Ежедневная отправка для {recipient.username}:')
+        logger.info('Последние посты:')
+        for post in posts:
+            logger.info(f'Пост {post.title} пользователя: {post.blog.user.username}')
+
+
+class FileSink(BaseNewsletterSink):
+    """ Запись дайджестов в файл NEWSLETTER_FILE_PATH, по одному JSON на строку """
+
+    def __init__(self):
+        self.file = open(settings.NEWSLETTER_FILE_PATH, 'a', encoding='utf-8')
+
+    def send(self, recipient: Recipient, posts: List[Post]) -> None:
+        digest = {
+            'user': recipient.username,
+            'posts': [{'id': post.id, 'title': post.title, 'author': post.blog.user.username} for post in posts],
+        }
+        self.file.write(json.dumps(digest, ensure_ascii=False) + '\n')
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class EmailSink(BaseNewsletterSink):
+    """ Отправка дайджестов письмами через EMAIL_BACKEND (например, локальный SMTP-сервер) одним соединением """
+
+    def __init__(self):
+        self.connection = get_connection()
+        self.connection.open()
+
+    def send(self, recipient: Recipient, posts: List[Post]) -> None:
+        if not recipient.email:
+            return
+        body = '\n'.join(f'Пост {post.title} пользователя: {post.blog.user.username}' for post in posts)
+        EmailMessage(subject='Последние посты', body=body, to=[recipient.email],
+                     connection=self.connection).send()
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def get_sink() -> BaseNewsletterSink:
+    return import_string(settings.NEWSLETTER_SINK)()
+
+
+def get_recipients():
+    return Account.objects.filter(subscriptions_count__gt=0)
+
+
+def split_recipients(shards: int) -> List[Tuple[int, int]]:
+    """
+    Разбивает пользователей с подписками на shards диапазонов id одинаковой ширины (не больше, чем пользователей).
+
+    :param shards: Количество шардов.
+    :return: Список диапазонов (начало не включительно, конец включительно).
+    """
+    bounds = get_recipients().aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return []
+
+    start = bounds['first'] - 1
+    span = bounds['last'] - start
+    ends = sorted({start + span * shard // shards for shard in range(1, shards + 1)} - {start})
+    return list(zip([start] + ends[:-1], ends))
+
+
+def iter_recipient_batches(batch_size: int, after_user_id: int = 0,
+                           until_user_id: Optional[int] = None) -> Iterator[List[Recipient]]:
+    """
+    Потоковое чтение пользователей с подписками в порядке id пачками по batch_size.
+
+    :param batch_size: Количество пользователей в пачке.
+    :param after_user_id: Начало диапазона id (не включительно).
+    :param until_user_id: Конец диапазона id (включительно).
+    :return: Итератор по пачкам получателей.
+    """
+    recipients = get_recipients().filter(id__gt=after_user_id)
+    if until_user_id is not None:
+        recipients = recipients.filter(id__lte=until_user_id)
+    recipients = recipients.order_by('id').values_list('id', 'username', 'email').iterator(chunk_size=batch_size)
+    while True:
+        batch = [Recipient(*row) for row in islice(recipients, batch_size)]
+        if not batch:
+            return
+        yield batch
+
+
+def get_pending(recipients: List[Recipient], day: date) -> List[Recipient]:
+    """
+    Получатели, которым дайджест за день еще не отправлен.
+
+    :param recipients: Получатели пачки.
+    :param day: Дата рассылки.
+    :return: Получатели без отметки об отправке.
+    """
+    delivered = set(NewsletterDelivery.objects.filter(date=day, user_id__in=[item.id for item in recipients])
+                                              .values_list('user_id', flat=True))
+    return [recipient for recipient in recipients if recipient.id not in delivered]
+
+
+def confirm_deliveries(recipients: List[Recipient], day: date) -> None:
+    """
+    Отмечает отправку дайджестов за день одним bulk_create.
+
+    Отмечаются только получатели, дайджест которым уже отправлен: если отправка оборвалась на середине пачки,
+    повторный запуск доставит дайджесты остальным.
+
+    :param recipients: Получатели, которым дайджест отправлен.
+    :param day: Дата рассылки.
+    """
+    NewsletterDelivery.objects.bulk_create([NewsletterDelivery(user_id=recipient.id, date=day)
+                                            for recipient in recipients], ignore_conflicts=True)
+
+
+def get_latest_posts(user_ids: List[int], limit: int) -> Dict[int, List[Post]]:
+    """
+    Последние посты блогов, на которые подписаны пользователи, одним запросом на всю пачку.
+
+    Посты нумеруются ROW_NUMBER() в разрезе подписчика, отбираются первые limit (не старше NEWS_FEED_MAX_AGE_DAYS).
+
+    :param user_ids: Идентификаторы пользователей.
+    :param limit: Количество постов на пользователя.
+    :return: Словарь {идентификатор пользователя: посты от новых к старым}.
+    """
+    subscriber = F('blog__subscribers__user_id')
+    posts = get_feed_posts().filter(blog__subscribers__user_id__in=user_ids) \
+                            .annotate(subscriber_id=subscriber,
+                                      position=Window(RowNumber(), partition_by=[subscriber],
+                                                      order_by=[F('created_at').desc(), F('id').desc()])) \
+                            .filter(position__lte=limit) \
+                            .select_related('blog__user') \
+                            .order_by('subscriber_id', 'position')
+
+    latest: Dict[int, List[Post]] = defaultdict(list)
+    for post in posts:
+        latest[post.subscriber_id].append(post)
+    return latest
+
+
+def send_newsletter(sink: BaseNewsletterSink, batch_size: int, day: date, after_user_id: int = 0,
+                    until_user_id: Optional[int] = None) -> Dict[str, int]:
+    """
+    Рассылка дайджестов последних постов пользователям с подписками из диапазона id.
+
+    Память ограничена одной пачкой пользователей и их постами. Отправка отмечается после sink.send
+    (в том числе при ошибке на середине пачки), поэтому повторный запуск за день не отправляет дайджест
+    повторно и не теряет неотправленные.
+
+    :param sink: Получатель дайджестов.
+    :param batch_size: Количество пользователей в пачке.
+    :param day: Дата рассылки.
+    :param after_user_id: Начало диапазона id (не включительно).
+    :param until_user_id: Конец диапазона id (включительно).
+    :return: Количество обработанных пользователей и отправленных дайджестов.
+    """
+    stats = {'users': 0, 'sent': 0}
+    try:
+        for batch in iter_recipient_batches(batch_size, after_user_id, until_user_id):
+            stats['users'] += len(batch)
+            latest = get_latest_posts([recipient.id for recipient in batch], settings.NEWSLETTER_POSTS_LIMIT)
+            sent = []
+            try:
+                for recipient in get_pending([recipient for recipient in batch if recipient.id in latest], day):
+                    sink.send(recipient, latest[recipient.id])
+                    sent.append(recipient)
+            finally:
+                confirm_deliveries(sent, day)
+                stats['sent'] += len(sent)
+    finally:
+        sink.close()
+    return stats
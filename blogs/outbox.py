@@ -0,0 +1,122 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from typing import Any, Dict, List, Tuple
+
+from celery import current_app
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .feed_cache import incr_counter
+from .models import OutboxEvent
+
+logger = logging.getLogger('django')
+
+# Задача Celery, в которую публикуется событие каждого типа; payload передается как kwargs
+EVENT_TASKS = {
+    OutboxEvent.POST_CREATED: 'blogs.tasks.update_news_feed',
+    OutboxEvent.POST_DELETED: 'blogs.tasks.purge_deleted_post',
+    OutboxEvent.BLOGS_SUBSCRIBED: 'blogs.tasks.backfill_news_feed',
+    OutboxEvent.BLOGS_UNSUBSCRIBED: 'blogs.tasks.purge_news_feed',
+}
+# События, которые объединяются по блогу за окно NEWS_FEED_COALESCE_WINDOW
+COALESCED_EVENTS = [OutboxEvent.POST_CREATED]
+
+EVENTS_KEY = 'outbox:stats:events'
+MERGED_KEY = 'outbox:stats:merged'
+
+
+def add_event(event_type: str, payload: Dict[str, Any], dedup_key: str) -> None:
+    """
+    Записывает событие в outbox в текущей транзакции; событие с тем же ключом не дублируется.
+
+    :param event_type: Тип события.
+    :param payload: Данные события (аргументы задачи).
+    :param dedup_key: Ключ дедупликации.
+    """
+    OutboxEvent.objects.bulk_create([OutboxEvent(event_type=event_type, payload=payload, dedup_key=dedup_key)],
+                                    ignore_conflicts=True)
+
+
+def get_relay_batch(events: List[OutboxEvent]) -> List[Tuple[str, Dict[str, Any], str]]:
+    """
+    Превращает пачку событий в задачи Celery.
+
+    События создания постов одного блога объединяются в одну раскладку со всеми id постов.
+
+    :param events: События пачки.
+    :return: Список (имя задачи, kwargs, task_id).
+    """
+    tasks = []
+    coalesced: Dict[int, List[OutboxEvent]] = defaultdict(list)
+    for event in events:
+        if event.event_type in COALESCED_EVENTS and 'blog_id' in event.payload:
+            coalesced[event.payload['blog_id']].append(event)
+        else:
+            tasks.append((EVENT_TASKS[event.event_type], event.payload, event.dedup_key))
+
+    for blog_id, blog_events in coalesced.items():
+        post_ids = sorted(event.payload['post_id'] for event in blog_events)
+        tasks.append((EVENT_TASKS[OutboxEvent.POST_CREATED], {'post_id': post_ids[-1], 'post_ids': post_ids},
+                      f'{OutboxEvent.POST_CREATED}:{blog_id}:{blog_events[0].id}-{blog_events[-1].id}'))
+    return tasks
+
+
+def relay_events(batch_size: int) -> Dict[str, int]:
+    """
+    Публикует в Celery пачку неопубликованных событий.
+
+    События захватываются в короткой транзакции (SELECT ... FOR UPDATE SKIP LOCKED и locked_until
+    на OUTBOX_LOCK_TIMEOUT секунд), поэтому несколько relay-воркеров не делят одну пачку, а блокировки строк
+    не держатся во время отправки в брокер. Отметка о публикации фиксируется после отправки: при сбое
+    между ними события будут опубликованы повторно после истечения захвата (at-least-once).
+    Ключ дедупликации передается как task_id.
+
+    События создания постов блога публикуются одной раскладкой (см. get_relay_batch), когда самому старому
+    из них исполняется NEWS_FEED_COALESCE_WINDOW секунд: вместе с ним публикуются и все более новые события
+    блога, то есть за окно выполняется одна раскладка на блог.
+
+    :param batch_size: Количество событий в пачке.
+    :return: Количество опубликованных событий и отправленных задач.
+    """
+    now = timezone.now()
+    border = now - timedelta(seconds=settings.NEWS_FEED_COALESCE_WINDOW)
+    pending = OutboxEvent.objects.filter(published_at__isnull=True) \
+                                 .filter(Q(locked_until__isnull=True) | Q(locked_until__lt=now))
+    with transaction.atomic():
+        ripe_blog_ids = list(pending.filter(event_type__in=COALESCED_EVENTS, created_at__lte=border)
+                                    .order_by().values_list('payload__blog_id', flat=True).distinct()[:batch_size])
+        events = list(pending.select_for_update(skip_locked=True)
+                             .filter(~Q(event_type__in=COALESCED_EVENTS) | Q(created_at__lte=border)
+                                     | Q(payload__blog_id__in=ripe_blog_ids))
+                             .order_by('id')[:batch_size])
+        event_ids = [event.id for event in events]
+        OutboxEvent.objects.filter(id__in=event_ids) \
+                           .update(locked_until=now + timedelta(seconds=settings.OUTBOX_LOCK_TIMEOUT))
+
+    tasks = get_relay_batch(events)
+    for name, kwargs, task_id in tasks:
+        current_app.send_task(name, kwargs=kwargs, task_id=task_id)
+    OutboxEvent.objects.filter(id__in=event_ids).update(published_at=timezone.now())
+
+    if events:
+        incr_counter(EVENTS_KEY, len(events))
+        incr_counter(MERGED_KEY, len(events) - len(tasks))
+    return {'events': len(events), 'tasks': len(tasks)}
+
+
+def get_relay_stats() -> Dict[str, int]:
+    """ Накопленная статистика relay: опубликовано событий и сколько из них объединено с другими. """
+    values = cache.get_many([EVENTS_KEY, MERGED_KEY])
+    return {'events': values.get(EVENTS_KEY, 0), 'merged': values.get(MERGED_KEY, 0)}
+
+
+def delete_published_events() -> int:
+    """ Удаляет опубликованные события старше OUTBOX_RETENTION секунд. """
+    border = timezone.now() - timedelta(seconds=settings.OUTBOX_RETENTION)
+    deleted, _ = OutboxEvent.objects.filter(published_at__lt=border).delete()
+    return deleted
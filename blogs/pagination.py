@@ -0,0 +1,95 @@
+import base64
+import binascii
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, List, Optional
+
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .feed import FeedItem
+
+
+class FeedPageNumberPagination(PageNumberPagination):
+    """ Постраничная пагинация ленты с размером страницы, ограниченным NEWS_FEED_MAX_PAGE_SIZE """
+
+    page_size_query_param = 'page_size'
+
+    def __init__(self):
+        self.page_size = settings.NEWS_FEED_PAGE_SIZE
+        self.max_page_size = settings.NEWS_FEED_MAX_PAGE_SIZE
+
+
+class FeedCursorPagination:
+    """
+    Курсорная (keyset) пагинация ленты по паре (created_at, id).
+
+    Не выполняет COUNT и OFFSET: следующая страница запрашивается через ?after=<курсор>,
+    поэтому глубокие страницы стоят столько же, сколько первая.
+    """
+
+    cursor_query_param = 'after'
+    page_size_query_param = 'page_size'
+
+    def __init__(self, request: Any):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.after = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+        self.next_item: Optional[FeedItem] = None
+
+    @classmethod
+    def is_requested(cls, request: Any) -> bool:
+        """ Клиент запросил курсорную пагинацию (в том числе первую страницу с пустым курсором). """
+        return cls.cursor_query_param in request.query_params
+
+    def get_page_size(self, request: Any) -> int:
+        """ Размер страницы из запроса, не больше NEWS_FEED_MAX_PAGE_SIZE. """
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, settings.NEWS_FEED_PAGE_SIZE))
+        except (TypeError, ValueError):
+            page_size = settings.NEWS_FEED_PAGE_SIZE
+        return max(1, min(page_size, settings.NEWS_FEED_MAX_PAGE_SIZE))
+
+    @staticmethod
+    def encode_cursor(item: FeedItem) -> str:
+        """ Кодирование курсора (дата создания, идентификатор поста). """
+        raw = f'{item[0].isoformat()}|{item[1]}'
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: Optional[str]) -> Optional[FeedItem]:
+        """ Декодирование курсора, пустой курсор означает первую страницу. """
+        if not cursor:
+            return None
+        try:
+            created_at, post_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            return datetime.fromisoformat(created_at), int(post_id)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise ValidationError({'error': 'Некорректный курсор'})
+
+    def paginate_items(self, items: List[FeedItem]) -> List[FeedItem]:
+        """
+        Страница ленты.
+
+        :param items: Элементы ленты после курсора, запрошенные с запасом в один элемент.
+        :return: Элементы текущей страницы.
+        """
+        page = items[:self.page_size]
+        if len(items) > self.page_size:
+            self.next_item = page[-1]
+        return page
+
+    def get_next_link(self) -> Optional[str]:
+        if self.next_item is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_item))
+
+    def get_paginated_response(self, data: List[Any]) -> Response:
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
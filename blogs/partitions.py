@@ -0,0 +1,151 @@
+import re
+from datetime import date, datetime, timezone as dt_timezone
+from typing import List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .feed import delete_in_batches
+from .models import FeedEntry, Post
+
+# Месячные партиции таблицы постов: blogs_post_p2024_01 - посты, созданные в январе 2024 (UTC)
+PARTITION_PREFIX = f'{Post._meta.db_table}_p'
+PARTITION_NAME = re.compile(rf'^{PARTITION_PREFIX}(\d{{4}})_(\d{{2}})$')
+# Месяцы, партиции которых уже проверены в этом процессе (см. ensure_partition)
+ready_months: Set[date] = set()
+
+
+def is_partitioned() -> bool:
+    """ Секционирована ли таблица постов (только PostgreSQL, см. миграцию 0019_partition_post). """
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [Post._meta.db_table])
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def add_months(month: date, months: int) -> date:
+    """ Первое число месяца, отстоящего от month на months месяцев. """
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def get_partition_name(month: date) -> str:
+    return f'{PARTITION_PREFIX}{month:%Y_%m}'
+
+
+def get_partitions() -> List[Tuple[str, date]]:
+    """
+    Месячные партиции таблицы постов.
+
+    :return: Список (имя партиции, первое число месяца) от старых к новым.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT child.relname FROM pg_inherits '
+                       'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+                       'WHERE pg_inherits.inhparent = to_regclass(%s)', [Post._meta.db_table])
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_partitions(months_ahead: int, since: Optional[date] = None) -> List[str]:
+    """
+    Создает недостающие партиции постов на текущий месяц и months_ahead месяцев вперед.
+
+    Партиции DEFAULT нет (с ней нельзя отсоединять партиции CONCURRENTLY), поэтому партиции создаются заранее
+    задачей create_post_partitions; если задача отстала, партицию месяца создает ensure_partition перед записью поста.
+
+    :param months_ahead: На сколько месяцев вперед создавать партиции.
+    :param since: Дата, начиная с месяца которой создавать партиции (например, для постов с датой в прошлом).
+    :return: Имена созданных партиций.
+    """
+    if not is_partitioned():
+        return []
+
+    existing = {name for name, _ in get_partitions()}
+    current = timezone.now().date().replace(day=1)
+    start = min(since.replace(day=1), current) if since else current
+    months = (current.year - start.year) * 12 + current.month - start.month + months_ahead
+    created = []
+    with connection.cursor() as cursor:
+        for offset in range(months + 1):
+            month = add_months(start, offset)
+            name = get_partition_name(month)
+            if name in existing:
+                continue
+            create_partition(cursor, month)
+            created.append(name)
+    return created
+
+
+def create_partition(cursor, month: date) -> None:
+    cursor.execute(f'CREATE TABLE IF NOT EXISTS {get_partition_name(month)} PARTITION OF {Post._meta.db_table} '
+                   f"FOR VALUES FROM ('{month} 00:00:00+00') TO ('{add_months(month, 1)} 00:00:00+00')")
+
+
+def ensure_partition(created_at: datetime) -> None:
+    """
+    Создает партицию месяца created_at, если ее нет: запись поста не падает, когда create_post_partitions отстала.
+
+    Месяц проверяется до первого закоммиченного поста месяца в процессе, дальше запись поста запросов не добавляет.
+
+    :param created_at: Дата создания записываемого поста.
+    """
+    month = created_at.astimezone(dt_timezone.utc).date().replace(day=1)
+    if month in ready_months:
+        return
+    if is_partitioned():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT to_regclass(%s) IS NULL', [get_partition_name(month)])
+            if cursor.fetchone()[0]:
+                create_partition(cursor, month)
+    # при откате транзакции записи поста откатывается и создание партиции: месяц запоминается после коммита
+    transaction.on_commit(lambda: ready_months.add(month))
+
+
+def detach_partitions(before: date, archive_schema: Optional[str] = None, drop: bool = False) -> List[str]:
+    """
+    Отсоединяет партиции постов, целиком лежащие до месяца before.
+
+    Записи лент этих постов удаляются пачками, затем партиция отсоединяется через
+    DETACH PARTITION ... CONCURRENTLY: таблица постов не блокируется на время отсоединения.
+    Отсоединенная партиция остается обычной таблицей, переносится в схему archive_schema или удаляется.
+    Прочтения (ReadPost, Account.read_posts) не удаляются: без внешнего ключа они ссылаются на архивные посты.
+
+    Выполняется вне транзакции (DETACH ... CONCURRENTLY этого требует).
+
+    :param before: Первое число месяца: отсоединяются партиции более ранних месяцев.
+    :param archive_schema: Схема, в которую переносятся отсоединенные партиции.
+    :param drop: Удалить отсоединенные партиции.
+    :return: Имена отсоединенных партиций.
+    """
+    if not is_partitioned():
+        return []
+
+    detached = []
+    for name, month in get_partitions():
+        if add_months(month, 1) > before:
+            continue
+        start = datetime.combine(month, datetime.min.time(), tzinfo=dt_timezone.utc)
+        end = datetime.combine(add_months(month, 1), datetime.min.time(), tzinfo=dt_timezone.utc)
+        delete_in_batches(FeedEntry.objects.filter(created_at__gte=start, created_at__lt=end),
+                          settings.NEWS_FEED_FANOUT_BATCH_SIZE)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {Post._meta.db_table} DETACH PARTITION {name} CONCURRENTLY')
+            if archive_schema:
+                cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {connection.ops.quote_name(archive_schema)}')
+                cursor.execute(f'ALTER TABLE {name} SET SCHEMA {connection.ops.quote_name(archive_schema)}')
+            elif drop:
+                cursor.execute(f'DROP TABLE {name}')
+        ready_months.discard(month)
+        detached.append(name)
+    return detached
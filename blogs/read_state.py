@@ -0,0 +1,290 @@
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, Set, Tuple, Union
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Post, ReadPost, ReadState, Subscription
+
+ROWS = 'rows'
+COMPACT = 'compact'
+
+ARRAY_LIMIT = 4096
+BITMAP_BYTES = 1 << 13
+HEADER = struct.Struct('<4sI')
+CONTAINER = struct.Struct('<QBI')
+MAGIC = b'RS01'
+
+Container = Union[array, bytearray]
+
+
+class PostIdSet:
+    """
+    Сжатое множество идентификаторов постов в духе roaring bitmap.
+
+    Идентификаторы делятся по старшим битам (id >> 16) на контейнеры. Разреженный контейнер -
+    отсортированный массив младших 16 бит (до ARRAY_LIMIT значений), плотный - битовая карта на 8 КБ.
+    Проверка принадлежности - поиск контейнера в словаре и бит/бинарный поиск внутри него.
+    """
+
+    def __init__(self, values: Iterable[int] = ()):
+        self.containers: Dict[int, Container] = {}
+        for value in values:
+            self.add(value)
+
+    def __contains__(self, value: int) -> bool:
+        container = self.containers.get(value >> 16)
+        if container is None:
+            return False
+        low = value & 0xFFFF
+        if isinstance(container, bytearray):
+            return bool(container[low >> 3] & (1 << (low & 7)))
+        index = bisect_left(container, low)
+        return index < len(container) and container[index] == low
+
+    def __iter__(self) -> Iterator[int]:
+        for key in sorted(self.containers):
+            for low in self._iter_container(self.containers[key]):
+                yield (key << 16) | low
+
+    def __len__(self) -> int:
+        return sum(self._container_size(container) for container in self.containers.values())
+
+    def add(self, value: int) -> None:
+        key, low = value >> 16, value & 0xFFFF
+        container = self.containers.get(key)
+        if container is None:
+            self.containers[key] = array('H', [low])
+        elif isinstance(container, bytearray):
+            container[low >> 3] |= 1 << (low & 7)
+        else:
+            index = bisect_left(container, low)
+            if index == len(container) or container[index] != low:
+                container.insert(index, low)
+                if len(container) > ARRAY_LIMIT:
+                    self.containers[key] = self._to_bitmap(container)
+
+    def update(self, values: Iterable[int]) -> None:
+        for value in values:
+            self.add(value)
+
+    def discard_up_to(self, value: int) -> None:
+        """ Удаляет из множества все идентификаторы, не превышающие value. """
+        key, low = value >> 16, value & 0xFFFF
+        for container_key in [container_key for container_key in self.containers if container_key < key]:
+            del self.containers[container_key]
+
+        container = self.containers.get(key)
+        if container is None:
+            return
+        rest = array('H', (item for item in self._iter_container(container) if item > low))
+        if rest:
+            self.containers[key] = rest if len(rest) <= ARRAY_LIMIT else self._to_bitmap(rest)
+        else:
+            del self.containers[key]
+
+    def to_bytes(self) -> bytes:
+        chunks = [HEADER.pack(MAGIC, len(self.containers))]
+        for key in sorted(self.containers):
+            container = self.containers[key]
+            if isinstance(container, bytearray):
+                chunks.append(CONTAINER.pack(key, 1, len(container)))
+                chunks.append(bytes(container))
+            else:
+                data = array('H', container)
+                if sys.byteorder == 'big':
+                    data.byteswap()
+                chunks.append(CONTAINER.pack(key, 0, len(data)))
+                chunks.append(data.tobytes())
+        return b''.join(chunks)
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> 'PostIdSet':
+        result = cls()
+        if not raw:
+            return result
+
+        raw = bytes(raw)
+        magic, count = HEADER.unpack_from(raw, 0)
+        if magic != MAGIC:
+            raise ValueError('Неизвестный формат состояния прочтения')
+
+        offset = HEADER.size
+        for _ in range(count):
+            key, kind, length = CONTAINER.unpack_from(raw, offset)
+            offset += CONTAINER.size
+            if kind == 1:
+                result.containers[key] = bytearray(raw[offset:offset + length])
+                offset += length
+            else:
+                data = array('H')
+                data.frombytes(raw[offset:offset + length * 2])
+                if sys.byteorder == 'big':
+                    data.byteswap()
+                result.containers[key] = data
+                offset += length * 2
+        return result
+
+    @staticmethod
+    def _to_bitmap(values: Iterable[int]) -> bytearray:
+        bitmap = bytearray(BITMAP_BYTES)
+        for low in values:
+            bitmap[low >> 3] |= 1 << (low & 7)
+        return bitmap
+
+    @staticmethod
+    def _iter_container(container: Container) -> Iterator[int]:
+        if not isinstance(container, bytearray):
+            yield from container
+            return
+        for index, byte in enumerate(container):
+            if byte:
+                for bit in range(8):
+                    if byte & (1 << bit):
+                        yield (index << 3) | bit
+
+    @staticmethod
+    def _container_size(container: Container) -> int:
+        if isinstance(container, bytearray):
+            return sum(bin(byte).count('1') for byte in container)
+        return len(container)
+
+
+def compact(watermark: int, read_ids: PostIdSet, feed_ids: Iterable[int]) -> int:
+    """
+    Сдвигает watermark по ленте пользователя до самого старого непрочитанного поста и убирает покрытые посты
+    из множества.
+
+    Посты блогов, на которые пользователь не подписан, и посты, вышедшие за пределы ленты (NEWS_FEED_SIZE
+    последних), не задерживают watermark: они не показываются в ленте.
+
+    :param watermark: Текущий watermark.
+    :param read_ids: Прочитанные посты после watermark.
+    :param feed_ids: Идентификаторы постов ленты пользователя.
+    :return: Новый watermark.
+    """
+    for post_id in sorted(post_id for post_id in feed_ids if post_id > watermark):
+        if post_id not in read_ids:
+            break
+        watermark = post_id
+    read_ids.discard_up_to(watermark)
+    return watermark
+
+
+def get_feed_post_ids(user_id: int, exclude_blog_ids: Iterable[int] = ()) -> List[int]:
+    """
+    Идентификаторы постов ленты пользователя (включая блоги новых подписок, лента по которым еще не заполнена).
+
+    :param user_id: Идентификатор пользователя.
+    :param exclude_blog_ids: Блоги, посты которых не учитываются.
+    :return: Идентификаторы постов.
+    """
+    # feed импортирует read_state
+    from .feed import get_feed_items
+
+    subscriptions = list(Subscription.objects.filter(user_id=user_id).exclude(blog_id__in=list(exclude_blog_ids))
+                                             .values_list('blog_id', 'is_backfilled'))
+    if not subscriptions:
+        return []
+    pending_blog_ids = [blog_id for blog_id, is_backfilled in subscriptions if not is_backfilled]
+    items = get_feed_items(user_id, [blog_id for blog_id, _ in subscriptions], pending_blog_ids=pending_blog_ids)
+    return [post_id for _, post_id in items]
+
+
+def load_read_state(user_id: int) -> Tuple[int, PostIdSet]:
+    """
+    Состояние прочтения пользователя одним запросом.
+
+    :param user_id: Идентификатор пользователя.
+    :return: Пара (watermark, множество прочитанных постов после watermark).
+    """
+    state = ReadState.objects.filter(user_id=user_id).values_list('watermark', 'bitmap').first()
+    if state is None:
+        return 0, PostIdSet()
+    return state[0], PostIdSet.from_bytes(state[1])
+
+
+def get_read_flags(user_id: int, post_ids: Iterable[int]) -> Dict[int, bool]:
+    """
+    Флаги прочтения постов пользователем: один запрос на любое количество постов.
+
+    :param user_id: Идентификатор пользователя.
+    :param post_ids: Идентификаторы постов.
+    :return: Словарь {идентификатор поста: прочитан ли}.
+    """
+    post_ids = list(post_ids)
+    if settings.READ_STATE_BACKEND == ROWS:
+        read_ids = set(ReadPost.objects.filter(user_id=user_id, post_id__in=post_ids, is_read=True)
+                                       .values_list('post_id', flat=True))
+        return {post_id: post_id in read_ids for post_id in post_ids}
+
+    watermark, read_ids = load_read_state(user_id)
+    return {post_id: post_id <= watermark or post_id in read_ids for post_id in post_ids}
+
+
+def mark_read(user_id: int, post_ids: Iterable[int]) -> Set[int]:
+    """
+    Помечает посты прочитанными.
+
+    :param user_id: Идентификатор пользователя.
+    :param post_ids: Идентификаторы существующих постов.
+    :return: Идентификаторы постов, которые уже были прочитаны.
+    """
+    post_ids = set(post_ids)
+    with transaction.atomic():
+        if settings.READ_STATE_BACKEND == ROWS:
+            already_read = set(ReadPost.objects.filter(user_id=user_id, post_id__in=post_ids, is_read=True)
+                                               .values_list('post_id', flat=True))
+            ReadPost.objects.bulk_create(
+                [ReadPost(user_id=user_id, post_id=post_id, is_read=True) for post_id in post_ids - already_read],
+                update_conflicts=True, unique_fields=['user', 'post'], update_fields=['is_read', 'updated_at'],
+            )
+            return already_read
+
+        state, _ = ReadState.objects.select_for_update().get_or_create(user_id=user_id)
+        read_ids = PostIdSet.from_bytes(state.bitmap)
+        already_read = {post_id for post_id in post_ids if post_id <= state.watermark or post_id in read_ids}
+        if already_read == post_ids:
+            return already_read
+
+        read_ids.update(post_ids - already_read)
+        if len(read_ids) >= settings.READ_STATE_COMPACT_SIZE:
+            state.watermark = compact(state.watermark, read_ids, get_feed_post_ids(user_id))
+        state.bitmap = read_ids.to_bytes()
+        state.save(update_fields=['watermark', 'bitmap', 'updated_at'])
+        return already_read
+
+
+def exclude_from_watermark(user_id: int, blog_ids: Iterable[int]) -> None:
+    """
+    Исключает старые посты новых подписок из watermark, чтобы они не считались прочитанными.
+
+    watermark опускается ниже самого старого из NEWS_FEED_SIZE последних постов новых блогов (старше в ленту
+    они не попадут), а прочитанные посты ленты между новым и прежним watermark переносятся во множество.
+
+    :param user_id: Идентификатор пользователя.
+    :param blog_ids: Идентификаторы блогов новых подписок.
+    """
+    if settings.READ_STATE_BACKEND != COMPACT:
+        return
+
+    blog_ids = list(blog_ids)
+    with transaction.atomic():
+        state = ReadState.objects.select_for_update().filter(user_id=user_id, watermark__gt=0).first()
+        if state is None:
+            return
+        new_ids = Post.objects.filter(blog_id__in=blog_ids, id__lte=state.watermark) \
+                              .order_by('-id').values_list('id', flat=True)[:settings.NEWS_FEED_SIZE]
+        oldest_id = min(new_ids, default=None)
+        if oldest_id is None:
+            return
+
+        read_ids = PostIdSet.from_bytes(state.bitmap)
+        read_ids.update(post_id for post_id in get_feed_post_ids(user_id, exclude_blog_ids=blog_ids)
+                        if oldest_id <= post_id <= state.watermark)
+        state.watermark = oldest_id - 1
+        state.bitmap = read_ids.to_bytes()
+        state.save(update_fields=['watermark', 'bitmap', 'updated_at'])
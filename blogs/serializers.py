@@ -13,3 +13,15 @@ class PostSerializer(serializers.ModelSerializer):
     class Meta:
         model = Post
         fields = ['id', 'blog', 'title', 'content', 'created_at']
+
+
+class FeedPostSerializer(PostSerializer):
+    """ Пост ленты с флагом прочтения; флаги передаются в контексте (read_flags) одним словарем на страницу """
+
+    is_read = serializers.SerializerMethodField()
+
+    class Meta(PostSerializer.Meta):
+        fields = PostSerializer.Meta.fields + ['is_read']
+
+    def get_is_read(self, post: Post) -> bool:
+        return self.context.get('read_flags', {}).get(post.id, False)
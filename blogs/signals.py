@@ -1,16 +1,53 @@
-from django.db.models.signals import post_save, post_delete
+import uuid
+
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
-from .models import Post
-from .tasks import update_news_feed
+from .counters import change_posts_count, change_subscription_counts
+from .feed_cache import bump_blog_versions
+from .models import OutboxEvent, Post, Subscription
+from .outbox import add_event
+from .partitions import ensure_partition
+from .read_state import exclude_from_watermark
+from .subscriptions import bulk_changes
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    # партиция месяца поста могла еще не создаться задачей create_post_partitions
+    if instance._state.adding:
+        ensure_partition(instance.created_at)
 
 
 @receiver(post_save, sender=Post)
 def post_saved(sender, instance, created, **kwargs):
+    bump_blog_versions([instance.blog_id])
     if created:
-        update_news_feed.delay(instance.id)
+        change_posts_count(instance.blog_id, 1)
+        add_event(OutboxEvent.POST_CREATED, {'post_id': instance.id, 'blog_id': instance.blog_id},
+                  f'{OutboxEvent.POST_CREATED}:{instance.id}')
 
 
 @receiver(post_delete, sender=Post)
 def post_deleted(sender, instance, **kwargs):
-    update_news_feed.delay(instance.id)
+    # помеченный пост уже учтен в tombstone_post, здесь - окончательное удаление после очистки
+    if instance.deleted_at is None:
+        bump_blog_versions([instance.blog_id])
+        change_posts_count(instance.blog_id, -1)
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_saved(sender, instance, created, **kwargs):
+    if created:
+        change_subscription_counts(instance.user_id, [instance.blog_id], 1)
+        exclude_from_watermark(instance.user_id, [instance.blog_id])
+        add_event(OutboxEvent.BLOGS_SUBSCRIBED, {'user_id': instance.user_id, 'blog_ids': [instance.blog_id]},
+                  f'{OutboxEvent.BLOGS_SUBSCRIBED}:{instance.user_id}:{uuid.uuid4().hex}')
+
 
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    if bulk_changes.get():
+        return
+    change_subscription_counts(instance.user_id, [instance.blog_id], -1)
+    add_event(OutboxEvent.BLOGS_UNSUBSCRIBED, {'user_id': instance.user_id, 'blog_ids': [instance.blog_id]},
+              f'{OutboxEvent.BLOGS_UNSUBSCRIBED}:{instance.user_id}:{uuid.uuid4().hex}')
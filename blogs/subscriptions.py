@@ -0,0 +1,144 @@
+import uuid
+from contextvars import ContextVar
+from typing import Dict, List, Tuple
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .counters import change_subscription_counts
+from .feed_cache import bump_user_version
+from .models import Blog, OutboxEvent, Subscription
+from .outbox import add_event
+from .read_state import exclude_from_watermark
+
+SUBSCRIBED = 'subscribed'
+ALREADY_SUBSCRIBED = 'already_subscribed'
+UNSUBSCRIBED = 'unsubscribed'
+NOT_SUBSCRIBED = 'not_subscribed'
+NOT_FOUND = 'not_found'
+OWN_BLOG = 'own_blog'
+
+# Подписки меняются пачкой: счетчики и события outbox обновляются в subscribe/unsubscribe, а не в сигналах
+bulk_changes: ContextVar[bool] = ContextVar('bulk_subscription_changes', default=False)
+
+
+def get_blog_states(user_id: int, blog_ids: List[int]) -> Dict[int, Tuple[int, bool]]:
+    """
+    Владельцы блогов и признак подписки пользователя на них одним запросом.
+
+    :param user_id: Идентификатор пользователя.
+    :param blog_ids: Идентификаторы блогов.
+    :return: Словарь {идентификатор блога: (идентификатор владельца, подписан ли пользователь)}.
+    """
+    subscribed = Subscription.objects.filter(user_id=user_id, blog_id=OuterRef('pk'))
+    blogs = Blog.objects.filter(id__in=blog_ids).annotate(is_subscribed=Exists(subscribed)) \
+                        .values_list('id', 'user_id', 'is_subscribed')
+    return {blog_id: (owner_id, is_subscribed) for blog_id, owner_id, is_subscribed in blogs}
+
+
+def insert_subscriptions(user_id: int, blog_ids: List[int]) -> List[int]:
+    """
+    Создание подписок одним bulk_create.
+
+    Строки, уже созданные одновременным таким же запросом, пропускаются (ignore_conflicts); созданные
+    этим вызовом находятся по общей для пачки дате создания.
+
+    :param user_id: Идентификатор пользователя.
+    :param blog_ids: Идентификаторы блогов.
+    :return: Идентификаторы блогов, подписки на которые действительно созданы (без уже существующих).
+    """
+    now = timezone.now()
+    Subscription.objects.bulk_create([Subscription(user_id=user_id, blog_id=blog_id, created_at=now, updated_at=now)
+                                      for blog_id in blog_ids], ignore_conflicts=True)
+    return list(Subscription.objects.filter(user_id=user_id, blog_id__in=blog_ids, created_at=now)
+                                    .values_list('blog_id', flat=True))
+
+
+def delete_subscriptions(user_id: int, blog_ids: List[int]) -> List[int]:
+    """
+    Удаление подписок; вызывается в транзакции.
+
+    Удаляемые подписки блокируются, поэтому возвращаются ровно удаленные этим вызовом. Сигналы post_delete
+    на время удаления отключены (bulk_changes): счетчики и событие outbox обновляет вызывающий код одним разом.
+
+    :param user_id: Идентификатор пользователя.
+    :param blog_ids: Идентификаторы блогов.
+    :return: Идентификаторы блогов, подписки на которые действительно удалены.
+    """
+    subscriptions = Subscription.objects.filter(user_id=user_id, blog_id__in=blog_ids)
+    deleted_blog_ids = list(subscriptions.select_for_update().values_list('blog_id', flat=True))
+    token = bulk_changes.set(True)
+    try:
+        subscriptions.filter(blog_id__in=deleted_blog_ids).delete()
+    finally:
+        bulk_changes.reset(token)
+    return deleted_blog_ids
+
+
+def subscribe(user_id: int, blog_ids: List[int]) -> Dict[int, str]:
+    """
+    Подписка пользователя на несколько блогов.
+
+    Новые подписки записываются одним bulk_create без сигналов post_save, поэтому счетчики обновляются здесь же,
+    а заполнение ленты ставится одним событием outbox. Счетчики и событие учитывают только действительно
+    созданные подписки - строки, пропущенные из-за одновременного такого же запроса, не считаются.
+
+    :param user_id: Идентификатор пользователя.
+    :param blog_ids: Идентификаторы блогов.
+    :return: Результат по каждому блогу.
+    """
+    states = get_blog_states(user_id, blog_ids)
+    outcomes = {}
+    for blog_id in blog_ids:
+        if blog_id not in states:
+            outcomes[blog_id] = NOT_FOUND
+        elif states[blog_id][0] == user_id:
+            outcomes[blog_id] = OWN_BLOG
+        else:
+            outcomes[blog_id] = ALREADY_SUBSCRIBED if states[blog_id][1] else SUBSCRIBED
+
+    new_blog_ids = [blog_id for blog_id, outcome in outcomes.items() if outcome == SUBSCRIBED]
+    if new_blog_ids:
+        with transaction.atomic():
+            inserted_blog_ids = insert_subscriptions(user_id, new_blog_ids)
+            if inserted_blog_ids:
+                change_subscription_counts(user_id, inserted_blog_ids, 1)
+                exclude_from_watermark(user_id, inserted_blog_ids)
+                add_event(OutboxEvent.BLOGS_SUBSCRIBED, {'user_id': user_id, 'blog_ids': inserted_blog_ids},
+                          f'{OutboxEvent.BLOGS_SUBSCRIBED}:{user_id}:{uuid.uuid4().hex}')
+        if inserted_blog_ids:
+            bump_user_version(user_id)
+    return outcomes
+
+
+def unsubscribe(user_id: int, blog_ids: List[int]) -> Dict[int, str]:
+    """
+    Отписка пользователя от нескольких блогов.
+
+    Подписки удаляются без сигналов post_delete (см. delete_subscriptions), поэтому счетчики обновляются здесь же,
+    а очистка ленты ставится одним событием outbox. Учитываются только действительно удаленные подписки.
+
+    :param user_id: Идентификатор пользователя.
+    :param blog_ids: Идентификаторы блогов.
+    :return: Результат по каждому блогу.
+    """
+    states = get_blog_states(user_id, blog_ids)
+    outcomes = {}
+    for blog_id in blog_ids:
+        if blog_id not in states:
+            outcomes[blog_id] = NOT_FOUND
+        else:
+            outcomes[blog_id] = UNSUBSCRIBED if states[blog_id][1] else NOT_SUBSCRIBED
+
+    old_blog_ids = [blog_id for blog_id, outcome in outcomes.items() if outcome == UNSUBSCRIBED]
+    if old_blog_ids:
+        with transaction.atomic():
+            deleted_blog_ids = delete_subscriptions(user_id, old_blog_ids)
+            if deleted_blog_ids:
+                change_subscription_counts(user_id, deleted_blog_ids, -1)
+                add_event(OutboxEvent.BLOGS_UNSUBSCRIBED, {'user_id': user_id, 'blog_ids': deleted_blog_ids},
+                          f'{OutboxEvent.BLOGS_UNSUBSCRIBED}:{user_id}:{uuid.uuid4().hex}')
+        if deleted_blog_ids:
+            bump_user_version(user_id)
+    return outcomes
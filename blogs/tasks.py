@@ -1,37 +1,287 @@
 import logging
-from celery import shared_task
+import time
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Union
 
-from accounts.models import Account
-from .models import Post
+from celery import chord, shared_task
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import F, Min, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from nekidaem_tz.db_router import is_replica_enabled, replica_reads
+from .counters import reconcile_counters
+from .deletion import purge_post
+from .feed import (backfill_feed, get_pull_blog_ids, iter_subscriber_ids, purge_feed, push_to_feeds, split_subscribers,
+                   trim_feeds)
+from .feed_cache import bump_blog_versions, bump_user_version
+from .models import FanOutCheckpoint, FeedEntry, NewsletterDelivery, NewsletterRun, NewsletterShard, Post
+from .outbox import delete_published_events, relay_events
+from .partitions import create_partitions
+from .newsletter import get_sink, send_newsletter, split_recipients
 
 logger = logging.getLogger('django')
 
 
 @shared_task
-def update_news_feed(post_id):
-    try:
-        post = Post.objects.get(id=post_id)
-    except Post.DoesNotExist:
-        logger.warning(f'Пост с id={post_id} не существует.')
-        return
+def update_news_feed(post_id: int, post_ids: Optional[List[int]] = None) -> Dict[str, int]:
+    """
+    Раскладывает новые посты блога по лентам подписчиков.
+
+    Подписчики делятся на диапазоны user_id (keyset), на каждый диапазон создается чекпоинт
+    и отдельная задача fan_out_chunk. Задачи запускаются группой, по их завершении finish_fan_out
+    подводит итоги. Повторный запуск не создает дубли чекпоинтов и не повторяет завершенные диапазоны.
+
+    :param post_id: Идентификатор поста.
+    :param post_ids: Посты одного блога, раскладываемые вместе (объединенные события outbox);
+                     чекпоинты создаются по последнему существующему из них.
+    :return: Количество запущенных диапазонов.
+    """
+    post_ids = post_ids or [post_id]
+    post = Post.objects.filter(id__in=post_ids).order_by('-id').first()
+    if post is None:
+        logger.warning(f'Посты с id={post_ids} не существуют.')
+        return {'post_id': post_id, 'chunks': 0}
+
+    if get_pull_blog_ids([post.blog_id]):
+        return {'post_id': post_id, 'chunks': 0}
+
+    FanOutCheckpoint.objects.bulk_create(
+        [FanOutCheckpoint(post=post, post_ids=post_ids, start_user_id=start, end_user_id=end, last_user_id=start)
+         for start, end in split_subscribers(post.blog_id)],
+        ignore_conflicts=True,
+    )
+    checkpoint_ids = list(FanOutCheckpoint.objects.filter(post=post, is_done=False).values_list('id', flat=True))
+    if checkpoint_ids:
+        chord(fan_out_chunk.s(checkpoint_id) for checkpoint_id in checkpoint_ids)(finish_fan_out.s(post.id))
+    return {'post_id': post_id, 'chunks': len(checkpoint_ids)}
+
 
-    subscribed_users = Account.objects.filter(subscriptions__blog=post.blog)
+@shared_task(bind=True, acks_late=True, autoretry_for=(DatabaseError,), retry_backoff=True, max_retries=5)
+def fan_out_chunk(self, checkpoint_id: int) -> int:
+    """
+    Раскладывает посты чекпоинта по лентам подписчиков одного диапазона.
 
-    for user in subscribed_users:
-        subscribed_posts = Post.objects.filter(blog__in=user.subscriptions.values_list('blog', flat=True))
-        user.read_posts.add(*subscribed_posts)
+    Каждая пачка подписчиков записывается в одной транзакции с продвижением чекпоинта,
+    поэтому повторная попытка продолжает с последней записанной пачки.
 
-    logger.info(f'Лента новостей успешно обновлена для {subscribed_users.count()} пользователей.')
+    :param checkpoint_id: Идентификатор чекпоинта диапазона.
+    :return: Количество строк, записанных по диапазону.
+    """
+    checkpoint = FanOutCheckpoint.objects.select_related('post').get(id=checkpoint_id)
+    post = checkpoint.post
+    posts = list(Post.objects.filter(id__in=checkpoint.post_ids or [post.id], blog_id=post.blog_id))
+
+    for user_ids in iter_subscriber_ids(post.blog_id, checkpoint.last_user_id, checkpoint.end_user_id):
+        with transaction.atomic():
+            rows = push_to_feeds(posts, user_ids)
+            FanOutCheckpoint.objects.filter(id=checkpoint_id).update(last_user_id=user_ids[-1],
+                                                                     rows=F('rows') + rows)
+
+    FanOutCheckpoint.objects.filter(id=checkpoint_id).update(is_done=True)
+    return FanOutCheckpoint.objects.values_list('rows', flat=True).get(id=checkpoint_id)
 
 
 @shared_task
-def send_daily_newsletter():
-    subscribers = Account.objects.all()
-    for subscriber in subscribers:
-        latest_posts = Post.objects.filter(blog__in=subscriber.subscriptions.values_list('blog', flat=True)) \
-                                    .order_by('-created_at')[:5]
-        if latest_posts:
-            logger.info(f'Ежедневная отправка для {subscriber.username}:')
-            logger.info('Последние посты:')
-            for post in latest_posts:
-                logger.info(f'Пост {post.title} пользователя: {post.blog.user.username}')
+def finish_fan_out(chunk_rows: List[int], post_id: int) -> Dict[str, Union[int, float]]:
+    """
+    Итоги раскладки поста: количество записанных строк и время выполнения.
+
+    :param chunk_rows: Количество строк, записанных по каждому диапазону.
+    :param post_id: Идентификатор поста.
+    :return: Количество записанных строк и время выполнения в секундах.
+    """
+    checkpoints = FanOutCheckpoint.objects.filter(post_id=post_id)
+    started = checkpoints.aggregate(started=Min('created_at'))['started']
+    elapsed = (timezone.now() - started).total_seconds() if started else 0.0
+    rows = sum(chunk_rows)
+    checkpoints.delete()
+    bump_blog_versions(Post.objects.filter(id=post_id).values_list('blog_id', flat=True))
+
+    logger.info(f'Лента новостей обновлена для поста с id={post_id}: {len(chunk_rows)} диапазонов, '
+                f'записано {rows} строк за {elapsed:.3f} с.')
+    return {'post_id': post_id, 'rows': rows, 'elapsed': elapsed}
+
+
+@shared_task(acks_late=True, autoretry_for=(DatabaseError,), retry_backoff=True, max_retries=5)
+def purge_deleted_post(post_id: int) -> Dict[str, int]:
+    """
+    Очистка лент и прочтений удаленного (помеченного) поста пачками по POST_PURGE_BATCH_SIZE и удаление поста.
+
+    :param post_id: Идентификатор поста.
+    :return: Количество удаленных строк по таблицам.
+    """
+    stats = purge_post(post_id, settings.POST_PURGE_BATCH_SIZE)
+    logger.info(f'Удаленный пост с id={post_id} очищен: {stats}.')
+    return stats
+
+
+@shared_task(acks_late=True, autoretry_for=(DatabaseError,), retry_backoff=True, max_retries=5)
+def backfill_news_feed(user_id: int, blog_ids: List[int]) -> int:
+    """
+    Заполнение ленты пользователя последними постами блогов, на которые он подписался.
+
+    :param user_id: Идентификатор пользователя.
+    :param blog_ids: Идентификаторы блогов.
+    :return: Количество строк ленты, отправленных на запись.
+    """
+    written = backfill_feed(user_id, blog_ids)
+    bump_user_version(user_id)
+    return written
+
+
+@shared_task(acks_late=True, autoretry_for=(DatabaseError,), retry_backoff=True, max_retries=5)
+def purge_news_feed(user_id: int, blog_ids: List[int]) -> int:
+    """
+    Очистка ленты и прочтений пользователя от постов блогов, от которых он отписался.
+
+    :param user_id: Идентификатор пользователя.
+    :param blog_ids: Идентификаторы блогов.
+    :return: Количество удаленных строк.
+    """
+    deleted = purge_feed(user_id, blog_ids)
+    bump_user_version(user_id)
+    return deleted
+
+
+@shared_task
+def trim_news_feeds():
+    """ Периодическая обрезка материализованных лент до NEWS_FEED_SIZE записей. """
+    batch_size = settings.NEWS_FEED_FANOUT_BATCH_SIZE
+    user_ids = FeedEntry.objects.order_by('user_id').values_list('user_id', flat=True).distinct()
+    deleted = 0
+    last_user_id = 0
+
+    while True:
+        batch = list(user_ids.filter(user_id__gt=last_user_id)[:batch_size])
+        if not batch:
+            break
+        deleted += trim_feeds(batch)
+        last_user_id = batch[-1]
+
+    logger.info(f'Из лент новостей удалено {deleted} устаревших записей.')
+
+
+@shared_task
+def reconcile_counters_task() -> int:
+    """ Периодическая сверка денормализованных счетчиков блогов и пользователей с фактическими COUNT(*). """
+    fixed = reconcile_counters()
+    logger.info(f'Исправлены счетчики {fixed} записей.')
+    return fixed
+
+
+@shared_task
+def create_post_partitions() -> List[str]:
+    """ Периодическое создание месячных партиций постов на POST_PARTITIONS_AHEAD месяцев вперед (PostgreSQL). """
+    created = create_partitions(settings.POST_PARTITIONS_AHEAD)
+    if created:
+        logger.info(f'Созданы партиции постов: {", ".join(created)}.')
+    return created
+
+
+@shared_task
+def relay_outbox() -> Dict[str, int]:
+    """
+    Периодическая публикация событий outbox в Celery пачками по OUTBOX_BATCH_SIZE.
+
+    За запуск публикуется не больше OUTBOX_RELAY_MAX_BATCHES пачек, затем удаляются старые опубликованные события.
+
+    :return: Количество опубликованных событий, отправленных задач и объединенных событий.
+    """
+    stats = {'events': 0, 'tasks': 0}
+    for _ in range(settings.OUTBOX_RELAY_MAX_BATCHES):
+        relayed = relay_events(settings.OUTBOX_BATCH_SIZE)
+        stats['events'] += relayed['events']
+        stats['tasks'] += relayed['tasks']
+        if relayed['events'] < settings.OUTBOX_BATCH_SIZE:
+            break
+    stats['merged'] = stats['events'] - stats['tasks']
+    deleted = delete_published_events()
+
+    if stats['events'] or deleted:
+        logger.info(f'Outbox: опубликовано {stats["events"]} событий ({stats["tasks"]} задач, объединено '
+                    f'{stats["merged"]}), удалено {deleted} опубликованных.')
+    return stats
+
+
+@shared_task
+def send_daily_newsletter() -> Dict[str, int]:
+    """
+    Ежедневная рассылка последних постов пользователям с подписками.
+
+    Пользователи делятся на NEWSLETTER_SHARDS диапазонов id, каждый диапазон рассылается
+    отдельной задачей send_newsletter_shard. По завершении всех шардов finish_newsletter
+    подводит итоги запуска. Повторный запуск за тот же день продолжает только незавершенные шарды.
+
+    :return: Идентификатор запуска и количество запущенных шардов.
+    """
+    # запуск и его шарды создаются в одной транзакции: после сбоя между ними повторный запуск
+    # не увидит запуск без шардов и не завершит день без рассылки
+    with transaction.atomic():
+        run, created = NewsletterRun.objects.get_or_create(date=timezone.localdate())
+        if created:
+            ranges = split_recipients(settings.NEWSLETTER_SHARDS)
+            NewsletterShard.objects.bulk_create(
+                [NewsletterShard(run=run, start_user_id=start, end_user_id=end) for start, end in ranges],
+                ignore_conflicts=True,
+            )
+            NewsletterRun.objects.filter(id=run.id).update(shards=len(ranges))
+    if run.is_done:
+        return {'run_id': run.id, 'shards': 0}
+
+    shard_ids = list(NewsletterShard.objects.filter(run=run, is_done=False).values_list('id', flat=True))
+    if shard_ids:
+        chord(send_newsletter_shard.s(shard_id) for shard_id in shard_ids)(finish_newsletter.s(run.id))
+    else:
+        finish_newsletter([], run.id)
+    return {'run_id': run.id, 'shards': len(shard_ids)}
+
+
+@shared_task(bind=True, acks_late=True, autoretry_for=(DatabaseError,), retry_backoff=True, max_retries=5)
+def send_newsletter_shard(self, shard_id: int) -> Dict[str, Union[int, float]]:
+    """
+    Рассылка дайджестов пользователям одного диапазона id.
+
+    Получатели и посты читаются с реплик, если 'newsletter' есть в DATABASE_REPLICA_VIEWS;
+    отметки об отправке пишутся и проверяются на основной БД.
+
+    :param shard_id: Идентификатор шарда.
+    :return: Количество обработанных пользователей, отправленных дайджестов и время выполнения.
+    """
+    shard = NewsletterShard.objects.select_related('run').get(id=shard_id)
+    started = time.monotonic()
+    with replica_reads() if is_replica_enabled('newsletter') else nullcontext():
+        stats = send_newsletter(get_sink(), settings.NEWSLETTER_BATCH_SIZE, shard.run.date,
+                                shard.start_user_id, shard.end_user_id)
+    elapsed = time.monotonic() - started
+
+    # после повтора задачи или перезапуска часть дайджестов отправлена прошлыми попытками:
+    # отправленные за день считаются по отметкам диапазона, а не по текущей попытке
+    sent = NewsletterDelivery.objects.filter(date=shard.run.date, user_id__gt=shard.start_user_id,
+                                             user_id__lte=shard.end_user_id).count()
+    NewsletterShard.objects.filter(id=shard_id).update(users=stats['users'], sent=sent, elapsed=elapsed,
+                                                       is_done=True, updated_at=timezone.now())
+    return {**stats, 'elapsed': elapsed}
+
+
+@shared_task
+def finish_newsletter(shard_stats: List[Dict[str, Union[int, float]]], run_id: int) -> Dict[str, Union[int, float]]:
+    """
+    Итоги запуска рассылки по всем шардам; отметки об отправке за прошлые дни удаляются.
+
+    :param shard_stats: Итоги шардов, запущенных в этот раз.
+    :param run_id: Идентификатор запуска.
+    :return: Количество обработанных пользователей, отправленных дайджестов и время выполнения.
+    """
+    run = NewsletterRun.objects.get(id=run_id)
+    totals = run.newsletter_shards.aggregate(users=Coalesce(Sum('users'), 0), sent=Coalesce(Sum('sent'), 0))
+    elapsed = (timezone.now() - run.created_at).total_seconds()
+    NewsletterRun.objects.filter(id=run_id).update(users=totals['users'], sent=totals['sent'], elapsed=elapsed,
+                                                   is_done=True, updated_at=timezone.now())
+    NewsletterDelivery.objects.filter(date__lt=run.date).delete()
+
+    logger.info(f'Ежедневная рассылка за {run.date}: {len(shard_stats)} шардов, обработано {totals["users"]} '
+                f'пользователей, отправлено {totals["sent"]} дайджестов за {elapsed:.3f} с.')
+    return {'run_id': run_id, **totals, 'elapsed': elapsed}
@@ -0,0 +1,59 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Blog, Post, ReadPost, Subscription
+from accounts.models import Account
+
+
+class AdminQueriesTestCase(TestCase):
+    """
+    Тесты количества запросов админ-панели: страница списка не выполняет запрос на каждую строку.
+    """
+
+    def setUp(self):
+        self.admin = Account.objects.create_superuser(username='admin', password='password')
+        self.client.force_login(self.admin)
+        self.reader = Account.objects.create(username='reader')
+
+    def create_rows(self, start: int, count: int) -> None:
+        """ Авторы с блогами и постами, подписки и прочтения читателя. """
+        for i in range(start, start + count):
+            blog = Blog.objects.create(user=Account.objects.create(username=f'author_{i}'))
+            post = Post.objects.create(blog=blog, title=f'Post {i}', content='Content')
+            Subscription.objects.create(user=self.reader, blog=blog)
+            ReadPost.objects.create(user=self.reader, post=post, is_read=True)
+
+    def count_queries(self, url: str) -> int:
+        # первый запрос к странице модели заполняет кэш ContentType
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_changelists(self):
+        """
+        Количество запросов страницы списка одинаково для 3 и 30 строк.
+        """
+        urls = [reverse(f'admin:blogs_{model}_changelist') for model in ('blog', 'subscription', 'readpost')]
+        self.create_rows(0, 3)
+        queries = [self.count_queries(url) for url in urls]
+
+        self.create_rows(3, 27)
+        self.assertEqual([self.count_queries(url) for url in urls], queries)
+
+    def test_change_forms(self):
+        """
+        Формы редактирования не выводят списки всех блогов и постов.
+        """
+        self.create_rows(0, 3)
+        subscription = Subscription.objects.first()
+        read_post = ReadPost.objects.first()
+        urls = [reverse('admin:blogs_subscription_change', args=[subscription.id]),
+                reverse('admin:blogs_readpost_change', args=[read_post.id])]
+        queries = [self.count_queries(url) for url in urls]
+
+        self.create_rows(3, 27)
+        self.assertEqual([self.count_queries(url) for url in urls], queries)
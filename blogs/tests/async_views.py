@@ -0,0 +1,97 @@
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from ..feed import fan_out_post
+from ..models import Blog, Post, Subscription
+from accounts.models import Account
+
+
+@override_settings(NEWS_FEED_STRATEGY='push', READ_STATE_BACKEND='compact')
+class AsyncViewsTestCase(APITestCase):
+    """
+    Тесты асинхронных (ASGI) версий представлений: ответы совпадают с синхронными.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = Account.objects.create(username='reader')
+        Blog.objects.create(user=self.user)
+        self.author = Account.objects.create(username='author')
+        self.blog = Blog.objects.create(user=self.author)
+        self.client.force_authenticate(user=self.user)
+
+    def test_news_feed(self):
+        """
+        Лента совпадает с синхронной, повторный запрос обслуживается из кэша.
+        """
+        Subscription.objects.create(user=self.user, blog=self.blog, is_backfilled=True)
+        for i in range(3):
+            fan_out_post(Post.objects.create(blog=self.blog, title=f'Post {i}', content='Content'))
+
+        response = self.client.get(reverse('async-news-feed'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        cache.clear()
+        self.assertEqual(response.json(), self.client.get(reverse('news_feed')).json())
+
+        self.assertEqual(self.client.get(reverse('async-news-feed'))['X-Cache'], 'HIT')
+        self.assertEqual(self.client.get(reverse('async-news-feed'), {'after': '!'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_mark_posts_as_read(self):
+        """
+        Пометка прочитанными возвращает те же статусы, что и синхронная версия.
+        """
+        post = Post.objects.create(blog=self.blog, title='Post', content='Content')
+        url = reverse('async-mark-posts-as-read')
+
+        self.assertEqual(self.client.post(url, {'post_ids': [post.id]}, format='json').status_code,
+                         status.HTTP_200_OK)
+        self.assertEqual(self.client.post(url, {'post_ids': [post.id]}, format='json').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(url, {'post_ids': [0]}, format='json').status_code,
+                         status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.post(url, {}, format='json').json(),
+                         {'error': 'Не переданы идентификаторы постов'})
+
+    def test_subscriptions(self):
+        """
+        Подписка и отписка на один и несколько блогов.
+        """
+        response = self.client.post(reverse('async-subscribe-to-blog', args=[self.blog.id]))
+        self.assertEqual(response.json(), {'message': f'Вы подписались на {self.blog}'})
+        self.assertEqual(Account.objects.get(id=self.user.id).subscriptions_count, 1)
+
+        response = self.client.post(reverse('async-unsubscribe-from-blog', args=[self.blog.id]))
+        self.assertEqual(response.json(), {'message': f'Подписка отменена для {self.blog}'})
+        self.assertFalse(Subscription.objects.exists())
+
+        response = self.client.post(reverse('async-subscribe-to-blogs'), {'blog_ids': [self.blog.id, 0]},
+                                    format='json')
+        self.assertEqual(response.json(), {'results': [{'blog_id': self.blog.id, 'result': 'subscribed'},
+                                                       {'blog_id': 0, 'result': 'not_found'}]})
+        response = self.client.post(reverse('async-unsubscribe-from-blogs'), {'blog_ids': [self.blog.id]},
+                                    format='json')
+        self.assertEqual(response.json(), {'results': [{'blog_id': self.blog.id, 'result': 'unsubscribed'}]})
+
+    def test_errors(self):
+        """
+        Без аутентификации - 403, неподдерживаемый метод - 405.
+        """
+        self.assertEqual(APIClient().get(reverse('async-news-feed')).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(reverse('async-subscribe-to-blogs')).status_code,
+                         status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    async def test_user_detail_asgi(self):
+        """
+        Информация о пользователе через ASGI-обработчик.
+        """
+        response = await self.async_client.get(reverse('async-user-detail-by-id', args=[self.author.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['username'], 'author')
+
+        response = await self.async_client.get(reverse('async-user-detail-by-username', args=['nobody']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,51 @@
+import json
+import os
+import tempfile
+
+from django.contrib.sessions.models import Session
+from django.core.management import CommandError, call_command
+from django.test import TransactionTestCase, override_settings
+
+from blogs.models import OutboxEvent, Post
+
+
+@override_settings(NEWS_FEED_STRATEGY='push', READ_STATE_BACKEND='compact', NEWS_FEED_COALESCE_WINDOW=0)
+class BenchmarkWorkloadTestCase(TransactionTestCase):
+    """
+    Запросы нагрузки выполняются в отдельных потоках, поэтому данные должны быть закоммичены.
+
+    С SQLite команда обращается к БД из потоков запросов, публикации и замеров outbox по очереди,
+    поэтому прогон в одном потоке с eager-задачами проходит без ошибок.
+    """
+
+    def test_benchmark_workload(self):
+        """
+        Нагрузка генерирует данные, выполняет все операции, разбирает outbox и очередь задач
+        и сохраняет результаты в JSON.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'result.json')
+            call_command('benchmark_workload', users=20, posts=100, actors=10, rate=40, duration=1, concurrency=1,
+                         mix='post=25,follow=25,feed=25,read=25', celery='eager', relay_interval=0.2,
+                         drain_timeout=10, output=output)
+            with open(output, encoding='utf-8') as file:
+                result = json.load(file)
+
+        self.assertEqual(result['requests'], 40)
+        self.assertEqual(result['errors'], 0)
+        self.assertEqual(sum(operation['requests'] for operation in result['operations'].values()), 40)
+        self.assertTrue({'post', 'follow', 'feed'} <= set(result['operations']))
+        self.assertTrue(result['queries']['total'] > 0)
+        self.assertEqual({'p50', 'p90', 'p99', 'max'}, set(result['latency_ms']))
+        self.assertTrue(result['latency_ms']['p50'] <= result['latency_ms']['p99'] <= result['latency_ms']['max'])
+
+        celery = result['celery']
+        self.assertTrue(celery['drained'])
+        self.assertTrue(celery['tasks_executed'] > 0)
+        self.assertEqual(celery['tasks_failed'], 0)
+        self.assertFalse(OutboxEvent.objects.filter(published_at__isnull=True).exists())
+        self.assertTrue(Post.objects.count() > 100)
+        self.assertFalse(Session.objects.exists())
+
+        with self.assertRaises(CommandError):
+            call_command('benchmark_workload', mix='post=1,like=1')
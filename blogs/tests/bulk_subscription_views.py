@@ -0,0 +1,125 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ..models import Blog, FeedEntry, OutboxEvent, Post, Subscription
+from ..subscriptions import delete_subscriptions, insert_subscriptions
+from ..tasks import backfill_news_feed, purge_news_feed
+from accounts.models import Account
+
+
+class BulkSubscriptionTestCase(APITestCase):
+    """
+    Тесты массовой подписки и отписки.
+    """
+
+    def setUp(self):
+        self.user = Account.objects.create(username='test_user')
+        self.own_blog = Blog.objects.create(user=self.user)
+        self.blogs = [Blog.objects.create(user=Account.objects.create(username=f'author_{i}')) for i in range(30)]
+        self.client.force_authenticate(user=self.user)
+
+    def post(self, url_name, blog_ids):
+        return self.client.post(reverse(url_name), {'blog_ids': blog_ids}, format='json')
+
+    def test_subscribe_outcomes(self):
+        """
+        Результат возвращается по каждому блогу, счетчики обновляются, заполнение ленты ставится одним событием.
+        """
+        Subscription.objects.create(user=self.user, blog=self.blogs[0])
+        response = self.post('subscribe-to-blogs', [self.blogs[0].id, self.blogs[1].id, self.own_blog.id, 999999])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [
+            {'blog_id': self.blogs[0].id, 'result': 'already_subscribed'},
+            {'blog_id': self.blogs[1].id, 'result': 'subscribed'},
+            {'blog_id': self.own_blog.id, 'result': 'own_blog'},
+            {'blog_id': 999999, 'result': 'not_found'},
+        ])
+        self.assertEqual(Account.objects.get(id=self.user.id).subscriptions_count, 2)
+        self.assertEqual(Blog.objects.get(id=self.blogs[1].id).subscribers_count, 1)
+        event = OutboxEvent.objects.filter(event_type=OutboxEvent.BLOGS_SUBSCRIBED).latest('id')
+        self.assertEqual(event.payload, {'user_id': self.user.id, 'blog_ids': [self.blogs[1].id]})
+
+    def test_only_changed_subscriptions_are_returned(self):
+        """
+        Создание и удаление возвращают только действительно созданные и удаленные подписки, сигналы при удалении
+        не срабатывают.
+        """
+        Subscription.objects.create(user=self.user, blog=self.blogs[0])
+
+        self.assertEqual(insert_subscriptions(self.user.id, [self.blogs[0].id, self.blogs[1].id]), [self.blogs[1].id])
+        subscription = Subscription.objects.get(user=self.user, blog=self.blogs[1])
+        self.assertFalse(subscription.is_backfilled)
+        self.assertIsNotNone(subscription.created_at)
+
+        events_count = OutboxEvent.objects.count()
+        self.assertEqual(sorted(delete_subscriptions(self.user.id, [self.blogs[1].id, self.blogs[2].id])),
+                         [self.blogs[1].id])
+        self.assertEqual(OutboxEvent.objects.count(), events_count)
+        self.assertEqual(list(Subscription.objects.values_list('blog_id', flat=True)), [self.blogs[0].id])
+
+    def test_queries_do_not_depend_on_blogs(self):
+        """
+        Количество запросов не зависит от количества блогов.
+        """
+        with CaptureQueriesContext(connection) as few:
+            self.post('subscribe-to-blogs', [blog.id for blog in self.blogs[:2]])
+        with CaptureQueriesContext(connection) as many:
+            self.post('subscribe-to-blogs', [blog.id for blog in self.blogs[2:]])
+        self.assertEqual(len(many), len(few))
+
+        with CaptureQueriesContext(connection) as few:
+            self.post('unsubscribe-from-blogs', [blog.id for blog in self.blogs[:2]])
+        with CaptureQueriesContext(connection) as many:
+            self.post('unsubscribe-from-blogs', [blog.id for blog in self.blogs[2:]])
+        self.assertEqual(len(many), len(few))
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_unsubscribe_outcomes(self):
+        """
+        Отписка удаляет подписки, счетчики уменьшаются, очистка ленты ставится одним событием.
+        """
+        self.post('subscribe-to-blogs', [self.blogs[0].id, self.blogs[1].id])
+        post = Post.objects.create(blog=self.blogs[0], title='Post', content='Content')
+        FeedEntry.objects.create(user=self.user, post=post, blog=self.blogs[0], created_at=post.created_at)
+
+        response = self.post('unsubscribe-from-blogs', [self.blogs[0].id, self.blogs[2].id, 999999])
+
+        self.assertEqual(response.data['results'], [
+            {'blog_id': self.blogs[0].id, 'result': 'unsubscribed'},
+            {'blog_id': self.blogs[2].id, 'result': 'not_subscribed'},
+            {'blog_id': 999999, 'result': 'not_found'},
+        ])
+        self.assertEqual(Account.objects.get(id=self.user.id).subscriptions_count, 1)
+        self.assertEqual(Blog.objects.get(id=self.blogs[0].id).subscribers_count, 0)
+
+        event = OutboxEvent.objects.get(event_type=OutboxEvent.BLOGS_UNSUBSCRIBED)
+        self.assertEqual(event.payload, {'user_id': self.user.id, 'blog_ids': [self.blogs[0].id]})
+        purge_news_feed(**event.payload)
+        self.assertFalse(FeedEntry.objects.exists())
+
+    def test_backfill_news_feed(self):
+        """
+        Одна задача заполняет ленту постами всех новых блогов.
+        """
+        posts = [Post.objects.create(blog=blog, title='Post', content='Content') for blog in self.blogs[:3]]
+        self.post('subscribe-to-blogs', [blog.id for blog in self.blogs[:3]])
+        event = OutboxEvent.objects.get(event_type=OutboxEvent.BLOGS_SUBSCRIBED)
+
+        backfill_news_feed(**event.payload)
+
+        self.assertEqual(set(FeedEntry.objects.filter(user=self.user).values_list('post_id', flat=True)),
+                         {post.id for post in posts})
+
+    def test_invalid_blog_ids(self):
+        """
+        Некорректный список блогов отклоняется.
+        """
+        self.assertEqual(self.post('subscribe-to-blogs', []).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.post('subscribe-to-blogs', ['a']).status_code, status.HTTP_400_BAD_REQUEST)
+        with self.settings(SUBSCRIBE_MAX_IDS=5):
+            response = self.post('unsubscribe-from-blogs', [blog.id for blog in self.blogs])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
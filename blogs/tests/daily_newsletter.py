@@ -0,0 +1,144 @@
+from typing import List
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from ..models import Blog, NewsletterDelivery, NewsletterRun, NewsletterShard, Post, Subscription
+from ..newsletter import BaseNewsletterSink, Recipient, send_newsletter, split_recipients
+from ..tasks import finish_newsletter, send_daily_newsletter, send_newsletter_shard
+from accounts.models import Account
+
+
+class CollectSink(BaseNewsletterSink):
+    """ Получатель, собирающий дайджесты в память """
+
+    def __init__(self):
+        self.digests = {}
+        self.closed = False
+
+    def send(self, recipient: Recipient, posts: List[Post]) -> None:
+        self.digests[recipient.username] = [post.title for post in posts]
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class FailingSink(CollectSink):
+    """ Получатель, который обрывает отправку на втором дайджесте """
+
+    def send(self, recipient: Recipient, posts: List[Post]) -> None:
+        if len(self.digests) == 1:
+            raise ConnectionError('Соединение разорвано')
+        super().send(recipient, posts)
+
+
+@override_settings(NEWSLETTER_POSTS_LIMIT=5, NEWSLETTER_SINK='blogs.newsletter.LogSink')
+class DailyNewsletterTestCase(TestCase):
+    """
+    Тесты потоковой ежедневной рассылки.
+    """
+
+    def setUp(self):
+        self.author = Account.objects.create(username='author')
+        self.blog = Blog.objects.create(user=self.author)
+        self.posts = [Post.objects.create(blog=self.blog, title=f'Post {i}', content='Content') for i in range(7)]
+        self.readers = [Account.objects.create(username=f'reader_{i}') for i in range(6)]
+        for reader in self.readers:
+            Subscription.objects.create(user=reader, blog=self.blog)
+        Account.objects.create(username='lonely')
+        self.today = timezone.localdate()
+
+    def test_latest_posts(self):
+        """
+        Каждый подписчик получает 5 последних постов, пользователи без подписок пропускаются.
+        """
+        sink = CollectSink()
+        stats = send_newsletter(sink, batch_size=4, day=self.today)
+
+        expected = [f'Post {i}' for i in range(6, 1, -1)]
+        self.assertEqual(stats, {'users': 6, 'sent': 6})
+        self.assertEqual(sink.digests, {reader.username: expected for reader in self.readers})
+        self.assertTrue(sink.closed)
+
+    def test_queries_per_batch(self):
+        """
+        Количество запросов зависит от количества пачек, а не пользователей.
+        """
+        with CaptureQueriesContext(connection) as one_batch:
+            send_newsletter(CollectSink(), batch_size=10, day=self.today)
+        for i in range(6, 12):
+            Subscription.objects.create(user=Account.objects.create(username=f'reader_{i}'), blog=self.blog)
+        NewsletterDelivery.objects.all().delete()
+        with CaptureQueriesContext(connection) as more_users:
+            send_newsletter(CollectSink(), batch_size=20, day=self.today)
+
+        self.assertEqual(len(more_users), len(one_batch))
+
+    def test_rerun_does_not_send_twice(self):
+        """
+        Повторная рассылка за тот же день не отправляет дайджесты повторно.
+        """
+        send_newsletter(CollectSink(), batch_size=4, day=self.today)
+        sink = CollectSink()
+        stats = send_newsletter(sink, batch_size=4, day=self.today)
+
+        self.assertEqual(stats, {'users': 6, 'sent': 0})
+        self.assertEqual(sink.digests, {})
+
+    def test_rerun_after_failed_send(self):
+        """
+        После ошибки отправки отмечен только доставленный дайджест, повторный запуск доставляет остальные.
+        """
+        with self.assertRaises(ConnectionError):
+            send_newsletter(FailingSink(), batch_size=4, day=self.today)
+        self.assertEqual(list(NewsletterDelivery.objects.values_list('user_id', flat=True)), [self.readers[0].id])
+
+        sink = CollectSink()
+        stats = send_newsletter(sink, batch_size=4, day=self.today)
+        self.assertEqual(stats, {'users': 6, 'sent': 5})
+        self.assertEqual(set(sink.digests), {reader.username for reader in self.readers[1:]})
+
+    def test_split_recipients(self):
+        """
+        Диапазоны шардов покрывают всех пользователей с подписками без пересечений.
+        """
+        ranges = split_recipients(4)
+        user_ids = [reader.id for reader in self.readers]
+
+        self.assertEqual(len(ranges), 4)
+        self.assertEqual(sum(len([i for i in user_ids if start < i <= end]) for start, end in ranges), len(user_ids))
+
+    @override_settings(NEWSLETTER_SHARDS=3)
+    def test_sharded_run(self):
+        """
+        Запуск делится на шарды, итоги и время выполнения записываются по шардам и по запуску.
+        """
+        self.assertEqual(send_daily_newsletter()['shards'], 3)
+        run = NewsletterRun.objects.get(date=self.today)
+        shard_stats = [send_newsletter_shard(shard.id) for shard in run.newsletter_shards.all()]
+        result = finish_newsletter(shard_stats, run.id)
+
+        run.refresh_from_db()
+        self.assertTrue(run.is_done)
+        self.assertEqual((run.shards, run.users, run.sent), (3, 6, 6))
+        self.assertEqual(result['sent'], 6)
+        self.assertFalse(NewsletterShard.objects.filter(run=run, is_done=False).exists())
+        self.assertEqual(NewsletterDelivery.objects.filter(date=self.today).count(), 6)
+        self.assertEqual(send_daily_newsletter()['shards'], 0)
+
+    @override_settings(NEWSLETTER_SHARDS=1)
+    def test_shard_rerun_counts_previous_attempts(self):
+        """
+        Итоги шарда после повторной попытки учитывают дайджесты, отправленные прошлой попыткой.
+        """
+        send_daily_newsletter()
+        shard = NewsletterShard.objects.get()
+        with self.assertRaises(ConnectionError):
+            send_newsletter(FailingSink(), batch_size=4, day=self.today, after_user_id=shard.start_user_id,
+                            until_user_id=shard.end_user_id)
+
+        self.assertEqual(send_newsletter_shard(shard.id)['sent'], 5)
+        shard.refresh_from_db()
+        self.assertEqual(shard.sent, 6)
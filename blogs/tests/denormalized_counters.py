@@ -0,0 +1,77 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from ..counters import reconcile_counters
+from ..models import Blog, Post, Subscription
+from accounts.models import Account
+
+
+class DenormalizedCountersTestCase(TestCase):
+    """
+    Тесты денормализованных счетчиков блогов и пользователей.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = Account.objects.create(username='test_user')
+        self.blog = Blog.objects.create(user=self.user)
+        self.author = Account.objects.create(username='author')
+        self.author_blog = Blog.objects.create(user=self.author)
+
+    def test_counters_follow_views(self):
+        """
+        Счетчики меняются при добавлении/удалении постов и подписке/отписке.
+        """
+        self.client.force_authenticate(user=self.user)
+        self.client.post(reverse('add-post-to-blog', args=[self.blog.id]), {'title': 'Post', 'content': 'Content'},
+                         format='json')
+        self.client.post(reverse('subscribe-to-blog', args=[self.author_blog.id]))
+
+        self.blog.refresh_from_db()
+        self.author_blog.refresh_from_db()
+        self.user.refresh_from_db()
+        self.assertEqual(self.blog.posts_count, 1)
+        self.assertEqual(self.author_blog.subscribers_count, 1)
+        self.assertEqual(self.user.subscriptions_count, 1)
+
+        self.client.post(reverse('delete-post-from-blog', args=[Post.objects.get().id]))
+        self.client.post(reverse('unsubscribe-from-blog', args=[self.author_blog.id]))
+
+        self.blog.refresh_from_db()
+        self.author_blog.refresh_from_db()
+        self.user.refresh_from_db()
+        self.assertEqual(self.blog.posts_count, 0)
+        self.assertEqual(self.author_blog.subscribers_count, 0)
+        self.assertEqual(self.user.subscriptions_count, 0)
+
+    def test_reconcile_counters(self):
+        """
+        Сверка исправляет расхождения счетчиков.
+        """
+        Post.objects.create(blog=self.blog, title='Post', content='Content')
+        Subscription.objects.create(user=self.user, blog=self.author_blog)
+        Blog.objects.update(posts_count=7, subscribers_count=7)
+        Account.objects.update(subscriptions_count=7)
+
+        self.assertEqual(reconcile_counters(), 4)
+        self.assertEqual(reconcile_counters(), 0)
+        self.assertEqual(list(Blog.objects.order_by('id').values_list('posts_count', 'subscribers_count')),
+                         [(1, 0), (0, 1)])
+        self.assertEqual(Account.objects.get(id=self.user.id).subscriptions_count, 1)
+
+    @override_settings(COUNTERS_RECONCILE_BATCH_SIZE=1)
+    def test_reconcile_counters_in_update(self):
+        """
+        Счетчики исправляются по пачкам запросом UPDATE с подзапросом, а не записью прочитанных значений.
+        """
+        Subscription.objects.create(user=self.user, blog=self.author_blog)
+        Blog.objects.update(subscribers_count=7)
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(reconcile_counters(), 2)
+        updates = [query['sql'] for query in context.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertTrue(updates and all('COUNT(' in sql for sql in updates))
+        self.assertEqual(list(Blog.objects.order_by('id').values_list('subscribers_count', flat=True)), [0, 1])
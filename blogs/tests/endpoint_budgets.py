@@ -0,0 +1,25 @@
+from django.test import TestCase
+
+from nekidaem_tz.budgets import check_budgets, get_url_names, load_budgets, run_budgets
+
+
+class EndpointBudgetsTestCase(TestCase):
+    """
+    Тесты бюджетов эндпоинтов (nekidaem_tz/endpoint_budgets.json).
+    """
+
+    def test_every_endpoint_has_budget(self):
+        """
+        Для каждого эндпоинта blogs и accounts задан бюджет.
+        """
+        self.assertEqual(sorted(get_url_names()), sorted(load_budgets()))
+
+    def test_query_budgets(self):
+        """
+        Количество запросов к БД не превышает бюджет и не растет с объемом данных.
+
+        Задержки зависят от машины и проверяются командой check_endpoint_budgets.
+        """
+        results = run_budgets([10, 1000], iterations=2)
+
+        self.assertEqual(check_budgets(results, load_budgets(), latency=False), [])
@@ -0,0 +1,93 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..models import Blog, FanOutCheckpoint, FeedEntry, OutboxEvent, Post, Subscription
+from ..outbox import get_relay_batch, get_relay_stats, relay_events
+from ..tasks import fan_out_chunk, finish_fan_out, update_news_feed
+from accounts.models import Account
+
+
+@override_settings(NEWS_FEED_COALESCE_WINDOW=10, NEWS_FEED_STRATEGY='push', READ_STATE_BACKEND='compact')
+class EventCoalescingTestCase(TestCase):
+    """
+    Тесты объединения событий создания постов по блогу.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.reader = Account.objects.create(username='reader')
+        self.author = Account.objects.create(username='author')
+        self.other = Account.objects.create(username='other')
+        self.blog = Blog.objects.create(user=self.author)
+        self.other_blog = Blog.objects.create(user=self.other)
+        Subscription.objects.create(user=self.reader, blog=self.blog)
+        OutboxEvent.objects.all().delete()
+
+    def age_events(self):
+        OutboxEvent.objects.update(created_at=timezone.now() - timedelta(minutes=1))
+
+    def test_window_holds_new_events(self):
+        """
+        События моложе окна не публикуются.
+        """
+        Post.objects.create(blog=self.blog, title='Post', content='Content')
+
+        self.assertEqual(relay_events(100), {'events': 0, 'tasks': 0})
+
+    def test_blog_is_flushed_by_oldest_event(self):
+        """
+        Когда самому старому событию блога исполняется окно, публикуются все события блога одной раскладкой;
+        блог, все события которого моложе окна, ждет.
+        """
+        posts = [Post.objects.create(blog=self.blog, title=f'Post {i}', content='Content') for i in range(3)]
+        Post.objects.create(blog=self.other_blog, title='Other', content='Content')
+        for post, age in [(posts[0], 12), (posts[1], 5)]:
+            OutboxEvent.objects.filter(payload__post_id=post.id).update(created_at=timezone.now() - timedelta(seconds=age))
+
+        self.assertEqual(relay_events(100), {'events': 3, 'tasks': 1})
+        self.assertEqual(OutboxEvent.objects.filter(published_at__isnull=True).count(), 1)
+
+    def test_locked_events_are_skipped(self):
+        """
+        События, захваченные другим relay, не публикуются до истечения захвата.
+        """
+        Post.objects.create(blog=self.blog, title='Post', content='Content')
+        self.age_events()
+        OutboxEvent.objects.update(locked_until=timezone.now() + timedelta(seconds=30))
+        self.assertEqual(relay_events(100), {'events': 0, 'tasks': 0})
+
+        OutboxEvent.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(relay_events(100), {'events': 1, 'tasks': 1})
+
+    def test_burst_is_merged_per_blog(self):
+        """
+        Пачка постов одного блога публикуется одной раскладкой, статистика учитывает объединенные события.
+        """
+        posts = [Post.objects.create(blog=self.blog, title=f'Post {i}', content='Content') for i in range(50)]
+        Post.objects.create(blog=self.other_blog, title='Other', content='Content')
+        self.age_events()
+
+        tasks = get_relay_batch(list(OutboxEvent.objects.order_by('id')))
+        self.assertEqual(len(tasks), 2)
+        self.assertEqual(tasks[0][1], {'post_id': posts[-1].id, 'post_ids': [post.id for post in posts]})
+
+        self.assertEqual(relay_events(100), {'events': 51, 'tasks': 2})
+        self.assertEqual(get_relay_stats(), {'events': 51, 'merged': 49})
+
+    def test_merged_fan_out(self):
+        """
+        Одна раскладка записывает в ленты все посты блога.
+        """
+        posts = [Post.objects.create(blog=self.blog, title=f'Post {i}', content='Content') for i in range(3)]
+        post_ids = [post.id for post in posts]
+        posts[-1].delete()
+
+        self.assertEqual(update_news_feed(post_ids[-1], post_ids)['chunks'], 1)
+        checkpoint = FanOutCheckpoint.objects.get()
+        finish_fan_out([fan_out_chunk(checkpoint.id)], checkpoint.post_id)
+
+        self.assertEqual(set(FeedEntry.objects.filter(user=self.reader).values_list('post_id', flat=True)),
+                         set(post_ids[:-1]))
@@ -0,0 +1,46 @@
+from io import StringIO
+
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from accounts.models import Account
+from blogs.feed import fan_out_post
+from blogs.management.commands.explain_hot_queries import Command
+from blogs.models import Blog, Post, Subscription
+
+
+class ExplainHotQueriesTestCase(TestCase):
+    def test_hot_queries_use_indexes(self):
+        """
+        Горячие запросы не читают таблицы последовательным сканированием.
+        """
+        reader = Account.objects.create(username='reader')
+        for i in range(3):
+            blog = Blog.objects.create(user=Account.objects.create(username=f'author_{i}'))
+            Subscription.objects.create(user=reader, blog=blog)
+            fan_out_post(Post.objects.create(blog=blog, title='Post', content='Content'))
+
+        out = StringIO()
+        call_command('explain_hot_queries', stdout=out)
+
+        self.assertNotIn('последовательное сканирование', out.getvalue())
+
+    @skipUnless(connection.vendor == 'sqlite', 'Разбор плана SQLite')
+    def test_full_index_scan_is_regression(self):
+        """
+        Чтение всего индекса без условия - регрессия, как и последовательное сканирование;
+        частичный индекс ограничен своим условием.
+        """
+        command = Command()
+        command.tables = {'blogs_post', 'blogs_outboxevent'}
+        command.partial_indexes = {'blogs_outbox_pending_idx'}
+
+        self.assertEqual(command.get_sqlite_problems('SCAN blogs_post'), ['последовательное сканирование blogs_post'])
+        self.assertEqual(command.get_sqlite_problems('SCAN blogs_post USING COVERING INDEX blogs_post_idx'),
+                         ['чтение индекса blogs_post_idx без условия'])
+        self.assertEqual(command.get_sqlite_problems('SEARCH blogs_post USING INDEX blogs_post_idx (blog_id=?)'), [])
+        self.assertEqual(command.get_sqlite_problems('SCAN blogs_outboxevent USING INDEX blogs_outbox_pending_idx'),
+                         [])
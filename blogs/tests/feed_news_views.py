@@ -1,7 +1,11 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
-from ..models import Blog, Subscription
+from ..feed import fan_out_post
+from ..models import Blog, Post, Subscription
 
 from accounts.models import Account
 
@@ -45,3 +49,100 @@ class NewsFeedTestCase(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
         self.assertTrue('message' in response.data)
+
+    def test_news_feed_cursor_pagination(self):
+        """
+        Проверка курсорной пагинации: страницы идут без пропусков и повторов.
+        """
+        Subscription.objects.create(user=self.user, blog=self.blog2)
+        posts = [Post.objects.create(blog=self.blog2, title=f'Post {i}', content='Content') for i in range(5)]
+        for post in posts:
+            fan_out_post(post)
+
+        self.client.force_authenticate(user=self.user)
+        url = reverse('news_feed')
+        response = self.client.get(url, {'after': '', 'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+
+        received = []
+        while True:
+            received.extend(item['id'] for item in response.data['results'])
+            if response.data['next'] is None:
+                break
+            response = self.client.get(response.data['next'])
+
+        self.assertEqual(received, [post.id for post in reversed(posts)])
+
+    def test_news_feed_cursor_unread_count(self):
+        """
+        Курсорные страницы берут unread_count из кэша и не читают всю ленту; прочтение пересчитывает его.
+        """
+        cache.clear()
+        Subscription.objects.create(user=self.user, blog=self.blog2)
+        posts = [Post.objects.create(blog=self.blog2, title=f'Post {i}', content='Content') for i in range(5)]
+        for post in posts:
+            fan_out_post(post)
+        self.client.force_authenticate(user=self.user)
+        url = reverse('news_feed')
+
+        with CaptureQueriesContext(connection) as first_page:
+            response = self.client.get(url, {'after': '', 'page_size': 2})
+        self.assertEqual(response.data['unread_count'], 5)
+        with CaptureQueriesContext(connection) as next_page:
+            response = self.client.get(response.data['next'])
+        self.assertEqual(response.data['unread_count'], 5)
+        # вся лента (блоги, материализованная лента, посты новой подписки) читается только на первой странице
+        self.assertEqual(len(next_page), len(first_page) - 3)
+
+        self.client.post(reverse('mark-posts-as-read'), {'post_ids': [posts[0].id]}, format='json')
+        response = self.client.get(url, {'after': '', 'page_size': 2})
+        self.assertEqual(response.data['unread_count'], 4)
+
+    def test_news_feed_invalid_cursor(self):
+        """
+        Проверка некорректного курсора.
+        """
+        Subscription.objects.create(user=self.user, blog=self.blog2)
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get(reverse('news_feed'), {'after': 'not-a-cursor'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_news_feed_cache(self):
+        """
+        Проверка кэширования страницы ленты и ее инвалидации новым постом.
+        """
+        cache.clear()
+        Subscription.objects.create(user=self.user, blog=self.blog2)
+        self.client.force_authenticate(user=self.user)
+        url = reverse('news_feed')
+
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response['X-Cache-Hit-Ratio'], '0.5000')
+
+        fan_out_post(Post.objects.create(blog=self.blog2, title='Post', content='Content'))
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_news_feed_read_flags(self):
+        """
+        Проверка флагов прочтения и количества непрочитанных постов.
+        """
+        cache.clear()
+        Subscription.objects.create(user=self.user, blog=self.blog2)
+        posts = [Post.objects.create(blog=self.blog2, title=f'Post {i}', content='Content') for i in range(3)]
+        for post in posts:
+            fan_out_post(post)
+        self.client.force_authenticate(user=self.user)
+
+        self.client.post(reverse('mark-posts-as-read'), {'post_ids': [posts[0].id]}, format='json')
+        response = self.client.get(reverse('news_feed'))
+
+        self.assertEqual(response.data['unread_count'], 2)
+        flags = {item['id']: item['is_read'] for item in response.data['results']}
+        self.assertEqual(flags, {posts[0].id: True, posts[1].id: False, posts[2].id: False})
@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from django.contrib.auth.hashers import check_password
+from django.core.management import CommandError, call_command
+from django.db.models import F, Sum
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import Account
+from blogs.feed import backfill_feed
+from blogs.models import Blog, FeedEntry, Post, ReadState, Subscription
+from blogs.read_state import get_feed_post_ids, get_read_flags
+
+
+@override_settings(NEWS_FEED_STRATEGY='push', READ_STATE_BACKEND='compact')
+class GenerateLoadDataTestCase(TestCase):
+    def test_generate_load_data(self):
+        """
+        Генератор создает аккаунты, посты в пределах разброса дат, подписки без своих блогов,
+        согласованные счетчики, ленты и состояние прочтения.
+        """
+        call_command('generate_load_data', users=40, posts=300, follows=5, days=10, password='secret',
+                     workers=1, chunk_size=15, batch_size=100)
+
+        self.assertEqual(Account.objects.filter(username__startswith='load_').count(), 40)
+        self.assertEqual(Blog.objects.count(), 40)
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertTrue(check_password('secret', Account.objects.first().password))
+        self.assertFalse(Post.objects.filter(created_at__lt=timezone.now() - timedelta(days=10)).exists())
+
+        self.assertTrue(40 < Subscription.objects.count() <= 200)
+        self.assertFalse(Subscription.objects.filter(blog__user_id=F('user_id')).exists())
+        self.assertEqual(Blog.objects.aggregate(total=Sum('posts_count'))['total'], 300)
+        self.assertEqual(Blog.objects.aggregate(total=Sum('subscribers_count'))['total'],
+                         Subscription.objects.count())
+        self.assertFalse(Subscription.objects.filter(is_backfilled=False).exists())
+        self.assertTrue(FeedEntry.objects.exists())
+        self.assertTrue(ReadState.objects.exists())
+
+        # ленты пачки совпадают с заполнением backfill_feed, прочитана доля read_ratio (по умолчанию 0.3) ленты
+        for user_id in Subscription.objects.values_list('user_id', flat=True).distinct()[:5]:
+            entries = FeedEntry.objects.filter(user_id=user_id)
+            generated = set(entries.values_list('post_id', flat=True))
+            entries.delete()
+            backfill_feed(user_id, Subscription.objects.filter(user_id=user_id).values_list('blog_id', flat=True))
+            self.assertEqual(set(entries.values_list('post_id', flat=True)), generated)
+
+            post_ids = get_feed_post_ids(user_id)
+            self.assertEqual(sum(get_read_flags(user_id, post_ids).values()), int(len(post_ids) * 0.3))
+
+        with self.assertRaises(CommandError):
+            call_command('generate_load_data', users=1, posts=1, workers=1)
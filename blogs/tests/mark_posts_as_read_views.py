@@ -0,0 +1,114 @@
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ..models import Blog, Post, ReadPost
+from ..read_state import get_read_flags
+from accounts.models import Account
+
+
+@override_settings(READ_STATE_BACKEND='rows')
+class MarkPostsAsReadTestCase(APITestCase):
+    """
+    Тесты пометки постов как прочитанных (хранение строками ReadPost).
+    """
+
+    def setUp(self):
+        self.user = Account.objects.create_user(username='test_user', password='test_password')
+        self.blog = Blog.objects.create(user=self.user)
+        self.posts = [Post.objects.create(blog=self.blog, title=f'Post {i}', content='Content') for i in range(20)]
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('mark-posts-as-read')
+
+    def test_mark_posts_as_read(self):
+        """
+        Количество запросов не зависит от количества постов.
+        """
+        post_ids = [post.id for post in self.posts]
+        # даты постов в ленте, поиск постов, SAVEPOINT, поиск прочитанных, INSERT, RELEASE SAVEPOINT
+        with self.assertNumQueries(6):
+            response = self.client.post(self.url, {'post_ids': post_ids}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(ReadPost.objects.filter(user=self.user, is_read=True).count(), len(post_ids))
+
+    def test_mark_not_found_posts(self):
+        """
+        Несуществующие посты возвращаются в ответе, существующие помечаются.
+        """
+        response = self.client.post(self.url, {'post_ids': [self.posts[0].id, 999999]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIn('999999', response.data['error'])
+        self.assertTrue(ReadPost.objects.filter(user=self.user, post=self.posts[0], is_read=True).exists())
+
+    def test_mark_already_read_posts(self):
+        """
+        Уже прочитанные посты возвращаются в ответе.
+        """
+        ReadPost.objects.create(user=self.user, post=self.posts[0], is_read=True)
+        ReadPost.objects.create(user=self.user, post=self.posts[1], is_read=False)
+
+        response = self.client.post(self.url, {'post_ids': [self.posts[0].id, self.posts[1].id]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(self.posts[0].id), response.data['error'])
+        self.assertTrue(ReadPost.objects.get(user=self.user, post=self.posts[1]).is_read)
+
+    @override_settings(MARK_POSTS_AS_READ_MAX_IDS=5)
+    def test_mark_too_many_posts(self):
+        """
+        Количество идентификаторов в запросе ограничено.
+        """
+        response = self.client.post(self.url, {'post_ids': [post.id for post in self.posts]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ReadPost.objects.exists())
+
+    def test_mark_posts_not_list(self):
+        """
+        Идентификаторы передаются только списком: строка не разбирается посимвольно.
+        """
+        response = self.client.post(self.url, {'post_ids': f'{self.posts[0].id}{self.posts[1].id}'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ReadPost.objects.exists())
+
+    def test_mark_posts_not_int(self):
+        """
+        Логические значения, дробные числа и строки не приводятся к идентификаторам, а отклоняются.
+        """
+        for post_id in (True, 1.9, str(self.posts[0].id)):
+            response = self.client.post(self.url, {'post_ids': [post_id]}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ReadPost.objects.exists())
+
+
+@override_settings(READ_STATE_BACKEND='compact')
+class MarkPostsAsReadCompactTestCase(APITestCase):
+    """
+    Тесты пометки постов как прочитанных (компактное состояние прочтения).
+    """
+
+    def setUp(self):
+        self.user = Account.objects.create_user(username='test_user', password='test_password')
+        self.blog = Blog.objects.create(user=self.user)
+        self.posts = [Post.objects.create(blog=self.blog, title=f'Post {i}', content='Content') for i in range(5)]
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('mark-posts-as-read')
+
+    def test_mark_posts_as_read(self):
+        """
+        Посты помечаются без строк ReadPost, повторная пометка сообщает об уже прочитанных.
+        """
+        post_ids = [self.posts[1].id, self.posts[3].id]
+        response = self.client.post(self.url, {'post_ids': post_ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(ReadPost.objects.exists())
+
+        flags = get_read_flags(self.user.id, [post.id for post in self.posts])
+        self.assertEqual([post.id for post in self.posts if flags[post.id]], post_ids)
+
+        response = self.client.post(self.url, {'post_ids': post_ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
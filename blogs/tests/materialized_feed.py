@@ -0,0 +1,161 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from ..feed import fan_out_post, trim_feeds
+from ..tasks import backfill_news_feed, fan_out_chunk, finish_fan_out, purge_news_feed, update_news_feed
+from ..models import Blog, FanOutCheckpoint, FeedEntry, Post, Subscription
+from accounts.models import Account
+
+
+class MaterializedFeedTestCase(TestCase):
+    """
+    Тесты материализованной ленты новостей.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.reader = Account.objects.create(username='reader')
+        self.author = Account.objects.create(username='author')
+        Blog.objects.create(user=self.reader)
+        self.blog = Blog.objects.create(user=self.author)
+        Subscription.objects.create(user=self.reader, blog=self.blog)
+
+    def test_fan_out_post(self):
+        """
+        Новый пост раскладывается по лентам подписчиков и попадает в news_feed.
+        """
+        post = Post.objects.create(blog=self.blog, title='Post', content='Content')
+        self.assertEqual(fan_out_post(post), 1)
+        fan_out_post(post)
+        self.assertEqual(FeedEntry.objects.filter(user=self.reader).count(), 1)
+
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.get(reverse('news_feed'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['results']], [post.id])
+
+    @override_settings(NEWS_FEED_FANOUT_CHUNK_SIZE=2, NEWS_FEED_FANOUT_BATCH_SIZE=1, READ_STATE_BACKEND='rows')
+    def test_update_news_feed_touches_only_new_post(self):
+        """
+        Задача делит подписчиков на диапазоны и раскладывает только новый пост.
+        """
+        old_post = Post.objects.create(blog=self.blog, title='Old', content='Content')
+        post = Post.objects.create(blog=self.blog, title='New', content='Content')
+        for i in range(4):
+            Subscription.objects.create(user=Account.objects.create(username=f'subscriber_{i}'), blog=self.blog)
+        FeedEntry.objects.all().delete()
+
+        self.assertEqual(update_news_feed(post.id)['chunks'], 3)
+        self.assertEqual(update_news_feed(post.id)['chunks'], 3)
+        chunk_rows = [fan_out_chunk(checkpoint.id) for checkpoint in FanOutCheckpoint.objects.filter(post=post)]
+        result = finish_fan_out(chunk_rows, post.id)
+
+        self.assertEqual(result['rows'], 10)
+        self.assertFalse(FanOutCheckpoint.objects.exists())
+        self.assertEqual(set(FeedEntry.objects.values_list('post_id', flat=True)), {post.id})
+        self.assertEqual(list(self.reader.read_posts.values_list('id', flat=True)), [post.id])
+        self.assertFalse(old_post.read_by.exists())
+
+    @override_settings(NEWS_FEED_FANOUT_CHUNK_SIZE=10, NEWS_FEED_FANOUT_BATCH_SIZE=1, READ_STATE_BACKEND='rows')
+    def test_fan_out_chunk_resumes_from_checkpoint(self):
+        """
+        Повторная попытка диапазона продолжает с последнего чекпоинта.
+        """
+        post = Post.objects.create(blog=self.blog, title='New', content='Content')
+        subscriber = Account.objects.create(username='subscriber')
+        Subscription.objects.create(user=subscriber, blog=self.blog)
+        FeedEntry.objects.all().delete()
+
+        update_news_feed(post.id)
+        checkpoint = FanOutCheckpoint.objects.get(post=post)
+        checkpoint.last_user_id = self.reader.id
+        checkpoint.save()
+
+        self.assertEqual(fan_out_chunk(checkpoint.id), 2)
+        self.assertEqual(list(FeedEntry.objects.values_list('user_id', flat=True)), [subscriber.id])
+
+    def test_deleted_post_leaves_feed(self):
+        """
+        Удаленный пост пропадает из ленты.
+        """
+        post = Post.objects.create(blog=self.blog, title='Post', content='Content')
+        fan_out_post(post)
+        post.delete()
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+
+    def test_subscription_backfill_and_purge(self):
+        """
+        Подписка асинхронно добавляет в ленту посты блога (до этого они читаются при запросе), отписка их удаляет.
+        """
+        other = Blog.objects.create(user=Account.objects.create(username='other'))
+        post = Post.objects.create(blog=other, title='Post', content='Content')
+        self.client.force_authenticate(user=self.reader)
+
+        subscription = Subscription.objects.create(user=self.reader, blog=other)
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader, blog=other).exists())
+        self.assertEqual([item['id'] for item in self.client.get(reverse('news_feed')).data['results']], [post.id])
+
+        self.assertEqual(backfill_news_feed(self.reader.id, [other.id]), 1)
+        self.assertTrue(Subscription.objects.get(id=subscription.id).is_backfilled)
+        self.assertEqual([item['id'] for item in self.client.get(reverse('news_feed')).data['results']], [post.id])
+
+        subscription.delete()
+        self.assertEqual(purge_news_feed(self.reader.id, [other.id]), 1)
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader, blog=other).exists())
+
+    @override_settings(NEWS_FEED_BACKFILL_SIZE=2)
+    def test_backfill_is_bounded(self):
+        """
+        При подписке в ленту добавляются только NEWS_FEED_BACKFILL_SIZE последних постов блога.
+        """
+        other = Blog.objects.create(user=Account.objects.create(username='other'))
+        posts = [Post.objects.create(blog=other, title=f'Post {i}', content='Content') for i in range(5)]
+        Subscription.objects.create(user=self.reader, blog=other)
+
+        backfill_news_feed(self.reader.id, [other.id])
+
+        self.assertEqual(set(FeedEntry.objects.filter(user=self.reader, blog=other).values_list('post_id', flat=True)),
+                         {post.id for post in posts[-2:]})
+
+    def test_purge_skips_resubscribed_blog(self):
+        """
+        Очистка после отписки не трогает блог, на который пользователь снова подписался.
+        """
+        post = Post.objects.create(blog=self.blog, title='Post', content='Content')
+        fan_out_post(post)
+
+        self.assertEqual(purge_news_feed(self.reader.id, [self.blog.id]), 0)
+        self.assertTrue(FeedEntry.objects.filter(user=self.reader, post=post).exists())
+
+    @override_settings(NEWS_FEED_SIZE=3)
+    def test_trim_feeds(self):
+        """
+        Лента обрезается до NEWS_FEED_SIZE самых новых записей.
+        """
+        posts = [Post.objects.create(blog=self.blog, title=f'Post {i}', content='Content') for i in range(5)]
+        for post in posts:
+            fan_out_post(post)
+
+        self.assertEqual(trim_feeds([self.reader.id]), 2)
+        kept = FeedEntry.objects.filter(user=self.reader).values_list('post_id', flat=True)
+        self.assertEqual(set(kept), {post.id for post in posts[2:]})
+
+    @override_settings(NEWS_FEED_STRATEGY='hybrid', NEWS_FEED_FANOUT_THRESHOLD=1)
+    def test_hybrid_pull_blog(self):
+        """
+        Посты блога с подписчиками выше порога не раскладываются, а подмешиваются при чтении.
+        """
+        Subscription.objects.create(user=Account.objects.create(username='follower'), blog=self.blog)
+        pushed_blog = Blog.objects.create(user=Account.objects.create(username='small'))
+        Subscription.objects.create(user=self.reader, blog=pushed_blog)
+        Subscription.objects.filter(user=self.reader).update(is_backfilled=True)
+        pushed = Post.objects.create(blog=pushed_blog, title='Pushed', content='Content')
+        self.assertEqual(fan_out_post(pushed), 1)
+        pulled = Post.objects.create(blog=self.blog, title='Pulled', content='Content')
+        self.assertEqual(fan_out_post(pulled), 0)
+
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.get(reverse('news_feed'))
+        self.assertEqual([item['id'] for item in response.data['results']], [pulled.id, pushed.id])
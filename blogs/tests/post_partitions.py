@@ -0,0 +1,147 @@
+from datetime import date, timedelta
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from ..feed import backfill_feed, find_post_ids, get_feed_items, get_item_posts
+from ..models import Blog, FeedEntry, Post, Subscription
+from ..partitions import (add_months, create_partitions, detach_partitions, ensure_partition, get_partition_name,
+                          get_partitions, is_partitioned, ready_months)
+from ..tasks import create_post_partitions
+from accounts.models import Account
+
+
+@override_settings(NEWS_FEED_MAX_AGE_DAYS=30)
+class PostPartitionsTestCase(TestCase):
+    """
+    Тесты месячных партиций постов и границы по дате создания в запросах лент.
+    """
+
+    def setUp(self):
+        self.author = Account.objects.create(username='author')
+        self.reader = Account.objects.create(username='reader')
+        self.blog = Blog.objects.create(user=self.author)
+        Subscription.objects.create(user=self.reader, blog=self.blog)
+        self.new_post = Post.objects.create(blog=self.blog, title='New', content='Content')
+        self.old_post = Post.objects.create(blog=self.blog, title='Old', content='Content')
+        Post.objects.filter(id=self.old_post.id).update(created_at=timezone.now() - timedelta(days=40))
+
+    def test_add_months(self):
+        """
+        Сдвиг на месяцы переходит через границу года в обе стороны.
+        """
+        self.assertEqual(add_months(date(2024, 11, 1), 3), date(2025, 2, 1))
+        self.assertEqual(add_months(date(2024, 1, 1), -1), date(2023, 12, 1))
+        self.assertEqual(get_partition_name(date(2024, 3, 1)), 'blogs_post_p2024_03')
+
+    @override_settings(NEWS_FEED_STRATEGY='pull')
+    def test_pull_feed_skips_old_posts(self):
+        """
+        Посты старше NEWS_FEED_MAX_AGE_DAYS не читаются в ленту при запросе.
+        """
+        items = get_feed_items(self.reader.id, [self.blog.id])
+        self.assertEqual([post_id for _, post_id in items], [self.new_post.id])
+
+        with self.settings(NEWS_FEED_MAX_AGE_DAYS=None):
+            items = get_feed_items(self.reader.id, [self.blog.id])
+        self.assertEqual({post_id for _, post_id in items}, {self.new_post.id, self.old_post.id})
+
+    @override_settings(NEWS_FEED_STRATEGY='push')
+    def test_backfill_skips_old_posts(self):
+        """
+        Посты старше NEWS_FEED_MAX_AGE_DAYS не добавляются в ленту при заполнении.
+        """
+        backfill_feed(self.reader.id, [self.blog.id])
+        self.assertEqual(list(FeedEntry.objects.values_list('post_id', flat=True)), [self.new_post.id])
+
+    def test_post_lookup_by_feed_dates(self):
+        """
+        Посты ленты ищутся с диапазоном created_at, посты вне материализованной ленты - по id.
+        """
+        FeedEntry.objects.create(user=self.reader, post=self.new_post, blog=self.blog,
+                                 created_at=self.new_post.created_at)
+        items = [(self.new_post.created_at, self.new_post.id)]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(list(get_item_posts(items)), [self.new_post.id])
+        self.assertIn('BETWEEN', queries[0]['sql'])
+        self.assertEqual(get_item_posts([]), {})
+
+        self.assertEqual(find_post_ids(self.reader.id, [self.new_post.id, self.old_post.id, 999999]),
+                         {self.new_post.id, self.old_post.id})
+
+    def test_partition_month_is_cached_after_commit(self):
+        """
+        Месяц запоминается только после коммита: при откате вместе с созданием партиции он проверяется снова.
+        """
+        created_at = timezone.now() + timedelta(days=3650)
+        month = created_at.date().replace(day=1)
+        ready_months.discard(month)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(DatabaseError), transaction.atomic():
+                ensure_partition(created_at)
+                raise DatabaseError('Откат записи поста')
+        self.assertNotIn(month, ready_months)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ensure_partition(created_at)
+        self.assertIn(month, ready_months)
+
+    @skipUnless(connection.vendor != 'postgresql', 'Проверка поведения без секционирования')
+    def test_not_partitioned(self):
+        """
+        Без PostgreSQL таблица постов не секционирована: задачи и команда ничего не делают.
+        """
+        self.assertFalse(is_partitioned())
+        with CaptureQueriesContext(connection) as queries:
+            ensure_partition(timezone.now() + timedelta(days=3650))
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(create_post_partitions(), [])
+        self.assertEqual(detach_partitions(date(2100, 1, 1)), [])
+        with self.assertRaises(CommandError):
+            call_command('detach_post_partitions', before='2100-01')
+
+    @skipUnless(connection.vendor == 'postgresql', 'Секционирование постов только в PostgreSQL')
+    def test_create_partitions(self):
+        """
+        Партиции на текущий и следующие месяцы создаются один раз, посты пишутся в партицию своего месяца.
+        """
+        self.assertTrue(is_partitioned())
+        create_partitions(6)
+        self.assertEqual(create_partitions(6), [])
+
+        current = timezone.now().date().replace(day=1)
+        names = [name for name, _ in get_partitions()]
+        self.assertTrue({get_partition_name(add_months(current, offset)) for offset in range(7)} <= set(names))
+        past = add_months(current, -2)
+        create_partitions(0, since=past)
+        self.assertTrue({get_partition_name(add_months(past, offset)) for offset in range(3)}
+                        <= {name for name, _ in get_partitions()})
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {get_partition_name(current)} WHERE id = %s', [self.new_post.id])
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Секционирование постов только в PostgreSQL')
+    def test_post_without_partition(self):
+        """
+        Пост месяца без партиции записывается: партиция создается перед записью.
+        """
+        post = Post.objects.create(blog=self.blog, title='Future', content='Content',
+                                   created_at=timezone.now() + timedelta(days=366 * 3))
+        self.assertIn(get_partition_name(post.created_at.date().replace(day=1)), [name for name, _ in get_partitions()])
+        self.assertTrue(Post.objects.filter(id=post.id, created_at=post.created_at).exists())
+
+    @skipUnless(connection.vendor == 'postgresql', 'Секционирование постов только в PostgreSQL')
+    def test_detach_partitions_validation(self):
+        """
+        Команда отсоединения проверяет аргументы.
+        """
+        with self.assertRaises(CommandError):
+            call_command('detach_post_partitions', before='2024')
+        with self.assertRaises(CommandError):
+            call_command('detach_post_partitions', before='2024-01', archive_schema='archive', drop=True)
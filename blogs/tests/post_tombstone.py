@@ -0,0 +1,79 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from ..deletion import tombstone_post
+from ..feed import fan_out_post
+from ..models import Blog, FeedEntry, OutboxEvent, Post, ReadPost, Subscription
+from ..tasks import purge_deleted_post
+from accounts.models import Account
+
+
+@override_settings(NEWS_FEED_STRATEGY='push', READ_STATE_BACKEND='rows', POST_PURGE_BATCH_SIZE=2)
+class PostTombstoneTestCase(TestCase):
+    """
+    Тесты удаления поста: пометка в запросе и асинхронная очистка.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.author = Account.objects.create(username='author')
+        self.blog = Blog.objects.create(user=self.author)
+        self.readers = [Account.objects.create(username=f'reader_{i}') for i in range(5)]
+        for reader in self.readers:
+            Subscription.objects.create(user=reader, blog=self.blog)
+        self.post = Post.objects.create(blog=self.blog, title='Post', content='Content')
+        fan_out_post(self.post)
+        ReadPost.objects.bulk_create([ReadPost(user=reader, post=self.post, is_read=True) for reader in self.readers])
+        self.client.force_authenticate(user=self.author)
+
+    def delete_post(self):
+        return self.client.post(reverse('delete-post-from-blog', args=[self.post.id]))
+
+    def test_delete_marks_post(self):
+        """
+        Запрос только помечает пост: он пропадает из выборок, строки лент и прочтений остаются до очистки.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.delete_post()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any(query['sql'].startswith('DELETE') for query in queries))
+        self.assertFalse(Post.objects.filter(id=self.post.id).exists())
+        self.assertIsNotNone(Post.all_objects.get(id=self.post.id).deleted_at)
+        self.assertEqual(Blog.objects.get(id=self.blog.id).posts_count, 0)
+        self.assertTrue(OutboxEvent.objects.filter(event_type=OutboxEvent.POST_DELETED,
+                                                   payload={'post_id': self.post.id}).exists())
+        self.assertEqual(self.delete_post().status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_purge_deleted_post(self):
+        """
+        Очистка удаляет строки лент и прочтений пачками и сам пост, счетчик не уменьшается повторно.
+        """
+        self.delete_post()
+        stats = purge_deleted_post(self.post.id)
+
+        self.assertEqual(stats, {'feed_entries': 5, 'read_posts': 5, 'delivered': 5, 'checkpoints': 0, 'posts': 1})
+        self.assertFalse(Post.all_objects.filter(id=self.post.id).exists())
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertFalse(ReadPost.objects.exists())
+        self.assertEqual(Blog.objects.get(id=self.blog.id).posts_count, 0)
+        self.assertEqual(purge_deleted_post(self.post.id)['posts'], 0)
+
+    def test_feed_skips_deleted_post_before_purge(self):
+        """
+        До очистки помеченный пост не занимает место на странице ленты и не считается непрочитанным.
+        """
+        posts = [Post.objects.create(blog=self.blog, title=f'New {i}', content='Content') for i in range(2)]
+        for post in posts:
+            fan_out_post(post)
+        tombstone_post(posts[1])
+
+        self.client.force_authenticate(user=self.readers[0])
+        response = self.client.get(reverse('news_feed'), {'page_size': 2})
+
+        self.assertEqual([post['id'] for post in response.data['results']], [posts[0].id, self.post.id])
+        self.assertEqual(response.data['unread_count'], 1)
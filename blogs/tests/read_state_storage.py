@@ -0,0 +1,97 @@
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..models import Blog, Post, ReadPost, ReadState, Subscription
+from ..read_state import PostIdSet, compact, get_read_flags, mark_read
+from accounts.models import Account
+
+
+class PostIdSetTestCase(TestCase):
+    """
+    Тесты сжатого множества идентификаторов постов.
+    """
+
+    def test_sparse_and_dense_containers(self):
+        """
+        Разреженные и плотные контейнеры переживают сериализацию.
+        """
+        values = {3, 70000, 70001, 1 << 40} | set(range(200000, 210000))
+        ids = PostIdSet(values)
+        self.assertIsInstance(ids.containers[200000 >> 16], bytearray)
+
+        restored = PostIdSet.from_bytes(ids.to_bytes())
+        self.assertEqual(set(restored), values)
+        self.assertEqual(len(restored), len(values))
+        self.assertNotIn(4, restored)
+
+    def test_compact(self):
+        """
+        watermark сдвигается по ленте до самого старого непрочитанного поста, посты вне ленты его не задерживают.
+        """
+        ids = PostIdSet([1, 3, 4, 7])
+        self.assertEqual(compact(0, ids, [1, 3, 4, 6, 7]), 4)
+        self.assertEqual(list(ids), [7])
+
+
+@override_settings(READ_STATE_BACKEND='compact', NEWS_FEED_STRATEGY='pull', READ_STATE_COMPACT_SIZE=0)
+class FeedWatermarkTestCase(TestCase):
+    """
+    Тесты watermark относительно ленты пользователя, подписанного на часть блогов.
+    """
+
+    def setUp(self):
+        self.user = Account.objects.create(username='reader')
+        self.blogs = [Blog.objects.create(user=Account.objects.create(username=f'author{i}')) for i in range(3)]
+        # посты подписанных и неподписанного блога перемешаны по id
+        self.posts = [Post.objects.create(blog=self.blogs[i % 3], title=f'Post {i}', content='Content')
+                      for i in range(9)]
+        for blog in self.blogs[:2]:
+            Subscription.objects.create(user=self.user, blog=blog)
+
+    def test_watermark_skips_not_followed_blogs(self):
+        """
+        Прочтение всей ленты сдвигает watermark за посты неподписанного блога, множество остается пустым.
+        """
+        followed = [post for post in self.posts if post.blog_id != self.blogs[2].id]
+        mark_read(self.user.id, [post.id for post in followed])
+
+        state = ReadState.objects.get(user=self.user)
+        self.assertEqual(state.watermark, followed[-1].id)
+        self.assertEqual(len(PostIdSet.from_bytes(state.bitmap)), 0)
+
+    def test_new_subscription_posts_are_unread(self):
+        """
+        Старые посты нового блога не считаются прочитанными из-за watermark, прочитанные посты остаются.
+        """
+        followed = [post for post in self.posts if post.blog_id != self.blogs[2].id]
+        mark_read(self.user.id, [post.id for post in followed])
+        Subscription.objects.create(user=self.user, blog=self.blogs[2])
+
+        flags = get_read_flags(self.user.id, [post.id for post in self.posts])
+        self.assertEqual({post.id: post.blog_id != self.blogs[2].id for post in self.posts}, flags)
+
+        mark_read(self.user.id, [post.id for post in self.posts if post.blog_id == self.blogs[2].id])
+        state = ReadState.objects.get(user=self.user)
+        self.assertEqual(state.watermark, self.posts[-1].id)
+        self.assertEqual(len(PostIdSet.from_bytes(state.bitmap)), 0)
+
+
+@override_settings(READ_STATE_BACKEND='compact')
+class MigrateReadStateTestCase(TestCase):
+    """
+    Тесты переноса прочтений в компактное состояние.
+    """
+
+    def test_migrate_read_state(self):
+        user = Account.objects.create(username='reader')
+        blog = Blog.objects.create(user=Account.objects.create(username='author'))
+        posts = [Post.objects.create(blog=blog, title=f'Post {i}', content='Content') for i in range(4)]
+        ReadPost.objects.create(user=user, post=posts[0], is_read=True)
+        ReadPost.objects.create(user=user, post=posts[1], is_read=False)
+        user.read_posts.add(posts[2])
+
+        call_command('migrate_read_state', stdout=open('/dev/null', 'w'))
+
+        flags = get_read_flags(user.id, [post.id for post in posts])
+        self.assertEqual(flags, {posts[0].id: True, posts[1].id: False, posts[2].id: True, posts[3].id: False})
+        self.assertEqual(ReadState.objects.count(), 1)
@@ -0,0 +1,117 @@
+from types import SimpleNamespace
+
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from ..feed_cache import FeedPageCache, bump_blog_versions
+from ..models import Blog
+from accounts.models import Account
+from nekidaem_tz.db_router import (ReplicaRouter, is_pinned_to_primary, pin_to_primary, read_from_replica,
+                                   replica_reads, using_replica)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1', 'replica_2'], DATABASE_REPLICA_VIEWS=['news_feed'])
+class ReplicaRouterTestCase(SimpleTestCase):
+    """
+    Тесты выбора БД роутером и декоратором представлений.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+
+    def test_reads(self):
+        """
+        Чтение идет на реплики только внутри replica_reads, запись - всегда на основную БД.
+        """
+        self.assertIsNone(self.router.db_for_read(Account))
+        with replica_reads():
+            self.assertIn(self.router.db_for_read(Account), ['replica_1', 'replica_2'])
+            self.assertEqual(self.router.db_for_write(Account), 'default')
+        self.assertFalse(using_replica())
+        self.assertFalse(self.router.allow_migrate('replica_1', 'blogs'))
+        self.assertIsNone(self.router.allow_migrate('default', 'blogs'))
+
+    def test_replica_is_chosen_once(self):
+        """
+        Все чтения блока replica_reads идут на одну реплику, вложенный блок ее не меняет.
+        """
+        for _ in range(20):
+            with replica_reads():
+                replica = self.router.db_for_read(Account)
+                self.assertEqual({self.router.db_for_read(Blog) for _ in range(20)}, {replica})
+                with replica_reads():
+                    self.assertEqual(self.router.db_for_read(Account), replica)
+
+    def test_view_decorator(self):
+        """
+        Представление читает с реплик, если оно включено в DATABASE_REPLICA_VIEWS и пользователь недавно не писал.
+        """
+        request = RequestFactory().get('/')
+        request.user = SimpleNamespace(id=1)
+
+        self.assertTrue(read_from_replica('news_feed')(lambda request: using_replica())(request))
+        self.assertFalse(read_from_replica('user_detail')(lambda request: using_replica())(request))
+
+        pin_to_primary(1)
+        self.assertFalse(read_from_replica('news_feed')(lambda request: using_replica())(request))
+
+    def test_replica_page_is_not_cached_after_change(self):
+        """
+        Страница, прочитанная с реплики сразу после смены версии ленты, не кэшируется под новым ключом.
+        """
+        bump_blog_versions([1])
+        with replica_reads():
+            page_cache = FeedPageCache(1, [1], 'page=1')
+            page_cache.set({'results': []})
+            page_cache.set_unread_count(0)
+        self.assertIsNone(page_cache.get())
+        self.assertIsNone(page_cache.get_unread_count())
+
+        page_cache = FeedPageCache(1, [1], 'page=1')
+        page_cache.set({'results': []})
+        self.assertEqual(page_cache.get(), {'results': []})
+
+        with override_settings(DATABASE_STICKY_SECONDS=0), replica_reads():
+            page_cache = FeedPageCache(1, [1], 'page=2')
+            page_cache.set({'results': []})
+        self.assertEqual(page_cache.get(), {'results': []})
+
+
+# Алиас основной БД в роли реплики: запросы выполняются, проверяется закрепление за основной БД
+@override_settings(DATABASE_REPLICAS=['default'], NEWS_FEED_STRATEGY='push')
+class PrimaryStickyTestCase(TestCase):
+    """
+    Тесты чтения своих записей: после изменяющего запроса пользователь читает с основной БД.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = Account.objects.create(username='reader')
+        Blog.objects.create(user=self.user)
+        self.blog = Blog.objects.create(user=Account.objects.create(username='author'))
+        self.client.force_authenticate(user=self.user)
+
+    def test_write_pins_user(self):
+        """
+        Успешная подписка закрепляет пользователя за основной БД, чтение - нет.
+        """
+        self.client.get(reverse('user-detail-by-id', args=[self.user.id]))
+        self.assertFalse(is_pinned_to_primary(self.user.id))
+
+        response = self.client.post(reverse('subscribe-to-blog', args=[self.blog.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(is_pinned_to_primary(self.user.id))
+        self.assertEqual(self.client.get(reverse('news_feed')).status_code, status.HTTP_200_OK)
+
+    def test_failed_write_does_not_pin(self):
+        """
+        Неуспешный изменяющий запрос не закрепляет пользователя.
+        """
+        response = self.client.post(reverse('subscribe-to-blog', args=[0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(is_pinned_to_primary(self.user.id))
@@ -0,0 +1,86 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..models import Blog, OutboxEvent, Post
+from ..outbox import add_event, delete_published_events
+from ..tasks import relay_outbox
+from accounts.models import Account
+
+
+class TransactionalOutboxTestCase(TestCase):
+    """
+    Тесты транзакционного outbox событий постов.
+    """
+
+    def setUp(self):
+        self.user = Account.objects.create(username='author')
+        self.blog = Blog.objects.create(user=self.user)
+
+    def test_post_events_are_written(self):
+        """
+        Создание и удаление поста записывают события в outbox, без публикации в запросе.
+        """
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        client.post(reverse('add-post-to-blog', args=[self.blog.id]), {'title': 'Post', 'content': 'Content'},
+                    format='json')
+        post = Post.objects.get()
+        client.post(reverse('delete-post-from-blog', args=[post.id]))
+
+        events = OutboxEvent.objects.order_by('id')
+        self.assertEqual([event.event_type for event in events], [OutboxEvent.POST_CREATED, OutboxEvent.POST_DELETED])
+        self.assertEqual(events[0].payload, {'post_id': post.id, 'blog_id': self.blog.id})
+        self.assertFalse(events.filter(published_at__isnull=False).exists())
+
+    def test_rolled_back_post_has_no_event(self):
+        """
+        Событие откатывается вместе с постом.
+        """
+        try:
+            with transaction.atomic():
+                Post.objects.create(blog=self.blog, title='Post', content='Content')
+                raise ValueError
+        except ValueError:
+            pass
+
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_dedup_key(self):
+        """
+        Событие с тем же ключом дедупликации записывается один раз.
+        """
+        add_event(OutboxEvent.POST_CREATED, {'post_id': 1}, 'post_created:1')
+        add_event(OutboxEvent.POST_CREATED, {'post_id': 1}, 'post_created:1')
+
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+
+    @override_settings(OUTBOX_BATCH_SIZE=2, OUTBOX_RELAY_MAX_BATCHES=10, NEWS_FEED_COALESCE_WINDOW=0)
+    def test_relay_outbox(self):
+        """
+        Relay публикует все события пачками и не публикует их повторно.
+        """
+        for i in range(5):
+            Post.objects.create(blog=self.blog, title=f'Post {i}', content='Content')
+
+        self.assertEqual(relay_outbox()['events'], 5)
+        self.assertFalse(OutboxEvent.objects.filter(published_at__isnull=True).exists())
+        self.assertEqual(relay_outbox()['events'], 0)
+
+    @override_settings(OUTBOX_RETENTION=60)
+    def test_delete_published_events(self):
+        """
+        Удаляются только опубликованные события старше времени хранения.
+        """
+        add_event(OutboxEvent.POST_CREATED, {'post_id': 1}, 'post_created:1')
+        add_event(OutboxEvent.POST_CREATED, {'post_id': 2}, 'post_created:2')
+        add_event(OutboxEvent.POST_CREATED, {'post_id': 3}, 'post_created:3')
+        OutboxEvent.objects.filter(dedup_key='post_created:1').update(published_at=timezone.now() - timedelta(hours=1))
+        OutboxEvent.objects.filter(dedup_key='post_created:2').update(published_at=timezone.now())
+
+        self.assertEqual(delete_published_events(), 1)
+        self.assertEqual(OutboxEvent.objects.count(), 2)
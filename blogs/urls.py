@@ -1,11 +1,20 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path('subscribe/<int:blog_id>/', views.subscribe_to_blog, name='subscribe-to-blog'),
     path('unsubscribe/<int:blog_id>/', views.unsubscribe_from_blog, name='unsubscribe-from-blog'),
+    path('subscribe/', views.subscribe_to_blogs, name='subscribe-to-blogs'),
+    path('unsubscribe/', views.unsubscribe_from_blogs, name='unsubscribe-from-blogs'),
     path('news-feed/', views.news_feed, name='news_feed'),
     path('mark-post-as-read/', views.mark_posts_as_read, name='mark-posts-as-read'),
     path('delete-post-from-blog/<int:post_id>/', views.delete_post_from_blog, name='delete-post-from-blog'),
     path('add-post-to-blog/<int:blog_id>', views.add_post_to_blog, name='add-post-to-blog'),
+    # Асинхронные версии (ASGI) с теми же ответами
+    path('async/subscribe/<int:blog_id>/', async_views.subscribe_to_blog, name='async-subscribe-to-blog'),
+    path('async/unsubscribe/<int:blog_id>/', async_views.unsubscribe_from_blog, name='async-unsubscribe-from-blog'),
+    path('async/subscribe/', async_views.subscribe_to_blogs, name='async-subscribe-to-blogs'),
+    path('async/unsubscribe/', async_views.unsubscribe_from_blogs, name='async-unsubscribe-from-blogs'),
+    path('async/news-feed/', async_views.news_feed, name='async-news-feed'),
+    path('async/mark-post-as-read/', async_views.mark_posts_as_read, name='async-mark-posts-as-read'),
 ]
@@ -1,18 +1,26 @@
-from typing import Any, Union, Dict, List
+from typing import Any, Union, Dict, List, Set, Tuple
 
+from django.conf import settings
+from django.db import transaction
 from django.http import Http404
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
 
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
-from .models import Blog, Post, Subscription, ReadPost
-from .serializers import PostSerializer
+from nekidaem_tz.db_router import read_from_replica
+from .deletion import tombstone_post
+from .feed import find_post_ids, get_feed_items, get_item_posts
+from .feed_cache import FeedPageCache, bump_user_version
+from .models import Blog, Post, Subscription
+from .pagination import FeedCursorPagination, FeedPageNumberPagination
+from .read_state import get_read_flags, mark_read
+from .serializers import FeedPostSerializer, PostSerializer
+from .subscriptions import subscribe, unsubscribe
 
 BLOGS = 'Блоги'
 NEWS_FEED = 'Новостная лента'
@@ -34,13 +42,14 @@ def subscribe_to_blog(request: Any, blog_id: int) -> Response:
     :return: Сообщение об успешной подписке или ошибке.
     """
     try:
-        blog = get_object_or_404(Blog, id=blog_id)
+        blog = get_object_or_404(Blog.objects.select_related('user'), id=blog_id)
     except Http404:
         return Response({'error': 'Блог не найден'}, status=404)
 
-    if request.user.blog != blog:
+    if blog.user_id != request.user.id:
         subscription, created = Subscription.objects.get_or_create(user=request.user, blog=blog)
         if created:
+            bump_user_version(request.user.id)
             return Response({'message': f'Вы подписались на {blog}'}, status=200)
         else:
             return Response({'message': f'Вы уже подписаны на {blog}'}, status=200)
@@ -64,45 +73,204 @@ def unsubscribe_from_blog(request: Any, blog_id: int) -> Response:
     :return: Сообщение об успешной отписке или ошибке.
     """
     try:
-        blog = get_object_or_404(Blog, id=blog_id)
+        blog = get_object_or_404(Blog.objects.select_related('user'), id=blog_id)
     except Http404:
         return Response({'error': 'Блог не найден'}, status=404)
 
     subscriptions = Subscription.objects.filter(user=request.user, blog_id=blog_id)
     if subscriptions.exists():
         subscriptions.delete()
+        bump_user_version(request.user.id)
         return Response({'message': f'Подписка отменена для {blog}'}, status=200)
     else:
         return Response({'error': 'Подписка не была найдена'}, status=404)
 
 
+BLOG_IDS_BODY = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    properties={
+        'blog_ids': openapi.Schema(
+            type=openapi.TYPE_ARRAY,
+            items=openapi.Schema(type=openapi.TYPE_INTEGER)
+        ),
+    },
+    required=['blog_ids'],
+)
+
+
+def get_blog_ids(request: Any) -> List[int]:
+    """
+    Идентификаторы блогов из тела запроса массовой подписки/отписки.
+
+    :param request: Запрос пользователя.
+    :return: Уникальные идентификаторы в порядке передачи.
+    :raise ValueError: Если идентификаторы не переданы, некорректны или их больше SUBSCRIBE_MAX_IDS.
+    """
+    blog_ids = request.data.get('blog_ids', [])
+    if not blog_ids or not isinstance(blog_ids, list):
+        raise ValueError('Не переданы идентификаторы блогов')
+
+    try:
+        blog_ids = list(dict.fromkeys(int(blog_id) for blog_id in blog_ids))
+    except (TypeError, ValueError):
+        raise ValueError('Идентификаторы блогов должны быть целыми числами')
+
+    if len(blog_ids) > settings.SUBSCRIBE_MAX_IDS:
+        raise ValueError(f'За один запрос можно передать не более {settings.SUBSCRIBE_MAX_IDS} блогов')
+    return blog_ids
+
+
+@swagger_auto_schema(
+    tags=[BLOGS],
+    method='post',
+    request_body=BLOG_IDS_BODY,
+    responses={200: 'Результат подписки по каждому блогу', 400: 'Некорректный список блогов'},
+    operation_summary='Подписаться на несколько блогов',
+)
+@api_view(['POST'])
+def subscribe_to_blogs(request: Any) -> Response:
+    """
+    Подписка на несколько блогов одним запросом.
+
+    Блоги проверяются одним запросом, подписки записываются одним bulk_create, заполнение ленты
+    ставится одной задачей (см. blogs.subscriptions.subscribe).
+
+    :param request: Запрос пользователя.
+    :return: Результат по каждому блогу: subscribed, already_subscribed, own_blog или not_found.
+    """
+    try:
+        blog_ids = get_blog_ids(request)
+    except ValueError as error:
+        return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    outcomes = subscribe(request.user.id, blog_ids)
+    return Response({'results': [{'blog_id': blog_id, 'result': outcome} for blog_id, outcome in outcomes.items()]},
+                    status=status.HTTP_200_OK)
+
+
+@swagger_auto_schema(
+    tags=[BLOGS],
+    method='post',
+    request_body=BLOG_IDS_BODY,
+    responses={200: 'Результат отписки по каждому блогу', 400: 'Некорректный список блогов'},
+    operation_summary='Отписаться от нескольких блогов',
+)
+@api_view(['POST'])
+def unsubscribe_from_blogs(request: Any) -> Response:
+    """
+    Отписка от нескольких блогов одним запросом.
+
+    Блоги проверяются одним запросом, подписки удаляются одним DELETE (см. blogs.subscriptions.unsubscribe).
+
+    :param request: Запрос пользователя.
+    :return: Результат по каждому блогу: unsubscribed, not_subscribed или not_found.
+    """
+    try:
+        blog_ids = get_blog_ids(request)
+    except ValueError as error:
+        return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    outcomes = unsubscribe(request.user.id, blog_ids)
+    return Response({'results': [{'blog_id': blog_id, 'result': outcome} for blog_id, outcome in outcomes.items()]},
+                    status=status.HTTP_200_OK)
+
+
 @swagger_auto_schema(
     methods=['get'],
     tags=[NEWS_FEED],
-    responses={200: 'OK', 404: 'Нет подписок'},
-    pagination_class=PageNumberPagination,
+    responses={200: 'OK', 400: 'Некорректный курсор', 404: 'Нет подписок'},
+    pagination_class=FeedPageNumberPagination,
+    manual_parameters=[
+        openapi.Parameter('after', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                          description='Курсор для курсорной пагинации (пустой - первая страница)'),
+        openapi.Parameter('page_size', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                          description='Размер страницы (не больше NEWS_FEED_MAX_PAGE_SIZE)'),
+    ],
     operation_summary='Новостная лента',
 )
 @api_view(['GET'])
+@read_from_replica('news_feed')
 def news_feed(request: Any) -> Union[Response, Dict[str, Any]]:
     """
     Вывод ленты последних 500 постов, с пагинацией 10 объектов на представлении.
 
+    Лента читается из материализованной ленты пользователя (FeedEntry), которая заполняется при публикации
+    поста в блоге, на который он подписан. Посты блогов с большим числом подписчиков (см. NEWS_FEED_STRATEGY)
+    и блогов новых подписок, лента по которым еще не заполнена, подмешиваются при чтении.
+
+    Если передан параметр after, используется курсорная пагинация по (created_at, id) без COUNT и OFFSET.
+    Страницы кэшируются (см. FeedPageCache), статус кэша и доля попаданий возвращаются в заголовках
+    X-Cache и X-Cache-Hit-Ratio.
+
+    Каждый пост содержит флаг is_read, ответ - количество непрочитанных постов ленты (unread_count).
+    Флаги прочтения страницы получаются одним запросом (см. get_read_flags), unread_count считается
+    по всей ленте один раз на версию ленты и кэшируется (см. get_feed_page).
+
+    Лента читается с реплик БД, кроме DATABASE_STICKY_SECONDS секунд после изменяющего запроса пользователя.
+
     :param request: Запрос пользователя.
     :return: Ответ сервера.
     """
     if request.method == 'GET':
-        subscriptions = Subscription.objects.filter(user=request.user)
-        if not subscriptions:
+        subscriptions = list(Subscription.objects.filter(user=request.user).values_list('blog_id', 'is_backfilled'))
+        blog_ids = [blog_id for blog_id, _ in subscriptions]
+        pending_blog_ids = [blog_id for blog_id, is_backfilled in subscriptions if not is_backfilled]
+        if not blog_ids:
             return Response({'message': 'Пользователь не подписан ни на один блог'}, status=status.HTTP_404_NOT_FOUND)
 
-        subscribed_blogs = [subscription.blog for subscription in subscriptions]
-        posts = Post.objects.filter(blog__in=subscribed_blogs).order_by('-created_at')[:500]
-        paginator = PageNumberPagination()
-        paginator.page_size = 10
-        page_posts = paginator.paginate_queryset(posts, request)
-        serializer = PostSerializer(page_posts, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        page_cache = FeedPageCache(request.user.id, blog_ids, request.query_params.urlencode())
+        data = page_cache.get()
+        if data is not None:
+            return Response(data, headers=page_cache.get_headers())
+
+        data = get_feed_page(request, request.user.id, blog_ids, pending_blog_ids, page_cache)
+        page_cache.set(data)
+        return Response(data, headers=page_cache.get_headers())
+
+
+def get_feed_page(request: Any, user_id: int, blog_ids: List[int], pending_blog_ids: List[int],
+                  page_cache: FeedPageCache) -> Dict[str, Any]:
+    """
+    Страница ленты пользователя с флагами прочтения и количеством непрочитанных постов.
+
+    Курсорная страница читает только page_size + 1 постов после курсора и флаги прочтения только для них.
+    unread_count кэшируется с версиями пользователя и блогов (см. FeedPageCache) и считается по всей ленте
+    (NEWS_FEED_SIZE постов) только при промахе кэша - одним запросом флагов вместе со страницей.
+
+    :param request: Запрос пользователя (параметры пагинации).
+    :param user_id: Идентификатор пользователя.
+    :param blog_ids: Идентификаторы блогов, на которые подписан пользователь.
+    :param pending_blog_ids: Блоги новых подписок, лента по которым еще не заполнена.
+    :param page_cache: Кэш ленты пользователя.
+    :return: Данные ответа.
+    """
+    feed_items = None
+    if FeedCursorPagination.is_requested(request):
+        paginator = FeedCursorPagination(request)
+        items = get_feed_items(user_id, blog_ids, limit=paginator.page_size + 1, after=paginator.after,
+                               pending_blog_ids=pending_blog_ids)
+        page_items = paginator.paginate_items(items)
+    else:
+        feed_items = get_feed_items(user_id, blog_ids, pending_blog_ids=pending_blog_ids)
+        paginator = FeedPageNumberPagination()
+        page_items = paginator.paginate_queryset(feed_items, request)
+
+    unread_count = page_cache.get_unread_count()
+    if unread_count is None:
+        if feed_items is None:
+            feed_items = get_feed_items(user_id, blog_ids, pending_blog_ids=pending_blog_ids)
+        read_flags = get_read_flags(user_id, {post_id for _, post_id in feed_items + page_items})
+        unread_count = sum(not read_flags[post_id] for _, post_id in feed_items)
+        page_cache.set_unread_count(unread_count)
+    else:
+        read_flags = get_read_flags(user_id, [post_id for _, post_id in page_items])
+
+    posts = get_item_posts(page_items)
+    serializer = FeedPostSerializer([posts[post_id] for _, post_id in page_items if post_id in posts],
+                                    many=True, context={'read_flags': read_flags})
+    data = paginator.get_paginated_response(serializer.data).data
+    data['unread_count'] = unread_count
+    return data
 
 
 @swagger_auto_schema(
@@ -130,36 +298,69 @@ def mark_posts_as_read(request: Dict[str, Union[Any, List[int]]]) -> Response:
     """
     Помечает выбранные посты как прочитанные.
 
+    Посты ищутся по id__in с диапазоном created_at из ленты пользователя (см. find_post_ids), отметки
+    записываются пачкой в хранилище состояния прочтения (см. READ_STATE_BACKEND).
+    Количество идентификаторов в запросе ограничено MARK_POSTS_AS_READ_MAX_IDS.
+
     :param request: Запрос пользователя.
     :return: Ответ сервера.
     """
+    try:
+        post_ids = get_post_ids(request)
+    except ValueError as error:
+        return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    found_ids = find_post_ids(request.user.id, post_ids)
+    read_ids = mark_read(request.user.id, found_ids)
+    if found_ids - read_ids:
+        bump_user_version(request.user.id)
+
+    data, status_code = get_mark_read_result(post_ids, found_ids, read_ids)
+    return Response(data, status=status_code)
+
+
+def get_post_ids(request: Any) -> List[int]:
+    """
+    Идентификаторы постов из тела запроса пометки прочитанными.
+
+    :param request: Запрос пользователя.
+    :return: Уникальные идентификаторы в порядке передачи.
+    :raise ValueError: Если идентификаторы не переданы, некорректны или их больше MARK_POSTS_AS_READ_MAX_IDS.
+    """
     post_ids = request.data.get('post_ids', [])
+    if not post_ids or not isinstance(post_ids, list):
+        raise ValueError('Не переданы идентификаторы постов')
+
+    # true, 1.9 и "12" не приводятся к числу, а отклоняются
+    if not all(isinstance(post_id, int) and not isinstance(post_id, bool) for post_id in post_ids):
+        raise ValueError('Идентификаторы постов должны быть целыми числами')
+    post_ids = list(dict.fromkeys(post_ids))
+
+    if len(post_ids) > settings.MARK_POSTS_AS_READ_MAX_IDS:
+        raise ValueError(f'За один запрос можно пометить не более {settings.MARK_POSTS_AS_READ_MAX_IDS} постов')
+    return post_ids
 
-    if not post_ids:
-        return Response({'error': 'Не переданы идентификаторы постов'}, status=status.HTTP_400_BAD_REQUEST)
 
-    posts_not_found = []
-    posts_already_read = []
+def get_mark_read_result(post_ids: List[int], found_ids: Set[int], read_ids: Set[int]) -> Tuple[Dict[str, str], int]:
+    """
+    Ответ пометки постов прочитанными.
 
-    for post_id in post_ids:
-        try:
-            post = Post.objects.get(id=post_id)
-            if ReadPost.objects.filter(user=request.user, post=post, is_read=True).exists():
-                posts_already_read.append(post_id)
-            else:
-                ReadPost.objects.create(user=request.user, post=post, is_read=True)
-        except Post.DoesNotExist:
-            posts_not_found.append(post_id)
+    :param post_ids: Переданные идентификаторы постов.
+    :param found_ids: Идентификаторы существующих постов.
+    :param read_ids: Идентификаторы постов, которые уже были прочитаны.
+    :return: Данные ответа и статус.
+    """
+    posts_not_found = [post_id for post_id in post_ids if post_id not in found_ids]
+    posts_already_read = [post_id for post_id in post_ids if post_id in read_ids]
 
     if posts_not_found:
-        return Response({'error': f'Посты с IDs: {posts_not_found} не найдены'}, status=status.HTTP_404_NOT_FOUND)
+        return {'error': f'Посты с IDs: {posts_not_found} не найдены'}, status.HTTP_404_NOT_FOUND
 
     if posts_already_read:
-        return Response({'error': f'Посты с IDs: {posts_already_read} уже помечены как прочитанные'},
-                        status=status.HTTP_400_BAD_REQUEST)
+        return {'error': f'Посты с IDs: {posts_already_read} уже помечены как прочитанные'}, \
+            status.HTTP_400_BAD_REQUEST
 
-    return Response({'message': f'Посты c IDs: {post_ids} успешно помечены как прочитанные'},
-                    status=status.HTTP_200_OK)
+    return {'message': f'Посты c IDs: {post_ids} успешно помечены как прочитанные'}, status.HTTP_200_OK
 
 
 @swagger_auto_schema(
@@ -186,17 +387,19 @@ def add_post_to_blog(request: Any, blog_id: int) -> Response:
     :return: Сообщение о добавлении поста или ошибке.
     """
     try:
-        blog = get_object_or_404(Blog, id=blog_id)
+        blog = get_object_or_404(Blog.objects.select_related('user'), id=blog_id)
     except Http404:
         return Response({'error': 'Блог не найден'}, status=404)
 
-    if blog.user != request.user:
+    if blog.user_id != request.user.id:
         return Response({'error': 'Вы можете добавлять посты только в свой собственный блог'}, status=400)
 
     request.data['blog'] = blog_id
     serializer = PostSerializer(data=request.data)
     if serializer.is_valid():
-        serializer.save()
+        # пост и событие outbox (post_save) записываются одной транзакцией
+        with transaction.atomic():
+            serializer.save()
         return Response({'message': f'Пост успешно добавлен в {blog}'}, status=200)
     else:
         return Response(serializer.errors, status=400)
@@ -213,6 +416,8 @@ def delete_post_from_blog(request: Any, post_id: int) -> Response:
     """
     Удаление поста из блога пользователя.
 
+    Пост помечается удаленным (см. tombstone_post), ленты и прочтения очищаются асинхронно.
+
     :param request: Запрос пользователя.
     :param post_id: Идентификатор поста, который пользователь хочет удалить.
     :return: Сообщение об удалении поста или ошибке.
@@ -225,5 +430,5 @@ def delete_post_from_blog(request: Any, post_id: int) -> Response:
     if post is None:
         return Response({'error': 'Вы не можете удалять этот пост, так как он не принадлежит вашему блогу'}, status=404)
 
-    post.delete()
+    tombstone_post(post)
     return Response({'message': 'Пост успешно удален'}, status=200)
@@ -0,0 +1,61 @@
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional
+
+from asgiref.sync import sync_to_async
+
+from django.http import JsonResponse
+from rest_framework.exceptions import APIException, AuthenticationFailed, MethodNotAllowed, NotAuthenticated
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+
+def json_response(data: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> JsonResponse:
+    return JsonResponse(data, status=status, headers=headers, safe=False, json_dumps_params={'ensure_ascii': False})
+
+
+def handle_exception(request: Request, exc: APIException) -> JsonResponse:
+    """ JSON-ответ на ошибку DRF; без заголовка WWW-Authenticate ошибка аутентификации - 403, как в APIView. """
+    status_code = exc.status_code
+    headers = None
+    if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+        header = request.authenticators[0].authenticate_header(request) if request.authenticators else None
+        if header:
+            headers = {'WWW-Authenticate': header}
+        else:
+            status_code = 403
+    detail = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+    return json_response(detail, status=status_code, headers=headers)
+
+
+def async_api_view(methods: List[str], authenticated: bool = True) -> Callable:
+    """
+    Декоратор асинхронного представления (ASGI) с аутентификацией и парсерами DRF.
+
+    DRF не поддерживает async-представления, поэтому запрос оборачивается в rest_framework.request.Request
+    вручную: аутентификация (DEFAULT_AUTHENTICATION_CLASSES, с проверкой CSRF для сессий) выполняется
+    одним вызовом sync_to_async, дальше представление работает в цикле событий.
+    Ошибки APIException превращаются в JSON-ответ с соответствующим статусом.
+
+    :param methods: Разрешенные HTTP-методы.
+    :param authenticated: Требовать аутентифицированного пользователя.
+    :return: Декоратор.
+    """
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            drf_request = Request(request, parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+                                  authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+            try:
+                if request.method not in methods:
+                    raise MethodNotAllowed(request.method)
+                user = await sync_to_async(lambda: drf_request.user)()
+                if authenticated and not user.is_authenticated:
+                    raise NotAuthenticated()
+                return await view(drf_request, *args, **kwargs)
+            except APIException as exc:
+                return handle_exception(drf_request, exc)
+
+        # как и в DRF, CSRF проверяется только для сессионной аутентификации
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
@@ -0,0 +1,232 @@
+import json
+import math
+import os
+import statistics
+import time
+from importlib import import_module
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection, reset_queries, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from accounts.models import Account
+from blogs.counters import count_subquery
+from blogs.feed import backfill_feed
+from blogs.models import Blog, FeedEntry, Post, Subscription
+
+# Бюджеты эндпоинтов: {имя URL: {'queries': N, 'p50_ms': {масштаб: мс}, 'p99_ms': {масштаб: мс}}}
+BUDGET_FILE = os.path.join(settings.BASE_DIR, 'nekidaem_tz', 'endpoint_budgets.json')
+URLCONFS = ['blogs.urls', 'accounts.urls']
+# Масштабы данных - общее количество постов
+SCALES = [10, 1000, 100000]
+AUTHORS = 50
+FOLLOWS = 20
+BULK_SIZE = 10
+# Во сколько раз бюджет задержки больше измеренной при --update и его минимум
+LATENCY_HEADROOM = 3
+LATENCY_FLOOR_MS = 50
+# Управление транзакцией не считается: каждый запрос харнесс выполняет в откатываемой точке сохранения
+TRANSACTION_CONTROL = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+Scenario = Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]
+
+
+def get_url_names() -> List[str]:
+    """ Имена URL приложений blogs и accounts, для каждого из которых должен быть бюджет. """
+    return [pattern.name for urlconf in URLCONFS for pattern in import_module(urlconf).urlpatterns]
+
+
+def load_budgets(path: str = BUDGET_FILE) -> Dict[str, Dict[str, Any]]:
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_budgets(budgets: Dict[str, Dict[str, Any]], path: str = BUDGET_FILE) -> None:
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(budgets, file, indent=2, ensure_ascii=False)
+        file.write('\n')
+
+
+def seed(posts: int) -> Dict[str, Any]:
+    """
+    Данные масштаба posts: AUTHORS блогов с постами, читатель с FOLLOWS подписками и заполненной лентой.
+
+    Вызывается внутри транзакции, которая откатывается после замеров (см. run_budgets).
+
+    :param posts: Общее количество постов в блогах авторов.
+    :return: Контекст сценариев: читатель, его блог и пост, подписанные и неподписанные блоги, посты ленты.
+    """
+    authors = Account.objects.bulk_create([Account(username=f'budget_author_{i}', password='!')
+                                           for i in range(AUTHORS)])
+    blogs = Blog.objects.bulk_create([Blog(user=author) for author in authors])
+    Post.objects.bulk_create([Post(blog=blogs[i % AUTHORS], title=f'Post {i}', content='Content')
+                              for i in range(posts)], batch_size=5000)
+
+    reader = Account.objects.create(username='budget_reader', password='!')
+    own_blog = Blog.objects.create(user=reader)
+    own_post = Post.objects.create(blog=own_blog, title='Post', content='Content')
+    blog_ids = [blog.id for blog in blogs[:FOLLOWS]]
+    Subscription.objects.bulk_create([Subscription(user=reader, blog_id=blog_id) for blog_id in blog_ids])
+    backfill_feed(reader.id, blog_ids)
+
+    # bulk_create не вызывает сигналы счетчиков
+    Blog.objects.filter(id__in=[blog.id for blog in blogs]) \
+                .update(posts_count=count_subquery(Post.objects.all(), 'blog'),
+                        subscribers_count=count_subquery(Subscription.objects.all(), 'blog'))
+    Account.objects.filter(id=reader.id).update(subscriptions_count=len(blog_ids))
+
+    return {
+        'reader': reader,
+        'author': authors[0],
+        'own_blog_id': own_blog.id,
+        'own_post_id': own_post.id,
+        'blog_ids': blog_ids,
+        'other_blog_ids': [blog.id for blog in blogs[FOLLOWS:FOLLOWS + BULK_SIZE]],
+        'post_ids': list(FeedEntry.objects.filter(user_id=reader.id).order_by('-created_at')
+                                          .values_list('post_id', flat=True)[:BULK_SIZE]),
+    }
+
+
+def get_scenarios(context: Dict[str, Any]) -> Dict[str, Scenario]:
+    """
+    Успешный запрос к каждому эндпоинту: (HTTP-метод, kwargs URL, тело запроса).
+
+    :param context: Контекст, возвращенный seed.
+    :return: Сценарии по имени URL.
+    """
+    scenarios = {
+        'subscribe-to-blog': ('post', {'blog_id': context['other_blog_ids'][0]}, None),
+        'unsubscribe-from-blog': ('post', {'blog_id': context['blog_ids'][0]}, None),
+        'subscribe-to-blogs': ('post', {}, {'blog_ids': context['other_blog_ids']}),
+        'unsubscribe-from-blogs': ('post', {}, {'blog_ids': context['blog_ids'][:BULK_SIZE]}),
+        'news_feed': ('get', {}, None),
+        'mark-posts-as-read': ('post', {}, {'post_ids': context['post_ids']}),
+        'delete-post-from-blog': ('post', {'post_id': context['own_post_id']}, None),
+        'add-post-to-blog': ('post', {'blog_id': context['own_blog_id']}, {'title': 'Post', 'content': 'Content'}),
+        'account-create': ('post', {}, {'username': 'budget_new_user', 'password': 'password'}),
+        'user-detail-by-username': ('get', {'username': context['author'].username}, None),
+        'user-detail-by-id': ('get', {'user_id': context['author'].id}, None),
+    }
+    scenarios['async-news-feed'] = scenarios['news_feed']
+    for name in ['subscribe-to-blog', 'unsubscribe-from-blog', 'subscribe-to-blogs', 'unsubscribe-from-blogs',
+                 'mark-posts-as-read', 'user-detail-by-username', 'user-detail-by-id']:
+        scenarios[f'async-{name}'] = scenarios[name]
+    return scenarios
+
+
+def measure(client: APIClient, url_name: str, scenario: Scenario, iterations: int) -> Dict[str, Any]:
+    """
+    Выполняет запрос iterations раз, каждый раз откатывая его изменения.
+
+    :return: Наибольшее количество запросов к БД, p50/p99 задержки и статус последнего ответа.
+    """
+    method, kwargs, data = scenario
+    url = reverse(url_name, kwargs=kwargs)
+    queries, latencies, status_code = 0, [], None
+    for _ in range(iterations):
+        # журнал запросов ограничен queries_limit записями, при переполнении CaptureQueriesContext не видит новых
+        reset_queries()
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = getattr(client, method)(url, data, format='json')
+                latencies.append(time.perf_counter() - started)
+            transaction.set_rollback(True)
+        status_code = response.status_code
+        queries = max(queries, sum(not query['sql'].startswith(TRANSACTION_CONTROL)
+                                   for query in context.captured_queries))
+
+    percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'url_name': url_name,
+        'status': status_code,
+        'queries': queries,
+        'p50_ms': round(percentiles[49] * 1000, 2),
+        'p99_ms': round(percentiles[98] * 1000, 2),
+    }
+
+
+def run_budgets(scales: List[int], iterations: int, url_names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Замеры эндпоинтов на данных каждого масштаба.
+
+    Данные масштаба создаются и удаляются откатом транзакции, поэтому БД после замеров не меняется.
+    Кэш страниц ленты отключен: замеряется худший случай. Хост тестового клиента разрешается
+    и вне тестов (как в setup_test_environment).
+
+    :param scales: Масштабы данных (количество постов).
+    :param iterations: Количество запросов к каждому эндпоинту.
+    :param url_names: Имена URL (по умолчанию - все из URLCONFS).
+    :return: Результаты замеров с масштабом.
+    """
+    results = []
+    with override_settings(NEWS_FEED_CACHE_TIMEOUT=0, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        for scale in scales:
+            with transaction.atomic():
+                context = seed(scale)
+                client = APIClient()
+                client.force_login(context['reader'])
+                scenarios = get_scenarios(context)
+                for url_name in url_names or get_url_names():
+                    results.append({'scale': scale, **measure(client, url_name, scenarios[url_name], iterations)})
+                transaction.set_rollback(True)
+    return results
+
+
+def check_budgets(results: List[Dict[str, Any]], budgets: Dict[str, Dict[str, Any]],
+                  latency: bool = True) -> List[str]:
+    """
+    Сравнивает замеры с бюджетами.
+
+    :param results: Результаты run_budgets.
+    :param budgets: Бюджеты (см. BUDGET_FILE).
+    :param latency: Проверять задержки (зависят от машины, поэтому в тестах не проверяются).
+    :return: Описания превышений бюджета.
+    """
+    violations = []
+    for result in results:
+        name, scale = result['url_name'], str(result['scale'])
+        budget = budgets.get(name)
+        if result['status'] >= 400:
+            violations.append(f'{name} [{scale}]: ответ {result["status"]}')
+        if budget is None:
+            violations.append(f'{name}: нет бюджета')
+            continue
+        if result['queries'] > budget['queries']:
+            violations.append(f'{name} [{scale}]: {result["queries"]} запросов к БД, бюджет {budget["queries"]}')
+        if not latency:
+            continue
+        for key in ('p50_ms', 'p99_ms'):
+            limit = budget[key].get(scale)
+            if limit is None:
+                violations.append(f'{name} [{scale}]: нет бюджета {key}')
+            elif result[key] > limit:
+                violations.append(f'{name} [{scale}]: {key} {result[key]} мс, бюджет {limit} мс')
+    return violations
+
+
+def make_budgets(results: List[Dict[str, Any]],
+                 budgets: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Бюджеты по замерам: количество запросов - как измерено, задержки - с запасом LATENCY_HEADROOM
+    (не меньше LATENCY_FLOOR_MS).
+
+    :param results: Результаты run_budgets.
+    :param budgets: Текущие бюджеты, задержки других масштабов в которых сохраняются.
+    :return: Новые бюджеты.
+    """
+    budgets = {name: {**budget, 'p50_ms': dict(budget['p50_ms']), 'p99_ms': dict(budget['p99_ms'])}
+               for name, budget in (budgets or {}).items()}
+    queries: Dict[str, int] = {}
+    for result in results:
+        name = result['url_name']
+        queries[name] = max(queries.get(name, 0), result['queries'])
+        budget = budgets.setdefault(name, {'queries': 0, 'p50_ms': {}, 'p99_ms': {}})
+        for key in ('p50_ms', 'p99_ms'):
+            budget[key][str(result['scale'])] = max(math.ceil(result[key] * LATENCY_HEADROOM), LATENCY_FLOOR_MS)
+    for name, count in queries.items():
+        budgets[name]['queries'] = count
+    return {name: budgets[name] for name in sorted(budgets)}
@@ -0,0 +1,158 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Iterator, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Реплика, с которой читает текущий запрос/задача (см. read_from_replica, replica_reads); None - основная БД
+_replica_reads: ContextVar[Optional[str]] = ContextVar('replica_reads', default=None)
+
+STICKY_KEY = 'db:primary:user:{}'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def using_replica() -> bool:
+    return _replica_reads.get() is not None
+
+
+@contextmanager
+def replica_reads() -> Iterator[None]:
+    """
+    Чтение моделей внутри блока с реплики DATABASE_REPLICAS (запись и транзакции - на основной БД).
+
+    Реплика выбирается один раз на блок (во вложенном блоке остается внешняя): все чтения запроса
+    видят один и тот же снимок данных и идут через одно соединение.
+    """
+    replica = _replica_reads.get()
+    if replica is None and settings.DATABASE_REPLICAS:
+        replica = random.choice(settings.DATABASE_REPLICAS)
+    token = _replica_reads.set(replica)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def pin_to_primary(user_id: int) -> None:
+    """ После записи пользователь читает с основной БД DATABASE_STICKY_SECONDS секунд (read-your-writes). """
+    cache.set(STICKY_KEY.format(user_id), 1, settings.DATABASE_STICKY_SECONDS)
+
+
+def is_pinned_to_primary(user_id: Optional[int]) -> bool:
+    return user_id is not None and cache.get(STICKY_KEY.format(user_id)) is not None
+
+
+async def ais_pinned_to_primary(user_id: Optional[int]) -> bool:
+    return user_id is not None and await cache.aget(STICKY_KEY.format(user_id)) is not None
+
+
+def is_replica_enabled(name: str) -> bool:
+    return bool(settings.DATABASE_REPLICAS) and name in settings.DATABASE_REPLICA_VIEWS
+
+
+def read_from_replica(name: str) -> Callable:
+    """
+    Декоратор представления: чтение с реплик, если name есть в DATABASE_REPLICA_VIEWS
+    и пользователь не писал в последние DATABASE_STICKY_SECONDS секунд.
+
+    Для функций DRF ставится под @api_view (для асинхронных - под @async_api_view), для методов APIView -
+    через method_decorator, чтобы request.user был уже аутентифицирован.
+
+    :param name: Имя представления в DATABASE_REPLICA_VIEWS.
+    :return: Декоратор.
+    """
+    def decorator(view: Callable) -> Callable:
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if not is_replica_enabled(name) or await ais_pinned_to_primary(request.user.id):
+                    return await view(request, *args, **kwargs)
+                with replica_reads():
+                    return await view(request, *args, **kwargs)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not is_replica_enabled(name) or is_pinned_to_primary(request.user.id):
+                return view(request, *args, **kwargs)
+            with replica_reads():
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class ReplicaRouter:
+    """
+    Роутер БД: чтение внутри replica_reads - с выбранной для блока реплики DATABASE_REPLICAS, остальное - основная БД.
+
+    Внутри транзакции на основной БД чтение остается на ней, чтобы видеть собственные записи.
+    Реплики не мигрируются: схема на них приходит репликацией.
+    """
+
+    def db_for_read(self, model, **hints) -> Optional[str]:
+        replica = _replica_reads.get()
+        if replica is None or replica not in settings.DATABASE_REPLICAS:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return replica
+
+    def db_for_write(self, model, **hints) -> str:
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> Optional[bool]:
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints) -> Optional[bool]:
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class PrimaryStickyMiddleware:
+    """ После успешного изменяющего запроса пользователь на время читает с основной БД (см. pin_to_primary). """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        user_id = self.get_writer_id(request, response)
+        if user_id is not None:
+            pin_to_primary(user_id)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            user_id = await sync_to_async(self.get_writer_id)(request, response)
+            if user_id is not None:
+                await cache.aset(STICKY_KEY.format(user_id), 1, settings.DATABASE_STICKY_SECONDS)
+        return response
+
+    @staticmethod
+    def get_writer_id(request, response) -> Optional[int]:
+        """ Пользователь, успешно выполнивший изменяющий запрос, если реплики используются. """
+        if request.method in SAFE_METHODS or response.status_code >= 400 or not settings.DATABASE_REPLICAS:
+            return None
+        # DRF записывает аутентифицированного пользователя и в исходный HttpRequest
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return None
+        return user.id
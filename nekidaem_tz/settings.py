@@ -40,6 +40,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'nekidaem_tz.db_router.PrimaryStickyMiddleware',
 ]
 
 ROOT_URLCONF = 'nekidaem_tz.urls'
@@ -74,6 +75,18 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения: DB_REPLICA_HOSTS - хосты через запятую (алиасы replica_1, replica_2, ...).
+# В тестах реплики - зеркала основной БД.
+DATABASE_REPLICAS = []
+for number, host in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    DATABASES[f'replica_{number}'] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica_{number}')
+DATABASE_ROUTERS = ['nekidaem_tz.db_router.ReplicaRouter']
+# Представления и задачи, читающие с реплик (см. nekidaem_tz.db_router.read_from_replica)
+DATABASE_REPLICA_VIEWS = ['news_feed', 'user_detail', 'newsletter']
+# Сколько секунд после изменяющего запроса пользователь читает с основной БД
+DATABASE_STICKY_SECONDS = 5
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -112,10 +125,86 @@ STATICFILES_DIRS = [
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
+CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
 CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+# Транзакционный outbox: период relay-задачи (секунд), размер пачки, максимум пачек за запуск,
+# время хранения опубликованных событий (секунд)
+OUTBOX_RELAY_INTERVAL = 2
+OUTBOX_BATCH_SIZE = 500
+OUTBOX_RELAY_MAX_BATCHES = 20
+OUTBOX_RETENTION = 24 * 60 * 60
+# Сколько секунд захваченные relay события не публикуются другими relay (при сбое relay - повторная публикация)
+OUTBOX_LOCK_TIMEOUT = 60
+# Окно (секунд), за которое события создания постов одного блога объединяются в одну раскладку
+NEWS_FEED_COALESCE_WINDOW = 10
+# Размер пачки при асинхронной очистке лент и прочтений удаленного поста
+POST_PURGE_BATCH_SIZE = 1000
+# На сколько месяцев вперед задача create_post_partitions создает месячные партиции постов (PostgreSQL)
+POST_PARTITIONS_AHEAD = 3
+
+CELERY_BEAT_SCHEDULE = {
+    'trim-news-feeds': {
+        'task': 'blogs.tasks.trim_news_feeds',
+        'schedule': 60 * 60,
+    },
+    'relay-outbox': {
+        'task': 'blogs.tasks.relay_outbox',
+        'schedule': OUTBOX_RELAY_INTERVAL,
+    },
+    'reconcile-counters': {
+        'task': 'blogs.tasks.reconcile_counters_task',
+        'schedule': 24 * 60 * 60,
+    },
+    'create-post-partitions': {
+        'task': 'blogs.tasks.create_post_partitions',
+        'schedule': 24 * 60 * 60,
+    },
+}
+
+# Материализованная лента новостей
+NEWS_FEED_SIZE = 500
+NEWS_FEED_PAGE_SIZE = 10
+NEWS_FEED_MAX_PAGE_SIZE = 100
+# Количество последних постов блога, добавляемых в ленту при подписке
+NEWS_FEED_BACKFILL_SIZE = 50
+# Посты старше NEWS_FEED_MAX_AGE_DAYS дней не читаются в ленты, при заполнении лент и в рассылке
+# (в PostgreSQL старые партиции постов отсекаются при планировании); None - без ограничения (по умолчанию)
+NEWS_FEED_MAX_AGE_DAYS = None
+# Время жизни закэшированной страницы ленты, секунд (инвалидация - сменой версий)
+NEWS_FEED_CACHE_TIMEOUT = 60
+
+# Максимальное количество постов в одном запросе mark-post-as-read
+MARK_POSTS_AS_READ_MAX_IDS = 200
+# Максимальное количество блогов в одном запросе массовой подписки/отписки
+SUBSCRIBE_MAX_IDS = 200
+# compact - watermark и сжатое множество на пользователя (ReadState), rows - строка ReadPost на пост
+READ_STATE_BACKEND = 'compact'
+# watermark сдвигается по ленте пользователя, когда во множестве прочитанных после него столько постов
+READ_STATE_COMPACT_SIZE = 64
+
+# Количество записей в пачке при сверке денормализованных счетчиков
+COUNTERS_RECONCILE_BATCH_SIZE = 1000
+
+# Ежедневная рассылка: получатель дайджестов (LogSink, FileSink, EmailSink), размер пачки пользователей,
+# количество шардов (диапазонов id пользователей, рассылаемых параллельно)
+NEWSLETTER_SINK = 'blogs.newsletter.LogSink'
+NEWSLETTER_BATCH_SIZE = 1000
+NEWSLETTER_POSTS_LIMIT = 5
+NEWSLETTER_SHARDS = 8
+NEWSLETTER_FILE_PATH = os.path.join(BASE_DIR, 'newsletter.jsonl')
+
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', 1025))
+# Подписчиков в одной пачке bulk_create / в одной задаче fan_out_chunk
+NEWS_FEED_FANOUT_BATCH_SIZE = 1000
+NEWS_FEED_FANOUT_CHUNK_SIZE = 20000
+# push - раскладывать все посты по лентам, pull - собирать ленту при чтении,
+# hybrid - блоги, у которых больше NEWS_FEED_FANOUT_THRESHOLD подписчиков, подмешиваются при чтении
+NEWS_FEED_STRATEGY = 'hybrid'
+NEWS_FEED_FANOUT_THRESHOLD = 10000
 
 CACHES = {
     "default": {